@@ -0,0 +1,441 @@
+# benchmark_pipeline.py - Benchmarks reprodutíveis do ETL, banco, análises e API
+"""
+Mede os caminhos críticos com dados sintéticos (dados_sinteticos) e o
+provedor simulado (mock_provedores) - sem rede nem chave de API:
+
+    extracao      ativos/s do ETL real (Alpha Vantage) e do ETL robusto (Yahoo)
+    insercao      linhas/s gravadas em price_history
+    indicadores   tempo do cálculo vetorizado por tamanho de universo
+    relatorios    exportação CSV / CSV.gz / XLSX e relatório executivo
+    api           latência p50/p90/p99 por endpoint (uvicorn local)
+
+Tudo roda numa pasta temporária. O resultado vai para um JSON com
+ambiente e commit, para comparar branches:
+
+    python benchmarks/benchmark_pipeline.py --saida base.json
+    python benchmarks/benchmark_pipeline.py --comparar base.json --tolerancia 0.15
+
+Com --comparar o código de saída é 1 se alguma métrica piorar além da
+tolerância (métricas *_por_s: maior é melhor; as demais: menor é melhor).
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from importlib.machinery import SourceFileLoader
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTRATORES = os.path.join(RAIZ, "src", "financial-data-pipeline", "extractors")
+sys.path.insert(0, EXTRATORES)
+
+from dados_sinteticos import gerar_blocos, gerar_painel  # noqa: E402
+from indicadores import calcular_indicadores  # noqa: E402
+from mock_provedores import ConfiguracaoMock, iniciar_mock  # noqa: E402
+
+VERSAO_FORMATO = 1
+SEMENTE = 42
+
+
+# === UTILITÁRIOS ===
+@contextlib.contextmanager
+def _silencio():
+    """Esconde prints e logs dos ETLs durante a medição"""
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def _medir(executar: Callable[[], object], repeticoes: int,
+           preparar: Optional[Callable[[], None]] = None) -> float:
+    """
+    Melhor tempo (s) entre as repetições; `preparar` roda antes de cada uma,
+    fora do cronômetro
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        executar()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def _percentis(amostras_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(amostras_s) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'media_ms': round(float(ms.mean()), 3),
+    }
+
+
+def _carregar_etl_real():
+    return SourceFileLoader('etl_api', os.path.join(EXTRATORES, 'etl_api_py')).load_module()
+
+
+def _etl_real(db_path: str):
+    """ETLFinanceiroReal com cota ilimitada (o mock não limita chaves)"""
+    from pool_chaves import PoolChavesAlphaVantage
+    etl = _carregar_etl_real().ETLFinanceiroReal(db_path=db_path, api_keys=['benchmark'])
+    etl.key_pool = PoolChavesAlphaVantage(['benchmark'], limite_minuto=10**9, limite_dia=10**9)
+    return etl
+
+
+def _simbolos(quantidade: int) -> List[str]:
+    return [f"SIM{i:05d}" for i in range(quantidade)]
+
+
+def _ambiente() -> Dict:
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=RAIZ, capture_output=True,
+                                  text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'branch': git('rev-parse', '--abbrev-ref', 'HEAD'),
+        'alteracoes_locais': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+# === BENCHMARKS ===
+def bench_extracao(ativos: int, latencia_ms: float, workers: int) -> Dict[str, Dict]:
+    """Ativos/s de extract -> transform -> load contra o mock, sem rate limit"""
+    servidor = iniciar_mock(ConfiguracaoMock(latencia_ms=latencia_ms, dispersao=0.3,
+                                             semente=SEMENTE))
+    os.environ['ALPHAVANTAGE_BASE_URL'] = servidor.url + '/query'
+    os.environ['YAHOO_BASE_URL'] = servidor.url
+    simbolos = _simbolos(ativos)
+    resultados = {}
+    try:
+        with _silencio():
+            etl = _etl_real('data/bench_extracao.db')
+            inicio = time.perf_counter()
+            sucessos, _ = etl.run_etl_pipeline(simbolos, delay=0, extract_workers=workers)
+            duracao = time.perf_counter() - inicio
+        resultados['extracao.etl_real'] = {
+            'ativos_por_s': round(sucessos / duracao, 2), 'segundos': round(duracao, 3),
+            'ativos': ativos, 'sucessos': sucessos, 'workers': workers,
+        }
+
+        from etl_robusto_windows import ETLFinanceiroRobusto
+        with _silencio():
+            robusto = ETLFinanceiroRobusto(semente=SEMENTE)
+            inicio = time.perf_counter()
+            for simbolo in simbolos:
+                robusto.salvar_no_banco(robusto.extrair_dados_acao(simbolo))
+            duracao = time.perf_counter() - inicio
+        resultados['extracao.etl_robusto'] = {
+            'ativos_por_s': round(ativos / duracao, 2), 'segundos': round(duracao, 3),
+            'ativos': ativos,
+        }
+    finally:
+        servidor.shutdown()
+    return resultados
+
+
+def bench_insercao(ativos: int, dias: int, repeticoes: int) -> Dict[str, Dict]:
+    """Linhas/s gravadas em price_history (upsert em lote, sem recálculo)"""
+    from dados_sinteticos import carregar_blocos
+    painel = gerar_painel(ativos, dias, SEMENTE)
+    db_path = 'data/bench_insercao.db'
+
+    def preparar():
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        with _silencio():
+            _etl_real(db_path)  # cria o schema
+
+    segundos = _medir(lambda: carregar_blocos(db_path, [painel], recalcular=False),
+                      repeticoes, preparar)
+    return {'insercao.price_history': {
+        'linhas_por_s': round(len(painel) / segundos), 'segundos': round(segundos, 3),
+        'linhas': len(painel),
+    }}
+
+
+def bench_indicadores(universos: List[int], dias: int, repeticoes: int) -> Dict[str, Dict]:
+    """Cálculo vetorizado de todos os indicadores para cada tamanho de universo"""
+    resultados = {}
+    for ativos in universos:
+        painel = gerar_painel(ativos, dias, SEMENTE)
+        segundos = _medir(lambda: calcular_indicadores(painel), repeticoes)
+        resultados[f'indicadores.{ativos}_ativos'] = {
+            'segundos': round(segundos, 4), 'linhas_por_s': round(len(painel) / segundos),
+            'linhas': len(painel),
+        }
+    return resultados
+
+
+def bench_relatorios(ativos: int, dias: int, repeticoes: int) -> Dict[str, Dict]:
+    """Exportação do histórico (CSV, CSV.gz, XLSX) e relatório executivo (novo e reaproveitado)"""
+    from dados_sinteticos import carregar_blocos
+    from exportacao import exportar_historico
+    db_path = 'data/bench_relatorios.db'
+    with _silencio():
+        _etl_real(db_path)
+        linhas = carregar_blocos(db_path, gerar_blocos(ativos, dias, SEMENTE))
+
+    resultados = {}
+    for formato in ('csv', 'csv.gz', 'xlsx'):
+        caminho = f'reports/bench_historico.{formato}'
+        segundos = _medir(lambda: exportar_historico(db_path, caminho), repeticoes)
+        resultados[f'relatorios.exportar_{formato.replace(".", "_")}'] = {
+            'segundos': round(segundos, 3), 'linhas_por_s': round(linhas / segundos),
+            'linhas': linhas, 'bytes': os.path.getsize(caminho),
+        }
+
+    from etl_robusto_windows import ETLFinanceiroRobusto
+    with _silencio():
+        robusto = ETLFinanceiroRobusto(semente=SEMENTE)
+        dados = [robusto.gerar_dados_simulados(simbolo) for simbolo in _simbolos(ativos)]
+
+        def limpar_cache():
+            shutil.rmtree('reports', ignore_errors=True)
+            os.makedirs('reports')
+
+        novo = _medir(lambda: robusto.gerar_relatorio_executivo(dados), repeticoes, limpar_cache)
+        reaproveitado = _medir(lambda: robusto.gerar_relatorio_executivo(dados), repeticoes)
+    resultados['relatorios.executivo'] = {'segundos': round(novo, 4), 'ativos': ativos}
+    resultados['relatorios.executivo_cache'] = {'segundos': round(reaproveitado, 4),
+                                                'ativos': ativos}
+    return resultados
+
+
+def _endpoints(simbolos: List[str]) -> List[Tuple[str, str, Optional[Dict]]]:
+    # /portfolio/analisar e /etl/executar ficam de fora: esperam 2-4s entre consultas por design
+    lista = ','.join(simbolos[:3])
+    return [
+        ('GET', '/', None),
+        ('GET', '/health', None),
+        ('GET', f'/acoes/{simbolos[0]}', None),
+        ('GET', '/portfolio/historico?limite=50', None),
+        ('GET', '/portfolio/analise-rapida', None),
+        ('GET', '/portfolio/metricas', None),
+        ('GET', f'/correlacao?simbolos={lista}', None),
+        ('POST', '/portfolio/var',
+         {'simbolos': simbolos[:5], 'simulacoes': 10000, 'semente': SEMENTE}),
+        ('GET', f'/export?simbolos={simbolos[0]}', None),
+    ]
+
+
+def bench_api(ativos: int, dias: int, requisicoes: int, latencia_ms: float) -> Dict[str, Dict]:
+    """Latência de cada endpoint com a API servida por uvicorn numa thread local"""
+    import httpx
+    import uvicorn
+
+    servidor_mock = iniciar_mock(ConfiguracaoMock(latencia_ms=latencia_ms, dispersao=0.3,
+                                                  semente=SEMENTE))
+    os.environ['YAHOO_BASE_URL'] = servidor_mock.url
+    db_path = os.path.abspath('data/bench_api.db')
+    os.environ['ETL_DB_PATH'] = db_path
+    simbolos = _simbolos(ativos)
+    with _silencio():
+        etl = _etl_real(db_path)
+        etl.load_synthetic(ativos, dias, SEMENTE)
+        etl.update_portfolio_metrics()
+        # Tabela acoes (data/portfolio.db) com algumas cotações para /health e /portfolio/*
+        from etl_robusto_windows import ETLFinanceiroRobusto
+        robusto = ETLFinanceiroRobusto(semente=SEMENTE)
+        for simbolo in simbolos[:10]:
+            robusto.salvar_no_banco(robusto.gerar_dados_simulados(simbolo))
+        import api_financeira
+        api_financeira.ETL_DB_PATH = db_path
+        api_financeira.TABELAS_EXPORTACAO['historico'] = (db_path,
+                                                          api_financeira.consulta_historico)
+
+    with socket.socket() as livre:
+        livre.bind(('127.0.0.1', 0))
+        porta = livre.getsockname()[1]
+    servidor = uvicorn.Server(uvicorn.Config(api_financeira.app, host='127.0.0.1', port=porta,
+                                             log_level='warning', access_log=False))
+    thread = threading.Thread(target=servidor.run, daemon=True)
+    thread.start()
+    while not servidor.started:
+        time.sleep(0.05)
+
+    resultados = {}
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{porta}', timeout=60) as cliente, _silencio():
+            for metodo, caminho, corpo in _endpoints(simbolos):
+                nome = f"api.{metodo} {caminho.split('?')[0]}"
+                amostras, erros = [], 0
+                for i in range(requisicoes + 3):  # 3 de aquecimento
+                    inicio = time.perf_counter()
+                    resposta = cliente.request(metodo, caminho, json=corpo)
+                    _ = resposta.content
+                    if i >= 3:
+                        amostras.append(time.perf_counter() - inicio)
+                        erros += resposta.status_code >= 400
+                resultados[nome] = {**_percentis(amostras), 'requisicoes': requisicoes,
+                                    'erros': erros}
+    finally:
+        servidor.should_exit = True
+        thread.join(timeout=10)
+        servidor_mock.shutdown()
+    return resultados
+
+
+# === COMPARAÇÃO ===
+def comparar(atual: Dict, base: Dict, tolerancia: float) -> List[str]:
+    """
+    Métricas que pioraram mais que `tolerancia` (fração) em relação à base
+
+    Contadores (linhas, ativos, erros, ...) não entram: só tempos (*_ms,
+    segundos) e vazões (*_por_s).
+    """
+    regressoes = []
+    for nome, metricas in atual['resultados'].items():
+        anteriores = base.get('resultados', {}).get(nome, {})
+        for metrica, valor in metricas.items():
+            anterior = anteriores.get(metrica)
+            if not anterior or not isinstance(valor, (int, float)):
+                continue
+            if metrica.endswith('_por_s'):
+                variacao = (anterior - valor) / anterior  # vazão caiu
+            elif metrica.endswith('_ms') or metrica == 'segundos':
+                variacao = (valor - anterior) / anterior  # tempo subiu
+            else:
+                continue
+            if variacao > tolerancia:
+                regressoes.append(f"{nome} {metrica}: {anterior} -> {valor} ({variacao:+.0%})")
+    return regressoes
+
+
+# === EXECUÇÃO ===
+SUITES = ('extracao', 'insercao', 'indicadores', 'relatorios', 'api')
+
+
+def executar(suites: List[str], args) -> Dict:
+    """Roda as suítes numa pasta temporária e devolve o documento de resultados"""
+    pasta = tempfile.mkdtemp(prefix='bench_financeiro_')
+    original = os.getcwd()
+    variaveis = {k: os.environ.get(k)
+                 for k in ('ALPHAVANTAGE_BASE_URL', 'YAHOO_BASE_URL', 'ETL_DB_PATH')}
+    resultados: Dict[str, Dict] = {}
+    os.chdir(pasta)
+    try:
+        for pasta_etl in ('data', 'logs', 'reports'):
+            os.makedirs(pasta_etl, exist_ok=True)
+        etapas = {
+            'extracao': lambda: bench_extracao(args.ativos_extracao, args.latencia_ms,
+                                               args.workers),
+            'insercao': lambda: bench_insercao(args.ativos, args.dias, args.repeticoes),
+            'indicadores': lambda: bench_indicadores(args.universos, args.dias, args.repeticoes),
+            'relatorios': lambda: bench_relatorios(args.ativos, args.dias, args.repeticoes),
+            'api': lambda: bench_api(args.ativos_api, args.dias, args.requisicoes,
+                                     args.latencia_ms),
+        }
+        for suite in suites:
+            print(f"⏱️  {suite}...", flush=True)
+            inicio = time.perf_counter()
+            resultados.update(etapas[suite]())
+            print(f"   concluído em {time.perf_counter() - inicio:.1f}s", flush=True)
+    finally:
+        os.chdir(original)
+        for chave, valor in variaveis.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    parametros = {k: v for k, v in vars(args).items()
+                  if k not in ('saida', 'comparar', 'tolerancia')}
+    return {
+        'versao_formato': VERSAO_FORMATO,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': _ambiente(),
+        'parametros': parametros,
+        'resultados': resultados,
+    }
+
+
+def imprimir(documento: Dict):
+    print(f"\n{'benchmark':<40} métricas")
+    print("-" * 90)
+    for nome, metricas in documento['resultados'].items():
+        print(f"{nome:<40} " + "  ".join(f"{k}={v}" for k, v in metricas.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks do pipeline financeiro (dados sintéticos + mock)")
+    parser.add_argument('suites', nargs='*',
+                        help=f"Suítes a rodar (padrão: todas - {', '.join(SUITES)})")
+    parser.add_argument('--saida', default='benchmark.json', help="Arquivo JSON de resultados")
+    parser.add_argument('--comparar',
+                        help="JSON de uma execução anterior (ex: da branch principal)")
+    parser.add_argument('--tolerancia', type=float, default=0.15,
+                        help="Piora aceita na comparação (fração)")
+    parser.add_argument('--rapido', action='store_true',
+                        help="Tamanhos pequenos (smoke test, ~30s)")
+    parser.add_argument('--ativos', type=int, default=200,
+                        help="Ativos da inserção e dos relatórios")
+    parser.add_argument('--dias', type=int, default=252, help="Pregões por ativo")
+    parser.add_argument('--universos', type=int, nargs='+', default=[10, 100, 1000],
+                        help="Tamanhos de universo dos indicadores")
+    parser.add_argument('--ativos-extracao', type=int, default=50, help="Ativos extraídos do mock")
+    parser.add_argument('--ativos-api', type=int, default=50, help="Ativos no banco da API")
+    parser.add_argument('--latencia-ms', type=float, default=5.0, help="Latência mediana do mock")
+    parser.add_argument('--workers', type=int, default=4, help="Threads de extração do ETL real")
+    parser.add_argument('--requisicoes', type=int, default=50,
+                        help="Requisições medidas por endpoint")
+    parser.add_argument('--repeticoes', type=int, default=3,
+                        help="Repetições (vale o melhor tempo)")
+    args = parser.parse_args()
+    invalidas = set(args.suites) - set(SUITES)
+    if invalidas:
+        parser.error(f"suítes inválidas: {', '.join(sorted(invalidas))}")
+
+    if args.rapido:
+        args.ativos, args.dias, args.universos = 20, 126, [10, 100]
+        args.ativos_extracao, args.ativos_api, args.requisicoes, args.repeticoes = 10, 10, 10, 1
+
+    documento = executar(args.suites or list(SUITES), args)
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(documento, arquivo, indent=2, ensure_ascii=False)
+    imprimir(documento)
+    print(f"\n💾 Resultados salvos em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(documento, base, args.tolerancia)
+        commit = base.get('ambiente', {}).get('commit', '?')
+        print(f"\n📊 Comparação com {args.comparar} ({commit}):")
+        for linha in regressoes:
+            print(f"   ❌ {linha}")
+        if regressoes:
+            sys.exit(1)
+        print(f"   ✅ Nenhuma regressão acima de {args.tolerancia:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # api_financeira.py - API REST Profissional com FastAPI
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.routing import Match
 from typing import List, Dict, Optional, Union
 import sqlite3
 import pandas as pd
@@ -12,9 +13,28 @@ import uvicorn
 from contextlib import contextmanager
 import os
 import json
+import secrets
+import threading
+import time
 
 # Importar nosso ETL
 from etl_robusto_windows import ETLFinanceiroRobusto
+from metricas_portfolio import CARTEIRA_PADRAO, consultar_metricas
+from correlacoes import JANELA_PADRAO, obter_motor_correlacao
+from exportacao import (blocos_csv, blocos_ndjson, comprimir_blocos, consulta_cotacoes,
+                        consulta_historico, de_consulta)
+from var_montecarlo import METODOS, var_carteira
+from telemetria import REGISTRO
+from perfil import ALVOS, habilitado, perfilar
+
+# Banco do ETL com histórico de preços (etl_api_py)
+ETL_DB_PATH = os.getenv("ETL_DB_PATH", "data/financial_data.db")
+
+# Teto de processos de simulação do VaR somando todas as requisições em andamento
+VAR_MAX_PROCESSOS = int(os.getenv("VAR_MAX_PROCESSOS", str(os.cpu_count() or 1)))
+
+# Perfil de uma requisição pelo header X-Profile (só com este token configurado)
+TOKEN_PERFIL = os.getenv("API_PROFILE_TOKEN", "")
 
 # === MODELOS PYDANTIC (VALIDAÇÃO AUTOMÁTICA) ===
 class AcaoResponse(BaseModel):
@@ -32,6 +52,22 @@ class PortfolioRequest(BaseModel):
     simbolos: List[str] = Field(..., min_items=1, max_items=20, description="Lista de códigos de ações")
     incluir_historico: bool = Field(default=False, description="Incluir dados históricos")
 
+class VaRRequest(BaseModel):
+    """Modelo para requisição de VaR / CVaR por Monte Carlo"""
+    simbolos: List[str] = Field(..., min_items=1, max_items=200, description="Ativos da carteira")
+    pesos: Optional[List[float]] = Field(default=None,
+                                         description="Pesos por ativo (padrão: iguais)")
+    valor: float = Field(default=100000.0, gt=0, description="Valor financeiro da carteira")
+    metodo: str = Field(default="historico", description="historico (bootstrap) ou parametrico")
+    simulacoes: int = Field(default=100000, ge=1000, le=5000000, description="Número de cenários")
+    horizonte: int = Field(default=1, ge=1, le=252, description="Horizonte em dias")
+    confianca: List[float] = Field(default=[0.95, 0.99], description="Níveis de confiança")
+    semente: Optional[int] = Field(default=None, description="Semente para reprodutibilidade")
+    dias_historico: Optional[int] = Field(default=None, ge=2,
+                                          description="Pregões usados na estimação")
+    workers: int = Field(default=1, ge=1, le=16,
+                         description="Processos da simulação (limitado por VAR_MAX_PROCESSOS)")
+
 class AnaliseResponse(BaseModel):
     """Modelo para resposta de análise"""
     total_ativos: int
@@ -59,7 +95,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latência por rota (rótulo = template da rota, não o caminho: /acoes/{codigo})
+REQUISICOES = REGISTRO.histograma(
+    'api_requisicao_segundos', "Latência das requisições da API por rota",
+    ('metodo', 'rota', 'status'))
+
+@app.middleware("http")
+async def medir_requisicoes(request: Request, call_next):
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        rota = request.scope.get('route')
+        REQUISICOES.observar(time.perf_counter() - inicio, metodo=request.method,
+                             rota=getattr(rota, 'path', 'desconhecida'), status=status)
+
+def _rota(request: Request) -> str:
+    # O roteamento ainda não rodou: procura o template da rota como o Starlette faria
+    for rota in app.router.routes:
+        if rota.matches(request.scope)[0] == Match.FULL:
+            return rota.path
+    return request.url.path
+
+async def perfilar_requisicoes(request: Request, call_next):
+    """
+    cProfile da requisição quando o header X-Profile traz API_PROFILE_TOKEN
+    ou a rota está em ETL_PROFILE (ex: ETL_PROFILE=/correlacao). O caminho
+    do .prof volta no header X-Profile-File. Rotas async dividem a thread do
+    event loop, então requisições concorrentes entram no mesmo perfil; o
+    corpo de respostas em streaming é enviado depois e fica de fora.
+    """
+    pedido = bool(TOKEN_PERFIL) and secrets.compare_digest(
+        request.headers.get('x-profile', '').encode(), TOKEN_PERFIL.encode())
+    if not (pedido or ALVOS):
+        return await call_next(request)
+    rota = _rota(request)
+    if not (pedido or habilitado(rota)):
+        return await call_next(request)
+
+    with perfilar(f"{request.method} {rota}") as arquivos:
+        response = await call_next(request)
+    if arquivos:
+        response.headers['X-Profile-File'] = arquivos['prof']
+    return response
+
+if TOKEN_PERFIL or ALVOS:  # desligado, nem entra na cadeia de middlewares
+    app.middleware("http")(perfilar_requisicoes)
+
 # === DEPENDÊNCIAS ===
+_var_processos_livres = VAR_MAX_PROCESSOS
+_var_lock = threading.Lock()
+
+@contextmanager
+def reservar_processos_var(pedidos: int):
+    """
+    Reserva processos do teto compartilhado do VaR: cada requisição leva o
+    que estiver livre, até `pedidos`. Com menos de 2 livres a simulação roda
+    na própria thread (workers=1), sem criar processos.
+    """
+    global _var_processos_livres
+    with _var_lock:
+        concedidos = min(pedidos, _var_processos_livres)
+        if concedidos < 2:
+            concedidos = 0
+        _var_processos_livres -= concedidos
+    try:
+        yield max(concedidos, 1)
+    finally:
+        with _var_lock:
+            _var_processos_livres += concedidos
+
 @contextmanager
 def get_db():
     """Context manager para conexão com banco"""
@@ -85,6 +193,12 @@ async def root():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics", tags=["Sistema"], response_class=PlainTextResponse)
+async def metricas_prometheus():
+    """Tempos por etapa/provedor e contadores do ETL no formato do Prometheus"""
+    return PlainTextResponse(REGISTRO.exportar(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health", tags=["Sistema"])
 async def health_check():
     """Health check para monitoramento"""
@@ -182,13 +296,43 @@ async def analisar_portfolio(
                 analise['recomendacoes'].append(f"⚠️ {acao['codigo']}: Queda significativa ({acao['variacao']:.2f}%) - Avaliar compra")
         
         # Agendar geração de relatório em background
-        background_tasks.add_task(gerar_relatorio_background, dados)
+        background_tasks.add_task(gerar_relatorio_background, dados, etl)
         
         return analise
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise: {str(e)}")
 
+def _simular_var(request: VaRRequest) -> Dict:
+    # Reserva dentro da thread: vale até a simulação acabar, mesmo se o cliente desistir
+    with reservar_processos_var(request.workers) as workers:
+        return var_carteira(
+            ETL_DB_PATH, request.simbolos, request.pesos, request.valor, request.dias_historico,
+            confiancas=request.confianca, horizonte=request.horizonte,
+            simulacoes=request.simulacoes, metodo=request.metodo, semente=request.semente,
+            workers=workers)
+
+@app.post("/portfolio/var", tags=["Análise"])
+async def var_portfolio(request: VaRRequest):
+    """
+    Value at Risk e CVaR da carteira por simulação de Monte Carlo
+    a partir do histórico de preços do ETL (perdas como valores positivos)
+    
+    - **simbolos** / **pesos**: Composição da carteira
+    - **metodo**: historico (bootstrap de dias) ou parametrico (normal multivariada)
+    - **semente**: Fixa os sorteios (mesmo resultado a cada chamada)
+    """
+    if request.metodo not in METODOS:
+        raise HTTPException(status_code=422, detail=f"Método inválido: use {', '.join(METODOS)}")
+    
+    try:
+        # Simulação é CPU-bound: fora do event loop
+        return await asyncio.to_thread(_simular_var, request)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na simulação: {str(e)}")
+
 @app.get("/portfolio/historico", tags=["Dados"])
 async def historico_portfolio(limite: int = 50):
     """
@@ -218,6 +362,69 @@ async def historico_portfolio(limite: int = 50):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao consultar histórico: {str(e)}")
 
+# Tabelas exportáveis: nome -> (banco, montagem da consulta)
+TABELAS_EXPORTACAO = {
+    "historico": (ETL_DB_PATH, consulta_historico),
+    "cotacoes": ("data/portfolio.db", consulta_cotacoes),
+}
+FORMATOS_EXPORTACAO = {
+    "csv": (blocos_csv, "text/csv; charset=utf-8"),
+    "ndjson": (blocos_ndjson, "application/x-ndjson"),
+}
+
+def _transmitir(conn: sqlite3.Connection, blocos):
+    """Repassa os blocos e fecha a conexão no fim (ou se o cliente desconectar)"""
+    try:
+        yield from blocos
+    finally:
+        conn.close()
+
+@app.get("/export", tags=["Dados"])
+async def exportar_dados(tabela: str = "historico", formato: str = "csv",
+                         simbolos: Optional[str] = None, inicio: Optional[str] = None,
+                         fim: Optional[str] = None, gzip: bool = False):
+    """
+    Exporta uma tabela inteira (ou filtrada) em streaming direto do cursor SQLite
+    
+    - **tabela**: historico (preços + indicadores do ETL) ou cotacoes (tabela acoes)
+    - **formato**: csv ou ndjson
+    - **simbolos**: Ativos separados por vírgula (padrão: todos)
+    - **inicio** / **fim**: Intervalo de datas (YYYY-MM-DD)
+    - **gzip**: Comprime a resposta em .gz durante o envio
+    """
+    if tabela not in TABELAS_EXPORTACAO:
+        raise HTTPException(status_code=422,
+                            detail=f"Tabela inválida: use {', '.join(TABELAS_EXPORTACAO)}")
+    if formato not in FORMATOS_EXPORTACAO:
+        raise HTTPException(status_code=422,
+                            detail=f"Formato inválido: use {', '.join(FORMATOS_EXPORTACAO)}")
+    
+    db_path, montar_consulta = TABELAS_EXPORTACAO[tabela]
+    if not os.path.exists(db_path):
+        raise HTTPException(status_code=404, detail=f"Banco não encontrado: {db_path}")
+    pedidos = [s.strip() for s in simbolos.split(',') if s.strip()] if simbolos else None
+    query, params = montar_consulta(pedidos, inicio, fim)
+    
+    # Somente leitura; o gerador é consumido em outra thread pelo StreamingResponse
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        fonte = de_consulta(conn, query, params)
+    except sqlite3.Error as e:
+        conn.close()
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar {tabela}: {str(e)}")
+    
+    gerar_blocos, media_type = FORMATOS_EXPORTACAO[formato]
+    blocos = gerar_blocos(fonte)
+    arquivo = f"{tabela}.{formato}"
+    if gzip:
+        blocos = comprimir_blocos(blocos)
+        media_type, arquivo = "application/gzip", arquivo + ".gz"
+    
+    return StreamingResponse(
+        _transmitir(conn, blocos), media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{arquivo}"'}
+    )
+
 @app.get("/portfolio/analise-rapida", tags=["Análise"])
 async def analise_rapida():
     """Análise rápida dos dados mais recentes do banco"""
@@ -254,6 +461,67 @@ async def analise_rapida():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na análise: {str(e)}")
 
+@app.get("/portfolio/metricas", tags=["Análise"])
+async def metricas_portfolio(portfolio: str = CARTEIRA_PADRAO, inicio: Optional[str] = None,
+                             fim: Optional[str] = None, limite: int = 252):
+    """
+    Métricas de risco diárias de uma carteira (tabela portfolio_metrics)
+    
+    - **portfolio**: Nome da carteira (padrão: default)
+    - **inicio** / **fim**: Intervalo de datas (YYYY-MM-DD)
+    - **limite**: Número máximo de datas (padrão: 252, mais recentes primeiro)
+    """
+    try:
+        metricas = consultar_metricas(ETL_DB_PATH, portfolio, inicio, fim, limite)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao consultar métricas: {str(e)}")
+    
+    if not metricas:
+        raise HTTPException(status_code=404, detail=f"Nenhuma métrica para a carteira {portfolio}")
+    
+    return {
+        "portfolio": portfolio,
+        "total_registros": len(metricas),
+        "ultima_data": metricas[0]['date'],
+        "metricas": metricas
+    }
+
+def _matriz_json(matriz) -> List[List[Optional[float]]]:
+    """Matriz NumPy -> listas JSON (NaN vira null)"""
+    return [[None if pd.isna(v) else float(v) for v in linha] for linha in matriz]
+
+@app.get("/correlacao", tags=["Análise"])
+async def correlacao_ativos(simbolos: str, janela: int = JANELA_PADRAO,
+                            data: Optional[str] = None, universo: Optional[str] = None):
+    """
+    Submatriz de correlação/covariância dos retornos diários
+    
+    - **simbolos**: Ativos separados por vírgula (ex: AAPL,MSFT,GOOGL)
+    - **janela**: Pregões da janela móvel (padrão: 63; 0 = histórico completo)
+    - **data**: Data de referência YYYY-MM-DD (padrão: última disponível)
+    - **universo**: Ativos da matriz base separados por vírgula (padrão: todos do banco)
+    """
+    pedidos = [s.strip() for s in simbolos.split(',') if s.strip()]
+    if not pedidos:
+        raise HTTPException(status_code=422, detail="Informe ao menos um símbolo")
+    base = [s.strip() for s in universo.split(',') if s.strip()] if universo else None
+    
+    motor = obter_motor_correlacao(ETL_DB_PATH, diretorio_cache="data/cache/correlacoes")
+    try:
+        resultado = await asyncio.to_thread(motor.submatriz, pedidos, base, janela or None, data)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular correlação: {str(e)}")
+    
+    return {
+        "simbolos": resultado['simbolos'],
+        "data": resultado['data'],
+        "janela": janela or None,
+        "correlacao": _matriz_json(resultado['correlacao']),
+        "covariancia": _matriz_json(resultado['covariancia'])
+    }
+
 @app.post("/etl/executar", tags=["ETL"])
 async def executar_etl(background_tasks: BackgroundTasks, simbolos: Optional[List[str]] = None):
     """
@@ -275,10 +543,10 @@ async def executar_etl(background_tasks: BackgroundTasks, simbolos: Optional[Lis
     }
 
 # === FUNÇÕES BACKGROUND ===
-async def gerar_relatorio_background(dados: List[Dict]):
-    """Gera relatório em background"""
+async def gerar_relatorio_background(dados: List[Dict], etl: Optional[ETLFinanceiroRobusto] = None):
+    """Gera relatório em background (reaproveita o arquivo se os dados não mudaram)"""
     try:
-        etl = ETLFinanceiroRobusto()
+        etl = etl or ETLFinanceiroRobusto()
         etl.gerar_relatorio_executivo(dados)
         print("📊 Relatório gerado em background com sucesso!")
     except Exception as e:
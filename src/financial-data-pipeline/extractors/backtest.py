@@ -0,0 +1,339 @@
+# backtest.py - Backtest vetorizado dos sinais de médias móveis e RSI (todos os ativos)
+import argparse
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicadores import JANELA_RSI
+
+ESTRATEGIAS = ('medias', 'rsi')
+DIAS_UTEIS_ANO = 252
+BLOCO_ATIVOS = 500  # colunas por bloco: memória limitada em universos grandes
+
+# Códigos de sinal (mesma semântica de detectar_tendencias / relatório RSI)
+COMPRA, VENDA, AGUARDAR = 1, -1, 0
+
+
+def matriz_precos(painel: pd.DataFrame, coluna_simbolo: str = 'symbol',
+                  coluna_data: str = 'date', coluna_preco: str = 'close_price'
+                  ) -> Tuple[np.ndarray, List, List[str]]:
+    """
+    Painel empilhado -> matriz datas x ativos (NaN onde não há cotação)
+
+    Returns:
+        (precos, datas ordenadas, símbolos ordenados)
+    """
+    codigos_data, datas = pd.factorize(painel[coluna_data], sort=True)
+    codigos_simbolo, simbolos = pd.factorize(painel[coluna_simbolo], sort=True)
+    precos = np.full((len(datas), len(simbolos)), np.nan)
+    precos[codigos_data, codigos_simbolo] = pd.to_numeric(painel[coluna_preco], errors='coerce')
+    return precos, list(datas), list(simbolos)
+
+
+def carregar_matriz_precos(db_path: str, simbolos: Optional[List[str]] = None,
+                           inicio: Optional[str] = None, fim: Optional[str] = None):
+    """Fechamentos de price_history como matriz (ver matriz_precos)"""
+    query = "SELECT symbol, date, close_price FROM price_history WHERE 1 = 1"
+    params: list = []
+    if simbolos:
+        query += f" AND symbol IN ({', '.join('?' * len(simbolos))})"
+        params += [s.upper() for s in simbolos]
+    if inicio:
+        query += " AND date >= ?"
+        params.append(inicio)
+    if fim:
+        query += " AND date <= ?"
+        params.append(fim)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        painel = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+    return matriz_precos(painel)
+
+
+def _ffill(matriz: np.ndarray) -> np.ndarray:
+    """Forward-fill ao longo das datas (eixo 0), sem loop por barra"""
+    validos = ~np.isnan(matriz)
+    indices = np.where(validos, np.arange(len(matriz))[:, None], 0)
+    np.maximum.accumulate(indices, axis=0, out=indices)
+    preenchida = matriz[indices, np.arange(matriz.shape[1])]
+    preenchida[~np.maximum.accumulate(validos, axis=0)] = np.nan  # antes da 1ª cotação
+    return preenchida
+
+
+def somas_acumuladas(matriz: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Soma e contagem acumuladas por coluna (ignorando NaN), base de qualquer média móvel"""
+    validos = ~np.isnan(matriz)
+    return np.cumsum(np.where(validos, matriz, 0.0), axis=0), np.cumsum(validos, axis=0)
+
+
+def media_de_somas(somas: Tuple[np.ndarray, np.ndarray], janela: int) -> np.ndarray:
+    """Média móvel de uma janela a partir das somas acumuladas: O(n) por janela"""
+    soma, contagem = somas
+    janela_soma = soma.copy()
+    janela_contagem = contagem.copy()
+    janela_soma[janela:] -= soma[:-janela]
+    janela_contagem[janela:] -= contagem[:-janela]
+    media = janela_soma / janela
+    media[janela_contagem < janela] = np.nan
+    return media
+
+
+def _media_movel(matriz: np.ndarray, janela: int) -> np.ndarray:
+    """Média móvel simples por coluna via soma acumulada (NaN até a janela encher)"""
+    return media_de_somas(somas_acumuladas(matriz), janela)
+
+
+def sinais_medias(precos: np.ndarray, janela_curta: int = 7, janela_longa: int = 21,
+                  medias: Optional[Dict[int, np.ndarray]] = None) -> np.ndarray:
+    """
+    Sinal por barra com a regra de detectar_tendencias: preço acima da MA
+    curta -> COMPRA (alta forte/moderada), abaixo -> VENDA, senão AGUARDAR
+
+    `medias` (janela -> MA já calculada) evita recalcular as médias quando
+    várias combinações de janelas são avaliadas sobre os mesmos preços.
+    """
+    medias = medias or {}
+    ma_curta = medias.get(janela_curta)
+    if ma_curta is None:
+        ma_curta = _media_movel(precos, janela_curta)
+    ma_longa = medias.get(janela_longa)
+    if ma_longa is None:
+        ma_longa = _media_movel(precos, janela_longa)
+    with np.errstate(invalid='ignore'):
+        compra = (precos > ma_curta) & (ma_curta != ma_longa)
+        venda = (precos < ma_curta) & (ma_curta != ma_longa)
+    sinais = np.where(compra, COMPRA, np.where(venda, VENDA, AGUARDAR))
+    sinais[np.isnan(ma_curta) | np.isnan(ma_longa)] = AGUARDAR
+    return sinais
+
+
+def calcular_rsi(precos: np.ndarray, janela: int = JANELA_RSI) -> np.ndarray:
+    """RSI de médias simples (como em transform_price_data) para a matriz inteira"""
+    delta = np.diff(precos, axis=0, prepend=np.nan)
+    ganhos = np.where(delta > 0, delta, 0.0)
+    perdas = np.where(delta < 0, -delta, 0.0)
+    # Mesma convenção do cálculo em lote: a primeira barra entra com ganho/perda 0
+    sem_preco = np.isnan(precos)
+    ganhos[sem_preco] = np.nan
+    perdas[sem_preco] = np.nan
+    media_ganho = _media_movel(ganhos, janela)
+    media_perda = _media_movel(perdas, janela)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + media_ganho / media_perda)
+
+
+def sinais_rsi(precos: np.ndarray, sobrevendido: float = 30, sobrecomprado: float = 70,
+               janela: int = JANELA_RSI, rsi: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Sinal por barra pelos limites de RSI do relatório executivo
+    (RSI < 30 -> COMPRA, > 70 -> VENDA); `rsi` pode vir pré-calculado
+    """
+    if rsi is None:
+        rsi = calcular_rsi(precos, janela)
+    with np.errstate(invalid='ignore'):
+        sinais = np.where(rsi < sobrevendido, COMPRA,
+                          np.where(rsi > sobrecomprado, VENDA, AGUARDAR))
+    return sinais
+
+
+def posicoes_de_sinais(sinais: np.ndarray, vendido: bool = False) -> np.ndarray:
+    """
+    Posição ao fim de cada barra: COMPRA -> 1, VENDA -> 0 (ou -1 com
+    `vendido`), AGUARDAR mantém a posição anterior
+    """
+    alvo = np.where(sinais == COMPRA, 1.0,
+                    np.where(sinais == VENDA, -1.0 if vendido else 0.0, np.nan))
+    alvo[0] = np.where(np.isnan(alvo[0]), 0.0, alvo[0])
+    return _ffill(alvo)
+
+
+def base_metricas(precos: np.ndarray) -> Dict[str, np.ndarray]:
+    """Partes das métricas que só dependem dos preços (reaproveitadas entre estratégias)"""
+    n_ativos = precos.shape[1]
+    precos_ff = _ffill(precos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retornos = precos_ff[1:] / precos_ff[:-1] - 1
+        retornos = np.vstack([np.zeros((1, n_ativos)), np.nan_to_num(retornos)])
+
+        # Estatísticas só sobre os dias em que o ativo já era negociado
+        cotados = ~np.isnan(precos)
+        listado = np.maximum.accumulate(cotados, axis=0)
+        ativo_no_dia = np.vstack([np.zeros((1, n_ativos), bool), listado[:-1]])
+        primeiro = precos_ff[np.argmax(cotados, axis=0), np.arange(n_ativos)]
+        buy_hold = precos_ff[-1] / primeiro - 1
+    return {'retornos': retornos, 'ativo_no_dia': ativo_no_dia,
+            'dias': ativo_no_dia.sum(axis=0), 'buy_hold': buy_hold}
+
+
+def _metricas_bloco(precos: np.ndarray, posicoes: np.ndarray, custo: float,
+                    base: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """Retornos, drawdown e operações de cada coluna, tudo com operações de array"""
+    base = base or base_metricas(precos)
+    retornos, ativo_no_dia, dias = base['retornos'], base['ativo_no_dia'], base['dias']
+
+    # Posição decidida no fechamento de t rende o retorno de t+1 (sem look-ahead)
+    mantida = np.vstack([np.zeros((1, posicoes.shape[1])), posicoes[:-1]])
+    giro = np.abs(np.diff(posicoes, axis=0, prepend=0.0))
+    estrategia = mantida * retornos - custo * giro
+
+    log_estrategia = np.log1p(np.maximum(estrategia, -0.999999))
+    curva = np.cumsum(log_estrategia, axis=0)
+    drawdown = np.exp(curva - np.maximum.accumulate(np.maximum(curva, 0.0), axis=0)) - 1
+
+    # Operações: sequências contíguas com a mesma posição não nula
+    n_datas, n_ativos = mantida.shape
+    mudou = np.vstack([np.ones((1, n_ativos), bool), mantida[1:] != mantida[:-1]])
+    id_trecho = (np.cumsum(mudou, axis=0) - 1) + np.arange(n_ativos) * n_datas
+    id_trecho = id_trecho.ravel(order='F')
+    resultado_trecho = np.bincount(id_trecho, weights=log_estrategia.ravel(order='F'),
+                                   minlength=n_datas * n_ativos)
+    inicio_trecho = mudou.ravel(order='F')
+    em_posicao = (mantida != 0).ravel(order='F')
+    e_operacao = np.zeros(n_datas * n_ativos, bool)
+    e_operacao[id_trecho[inicio_trecho & em_posicao]] = True
+    coluna_trecho = np.arange(n_datas * n_ativos) // n_datas
+    operacoes = np.bincount(coluna_trecho[e_operacao], minlength=n_ativos)
+    acertos = np.bincount(coluna_trecho[e_operacao & (resultado_trecho > 0)], minlength=n_ativos)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = np.where(ativo_no_dia, estrategia, 0.0).sum(axis=0) / dias
+        desvios = np.where(ativo_no_dia, estrategia - media, 0.0)
+        desvio = np.sqrt((desvios * desvios).sum(axis=0) / (dias - 1))
+        sharpe = media / desvio * np.sqrt(DIAS_UTEIS_ANO)
+        taxa_acerto = acertos / operacoes
+        retorno_anual = np.expm1(curva[-1] * DIAS_UTEIS_ANO / dias)
+        exposicao = (mantida != 0).sum(axis=0) / dias
+
+    return {
+        'retorno_total': np.expm1(curva[-1]),
+        'retorno_buy_hold': base['buy_hold'],
+        'retorno_anual': retorno_anual,
+        'volatilidade': desvio * np.sqrt(DIAS_UTEIS_ANO),
+        'sharpe': np.where(np.isfinite(sharpe), sharpe, np.nan),
+        'max_drawdown': drawdown.min(axis=0),
+        'operacoes': operacoes,
+        'taxa_acerto': taxa_acerto,
+        'exposicao': exposicao,
+        '_retornos_diarios': estrategia,
+        '_ativos_no_dia': ativo_no_dia,
+    }
+
+
+def metricas_carteira(soma_diaria: np.ndarray, ativos_diarios: np.ndarray,
+                      taxa_acerto: float = float('nan')) -> Dict[str, float]:
+    """Métricas da carteira igualmente ponderada entre os ativos negociados em cada dia"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        diario = np.where(ativos_diarios > 0, soma_diaria / ativos_diarios, 0.0)
+    curva = np.cumsum(np.log1p(np.maximum(diario, -0.999999)))
+    anos = len(curva) / DIAS_UTEIS_ANO
+    drawdown = np.exp(curva - np.maximum.accumulate(np.maximum(curva, 0.0))) - 1
+    desvio = diario.std(ddof=1) if len(diario) > 1 else np.nan
+
+    return {
+        'retorno_total': float(np.expm1(curva[-1])) if len(curva) else 0.0,
+        'retorno_anual': float(np.expm1(curva[-1] / anos)) if len(curva) else 0.0,
+        'volatilidade': float(desvio * np.sqrt(DIAS_UTEIS_ANO)),
+        'sharpe': (float(diario.mean() / desvio * np.sqrt(DIAS_UTEIS_ANO))
+                   if desvio else float('nan')),
+        'max_drawdown': float(drawdown.min()) if len(drawdown) else 0.0,
+        'taxa_acerto': taxa_acerto,
+    }
+
+
+def executar_backtest(precos: np.ndarray, simbolos: List[str], estrategia: str = 'medias',
+                      vendido: bool = False, custo: float = 0.0,
+                      bloco_ativos: int = BLOCO_ATIVOS, **parametros) -> Dict:
+    """
+    Reproduz os sinais sobre o histórico de todos os ativos de uma vez
+
+    Sinais, posições e P&L são matrizes datas x ativos (sem loop por barra);
+    os ativos são processados em blocos de colunas para limitar a memória.
+
+    Args:
+        precos: Matriz datas x ativos (ver matriz_precos)
+        simbolos: Nome de cada coluna
+        estrategia: 'medias' (MA_7/MA_21 de detectar_tendencias) ou 'rsi'
+        vendido: VENDA abre posição vendida em vez de zerar
+        custo: Custo por unidade de giro (ex: 0.001 = 0,1% por operação)
+        **parametros: janela_curta/janela_longa ou sobrevendido/sobrecomprado
+
+    Returns:
+        - por_ativo: DataFrame com retorno, buy & hold, retorno anual,
+          volatilidade, Sharpe, max drawdown, operações, taxa de acerto
+          (operações com lucro) e exposição
+        - carteira: mesmas métricas da carteira igualmente ponderada
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estratégia desconhecida: {estrategia} (use {', '.join(ESTRATEGIAS)})")
+    inicio = time.perf_counter()
+    gerar_sinais = sinais_medias if estrategia == 'medias' else sinais_rsi
+
+    partes = []
+    soma_diaria = np.zeros(len(precos))
+    ativos_diarios = np.zeros(len(precos))
+    for coluna in range(0, precos.shape[1], bloco_ativos):
+        bloco = precos[:, coluna:coluna + bloco_ativos]
+        posicoes = posicoes_de_sinais(gerar_sinais(bloco, **parametros), vendido)
+        metricas = _metricas_bloco(bloco, posicoes, custo)
+        soma_diaria += np.where(metricas['_ativos_no_dia'],
+                                metricas['_retornos_diarios'], 0).sum(axis=1)
+        ativos_diarios += metricas['_ativos_no_dia'].sum(axis=1)
+        partes.append(pd.DataFrame({k: v for k, v in metricas.items() if not k.startswith('_')}))
+
+    por_ativo = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    por_ativo.insert(0, 'symbol', simbolos)
+
+    taxa_acerto = float(por_ativo['taxa_acerto'].mean()) if len(por_ativo) else float('nan')
+    return {
+        'estrategia': estrategia,
+        'parametros': dict(parametros, vendido=vendido, custo=custo),
+        'datas': len(precos),
+        'ativos': len(simbolos),
+        'por_ativo': por_ativo,
+        'carteira': metricas_carteira(soma_diaria, ativos_diarios, taxa_acerto),
+        'duracao_segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def main():
+    """CLI: python backtest.py --estrategia medias --db data/financial_data.db"""
+    parser = argparse.ArgumentParser(description="Backtest vetorizado dos sinais de tendência")
+    parser.add_argument('simbolos', nargs='*', help="Ativos (padrão: todos do banco)")
+    parser.add_argument('--estrategia', choices=ESTRATEGIAS, default='medias')
+    parser.add_argument('--inicio', help="Data inicial YYYY-MM-DD")
+    parser.add_argument('--fim', help="Data final YYYY-MM-DD")
+    parser.add_argument('--vendido', action='store_true', help="VENDA abre posição vendida")
+    parser.add_argument('--custo', type=float, default=0.0, help="Custo por giro (ex: 0.001)")
+    parser.add_argument('--db', default="data/financial_data.db", help="Banco do ETL")
+    args = parser.parse_args()
+
+    precos, _, simbolos = carregar_matriz_precos(args.db, args.simbolos, args.inicio, args.fim)
+    if not simbolos:
+        print("❌ Nenhum histórico encontrado no banco")
+        return
+
+    resultado = executar_backtest(precos, simbolos, args.estrategia,
+                                  vendido=args.vendido, custo=args.custo)
+    carteira = resultado['carteira']
+    print(f"🧪 Backtest '{resultado['estrategia']}': {resultado['ativos']} ativos x "
+          f"{resultado['datas']} pregões em {resultado['duracao_segundos']:.2f}s")
+    print(f"💼 Carteira: retorno {carteira['retorno_total']:+.2%} | "
+          f"anual {carteira['retorno_anual']:+.2%} | Sharpe {carteira['sharpe']:.2f} | "
+          f"max drawdown {carteira['max_drawdown']:.2%} | acerto {carteira['taxa_acerto']:.1%}")
+
+    melhores = resultado['por_ativo'].sort_values('retorno_total', ascending=False).head(10)
+    for linha in melhores.itertuples():
+        emoji = "🚀" if linha.retorno_total > 0 else "📉"
+        print(f"{emoji} {linha.symbol:8} | estratégia {linha.retorno_total:+8.2%} | "
+              f"buy & hold {linha.retorno_buy_hold:+8.2%} | operações {linha.operacoes:4d} | "
+              f"acerto {linha.taxa_acerto:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
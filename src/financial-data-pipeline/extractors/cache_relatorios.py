@@ -0,0 +1,160 @@
+# cache_relatorios.py - Cache de relatórios endereçado por conteúdo, com limpeza por tamanho e idade
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from telemetria import registrar_cache
+
+PASTA_PADRAO = "reports"
+TAMANHO_MAXIMO_MB = float(os.getenv("RELATORIOS_MAX_MB", "1024"))
+IDADE_MAXIMA_DIAS = float(os.getenv("RELATORIOS_MAX_DIAS", "30"))
+
+# Artefatos gerenciados: relatorio_<hash>.* e os antigos relatorio_AAAAMMDD_HHMMSS.*
+PADRAO_ARTEFATO = re.compile(r'^relatorio_([0-9a-f]{32}|\d{8}_\d{6})\.')
+
+# Gera o arquivo no caminho recebido (ex: lambda caminho: exportar_csv(caminho, fonte))
+Gerador = Callable[[str], object]
+
+
+def chave_conteudo(df: pd.DataFrame, **parametros) -> str:
+    """
+    Hash do conjunto de dados + parâmetros do relatório
+
+    Colunas, tipos e valores entram no hash (hash_pandas_object, vetorizado);
+    a ordem dos parâmetros não importa.
+
+    Returns:
+        32 caracteres hexadecimais
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        'colunas': [str(c) for c in df.columns],
+        'tipos': [str(t) for t in df.dtypes],
+        'parametros': parametros,
+    }, sort_keys=True, default=str).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()[:32]
+
+
+class CacheRelatorios:
+    """
+    Relatórios em `pasta` nomeados pelo hash da entrada: mesma entrada ->
+    mesmo arquivo, devolvido sem gerar de novo. A cada geração a pasta é
+    limpa: artefatos sem uso há mais de `idade_maxima_dias` saem primeiro,
+    depois os menos usados recentemente até caber em `tamanho_maximo_mb`.
+    """
+
+    def __init__(self, pasta: str = PASTA_PADRAO, tamanho_maximo_mb: float = TAMANHO_MAXIMO_MB,
+                 idade_maxima_dias: float = IDADE_MAXIMA_DIAS):
+        self.pasta = pasta
+        self.tamanho_maximo = int(tamanho_maximo_mb * 1024 * 1024)
+        self.idade_maxima = idade_maxima_dias * 86400
+        self._trava = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def caminho(self, chave: str, extensao: str) -> str:
+        return os.path.join(self.pasta, f"relatorio_{chave}{extensao}")
+
+    def obter_ou_gerar(self, chave: str, geradores: Dict[str, Gerador]
+                       ) -> Tuple[Dict[str, str], bool]:
+        """
+        Caminho de cada artefato da chave, gerando só os que faltam
+
+        Args:
+            chave: Resultado de chave_conteudo
+            geradores: Extensão ('.csv', '.xlsx', ...) -> função que grava o arquivo
+
+        Returns:
+            (extensão -> caminho, True se tudo já existia)
+        """
+        caminhos = {extensao: self.caminho(chave, extensao) for extensao in geradores}
+        reaproveitado = True
+        with self._trava:
+            for extensao, gerar in geradores.items():
+                caminho = caminhos[extensao]
+                if os.path.exists(caminho):
+                    os.utime(caminho)  # marca o uso para a limpeza
+                    registrar_cache('relatorios', True)
+                    continue
+                registrar_cache('relatorios', False)
+                reaproveitado = False
+                self._gerar_atomico(caminho, gerar)
+            if not reaproveitado:
+                self.limpar()
+        return caminhos, reaproveitado
+
+    def _gerar_atomico(self, caminho: str, gerar: Gerador):
+        # Grava em arquivo temporário e renomeia: quem lê nunca vê arquivo pela metade
+        pasta, nome = os.path.split(caminho)
+        temporario = os.path.join(pasta, f".tmp-{os.getpid()}-{threading.get_ident()}-{nome}")
+        try:
+            gerar(temporario)
+            os.replace(temporario, caminho)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def _artefatos(self) -> List[Tuple[float, int, List[str]]]:
+        # Arquivos da mesma chave (.csv, .xlsx, ...) são removidos juntos
+        grupos: Dict[str, list] = {}
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file() or not PADRAO_ARTEFATO.match(entrada.name):
+                    continue
+                info = entrada.stat()
+                grupo = grupos.setdefault(entrada.name.split('.', 1)[0], [0.0, 0, []])
+                grupo[0] = max(grupo[0], info.st_mtime)
+                grupo[1] += info.st_size
+                grupo[2].append(entrada.path)
+        return sorted(tuple(grupo) for grupo in grupos.values())
+
+    def limpar(self) -> Dict[str, int]:
+        """
+        Aplica a política de retenção (idade, depois tamanho, do mais antigo)
+
+        Returns:
+            Arquivos e bytes removidos, bytes mantidos
+        """
+        agora = time.time()
+        artefatos = self._artefatos()
+        total = sum(tamanho for _, tamanho, _ in artefatos)
+        removidos, liberados = 0, 0
+        for usado_em, tamanho, arquivos in artefatos:
+            if agora - usado_em <= self.idade_maxima and total <= self.tamanho_maximo:
+                break
+            for arquivo in arquivos:
+                try:
+                    os.remove(arquivo)
+                    removidos += 1
+                except FileNotFoundError:
+                    pass
+            total -= tamanho
+            liberados += tamanho
+        return {'removidos': removidos, 'bytes_liberados': liberados, 'bytes_mantidos': total}
+
+
+def main():
+    """CLI: python cache_relatorios.py --max-mb 500 --max-dias 7"""
+    parser = argparse.ArgumentParser(description="Limpa a pasta de relatórios (tamanho e idade)")
+    parser.add_argument('--pasta', default=PASTA_PADRAO, help="Pasta dos relatórios")
+    parser.add_argument('--max-mb', type=float, default=TAMANHO_MAXIMO_MB,
+                        help="Tamanho máximo da pasta")
+    parser.add_argument('--max-dias', type=float, default=IDADE_MAXIMA_DIAS,
+                        help="Remove relatórios sem uso há mais dias que isso")
+    args = parser.parse_args()
+
+    resultado = CacheRelatorios(args.pasta, args.max_mb, args.max_dias).limpar()
+    print(f"🧹 {resultado['removidos']} arquivos removidos "
+          f"({resultado['bytes_liberados'] / 1024 / 1024:.1f} MB liberados, "
+          f"{resultado['bytes_mantidos'] / 1024 / 1024:.1f} MB mantidos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# correlacoes.py - Matrizes de correlação/covariância do universo (completas e móveis)
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from telemetria import registrar_cache
+
+JANELA_PADRAO = 63  # ~3 meses de pregões
+MIN_OBSERVACOES = 2
+
+
+def carregar_precos(conn: sqlite3.Connection, apos: Optional[str] = None,
+                    ate: Optional[str] = None,
+                    simbolos: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Fechamentos de price_history como matriz datas x ativos (só `simbolos`, se dados)"""
+    query = "SELECT symbol, date, close_price FROM price_history WHERE 1 = 1"
+    params: list = []
+    if simbolos:
+        query += f" AND symbol IN ({', '.join('?' * len(simbolos))})"
+        params.extend(simbolos)
+    if apos:
+        query += " AND date > ?"
+        params.append(apos)
+    if ate:
+        query += " AND date <= ?"
+        params.append(ate)
+    linhas = pd.read_sql_query(query, conn, params=params)
+    if linhas.empty:
+        return pd.DataFrame()
+    linhas['date'] = linhas['date'].astype(str)
+    return linhas.pivot_table(index='date', columns='symbol', values='close_price',
+                              aggfunc='last').sort_index()
+
+
+def calcular_retornos(precos: np.ndarray, ultimos: Optional[np.ndarray] = None
+                      ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Retornos diários alinhados (datas x ativos)
+
+    Cada retorno é relativo ao último preço conhecido do ativo; datas sem
+    cotação ficam NaN (e são ignoradas pelas estatísticas pareadas).
+
+    Returns:
+        (retornos, últimos preços conhecidos após o bloco)
+    """
+    n = precos.shape[1]
+    ultimos = np.full(n, np.nan) if ultimos is None else ultimos
+    anteriores = pd.DataFrame(np.vstack([ultimos, precos])).ffill().to_numpy()
+    return precos / anteriores[:-1] - 1, anteriores[-1]
+
+
+class EstatisticasPareadas:
+    """
+    Somas suficientes para covariância/correlação com observações pareadas
+
+    Para cada par (i, j), considerando só as datas em que ambos têm retorno:
+    N (contagem), soma de x_i, soma de x_i² e soma de x_i*x_j. Cada termo é um
+    produto de matrizes (BLAS) sobre o bloco de datas, então adicionar ou
+    remover dias custa O(dias x ativos²) - sem loop por par. O resultado é o
+    mesmo de DataFrame.cov()/corr() do pandas (pairwise complete).
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.contagem = np.zeros((n, n))
+        self.soma = np.zeros((n, n))       # soma[i, j] = Σ x_i onde i e j válidos
+        self.soma_quad = np.zeros((n, n))  # soma_quad[i, j] = Σ x_i² idem
+        self.produtos = np.zeros((n, n))   # Σ x_i * x_j
+
+    @staticmethod
+    def _termos(bloco: np.ndarray):
+        validos = ~np.isnan(bloco)
+        mascara = validos.astype(float)
+        x = np.where(validos, bloco, 0.0)
+        return mascara.T @ mascara, x.T @ mascara, (x * x).T @ mascara, x.T @ x
+
+    def adicionar(self, bloco: np.ndarray, sinal: float = 1.0):
+        if len(bloco) == 0:
+            return
+        contagem, soma, soma_quad, produtos = self._termos(np.atleast_2d(bloco))
+        self.contagem += sinal * contagem
+        self.soma += sinal * soma
+        self.soma_quad += sinal * soma_quad
+        self.produtos += sinal * produtos
+
+    def remover(self, bloco: np.ndarray):
+        self.adicionar(bloco, sinal=-1.0)
+
+    def matrizes(self, min_observacoes: int = MIN_OBSERVACOES) -> Tuple[np.ndarray, np.ndarray]:
+        """(covariância, correlação); pares com poucas observações ficam NaN"""
+        n = np.round(self.contagem)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media_cruzada = self.soma * self.soma.T / n
+            covariancia = (self.produtos - media_cruzada) / (n - 1)
+            variancia = (self.soma_quad - self.soma ** 2 / n) / (n - 1)
+            variancia = np.maximum(variancia, 0.0)
+            correlacao = covariancia / np.sqrt(variancia * variancia.T)
+
+        insuficiente = n < max(2, min_observacoes)
+        covariancia[insuficiente] = np.nan
+        correlacao[insuficiente | ~np.isfinite(correlacao)] = np.nan
+        np.clip(correlacao, -1.0, 1.0, out=correlacao)
+        return covariancia, correlacao
+
+
+class _EstadoUniverso:
+    """Estado incremental de um (universo, janela): avança dia a dia"""
+
+    def __init__(self, simbolos: List[str], janela: Optional[int]):
+        self.simbolos = simbolos
+        self.janela = janela
+        self.estatisticas = EstatisticasPareadas(len(simbolos))
+        self.buffer: deque = deque()  # retornos dentro da janela
+        self.ultimos_precos: Optional[np.ndarray] = None
+        self.ultima_data: Optional[str] = None
+        self.versao: Optional[Tuple] = None
+        self._remocoes = 0
+
+    def avancar(self, precos: pd.DataFrame):
+        """Incorpora novas datas (matriz datas x ativos, já ordenada)"""
+        if precos.empty:
+            return
+        matriz = precos.reindex(columns=self.simbolos).to_numpy(dtype=float)
+        retornos, self.ultimos_precos = calcular_retornos(matriz, self.ultimos_precos)
+
+        if self.janela is None:
+            self.estatisticas.adicionar(retornos)
+        else:
+            # Só os últimos `janela` dias do bloco podem sobreviver
+            retornos = retornos[-self.janela:]
+            self.estatisticas.adicionar(retornos)
+            self.buffer.extend(retornos)
+            saindo = len(self.buffer) - self.janela
+            if saindo > 0:
+                self.estatisticas.remover(np.array([self.buffer.popleft() for _ in range(saindo)]))
+                self._remocoes += saindo
+            # Adições/remoções acumulam erro de ponto flutuante: refaz periodicamente
+            if self._remocoes >= 10 * self.janela:
+                self.estatisticas = EstatisticasPareadas(len(self.simbolos))
+                self.estatisticas.adicionar(np.array(self.buffer))
+                self._remocoes = 0
+        self.ultima_data = str(precos.index[-1])
+
+
+def _assinatura_universo(simbolos: List[str]) -> str:
+    return hashlib.sha256(','.join(simbolos).encode('utf-8')).hexdigest()[:16]
+
+
+class MotorCorrelacao:
+    """
+    Correlação/covariância do universo de ativos a partir de price_history
+
+    - janela=None: matriz com todo o histórico; janela=N: últimos N pregões
+    - Resultados em cache LRU por (universo, janela, data de referência),
+      opcionalmente também em disco (.npz). A chave inclui a versão dos
+      dados da data de referência, então a revisão intraday do último
+      pregão não devolve uma matriz antiga.
+    - Pedidos para datas posteriores avançam o estado do universo só com
+      os dias novos em vez de recalcular o histórico. O último dia
+      processado é revalidado pela versão; os anteriores são tratados como
+      imutáveis - as cargas chamam invalidar_motores() ao regravá-los.
+    """
+
+    def __init__(self, db_path: str, min_observacoes: int = MIN_OBSERVACOES,
+                 max_cache: int = 8, diretorio_cache: Optional[str] = None):
+        self.db_path = db_path
+        self.min_observacoes = min_observacoes
+        self.max_cache = max_cache
+        self.diretorio_cache = diretorio_cache
+        self._cache: OrderedDict = OrderedDict()
+        self._estados: Dict[Tuple[str, Optional[int]], _EstadoUniverso] = {}
+        self._lock = threading.Lock()
+
+        # Consultas por intervalo de datas (avanço incremental, versão do dia)
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_price_history_date ON price_history(date)")
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass  # price_history ainda não existe
+        finally:
+            conn.close()
+
+    def invalidar(self):
+        """Descarta caches em memória e estados incrementais"""
+        with self._lock:
+            self._cache.clear()
+            self._estados.clear()
+
+    @staticmethod
+    def _versao(conn: sqlite3.Connection, data: str) -> Tuple:
+        return tuple(conn.execute(
+            "SELECT COUNT(*), MAX(created_at), TOTAL(close_price) FROM price_history "
+            "WHERE date = ?", (data,)
+        ).fetchone())
+
+    def _universo_e_data(self, conn: sqlite3.Connection, universo: Optional[List[str]],
+                         ate: Optional[str]) -> Tuple[List[str], Optional[str]]:
+        if universo:
+            simbolos = sorted({s.upper() for s in universo})
+        else:
+            simbolos = [s for (s,) in conn.execute(
+                "SELECT DISTINCT symbol FROM price_history ORDER BY symbol")]
+        query, params = "SELECT MAX(date) FROM price_history", []
+        if ate:
+            query += " WHERE date <= ?"
+            params.append(ate)
+        return simbolos, conn.execute(query, params).fetchone()[0]
+
+    def _arquivo_cache(self, chave: Tuple) -> Optional[str]:
+        if not self.diretorio_cache:
+            return None
+        assinatura, janela, data, versao = chave
+        sufixo = hashlib.sha256(repr(versao).encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.diretorio_cache,
+                            f"corr_{assinatura}_{janela or 'total'}_{data}_{sufixo}.npz")
+
+    def _guardar(self, chave: Tuple, resultado: Dict):
+        self._cache[chave] = resultado
+        self._cache.move_to_end(chave)
+        while len(self._cache) > self.max_cache:
+            self._cache.popitem(last=False)
+
+    def _estado_ate(self, conn: sqlite3.Connection, simbolos: List[str],
+                    janela: Optional[int], data: str, versao: Tuple) -> _EstadoUniverso:
+        chave_estado = (_assinatura_universo(simbolos), janela)
+        estado = self._estados.get(chave_estado)
+        # O último pregão processado pode ter sido revisado depois (intraday):
+        # só reaproveita se a versão dele ainda é a que entrou no estado
+        reaproveitavel = (estado is not None and estado.ultima_data is not None
+                          and estado.ultima_data <= data
+                          and self._versao(conn, estado.ultima_data) == estado.versao)
+        if not reaproveitavel:
+            estado = _EstadoUniverso(simbolos, janela)
+
+        estado.avancar(carregar_precos(conn, apos=estado.ultima_data, ate=data))
+        estado.versao = versao
+        self._estados[chave_estado] = estado
+        return estado
+
+    def matrizes(self, universo: Optional[List[str]] = None, janela: Optional[int] = JANELA_PADRAO,
+                 ate: Optional[str] = None) -> Dict:
+        """
+        Covariância e correlação do universo na data de referência
+
+        Args:
+            universo: Ativos considerados (padrão: todos de price_history)
+            janela: Pregões da janela móvel (None = histórico completo)
+            ate: Data de referência YYYY-MM-DD (padrão: última disponível)
+
+        Returns:
+            {'simbolos', 'data', 'janela', 'covariancia', 'correlacao'}
+        """
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                simbolos, data = self._universo_e_data(conn, universo, ate)
+                if not simbolos or data is None:
+                    return {'simbolos': [], 'data': None, 'janela': janela,
+                            'covariancia': np.empty((0, 0)), 'correlacao': np.empty((0, 0))}
+
+                chave = (_assinatura_universo(simbolos), janela, data, self._versao(conn, data))
+                if chave in self._cache:
+                    registrar_cache('correlacao_memoria', True)
+                    self._cache.move_to_end(chave)
+                    return self._cache[chave]
+                registrar_cache('correlacao_memoria', False)
+
+                arquivo = self._arquivo_cache(chave)
+                if arquivo:
+                    registrar_cache('correlacao_disco', os.path.exists(arquivo))
+                if arquivo and os.path.exists(arquivo):
+                    with np.load(arquivo) as dados:
+                        resultado = {'simbolos': simbolos, 'data': data, 'janela': janela,
+                                     'covariancia': dados['covariancia'],
+                                     'correlacao': dados['correlacao']}
+                    self._guardar(chave, resultado)
+                    return resultado
+
+                estado = self._estado_ate(conn, simbolos, janela, data, chave[3])
+            finally:
+                conn.close()
+
+            covariancia, correlacao = estado.estatisticas.matrizes(self.min_observacoes)
+            resultado = {'simbolos': simbolos, 'data': data, 'janela': janela,
+                         'covariancia': covariancia, 'correlacao': correlacao}
+            self._guardar(chave, resultado)
+            if arquivo:
+                os.makedirs(self.diretorio_cache, exist_ok=True)
+                np.savez(arquivo, covariancia=covariancia, correlacao=correlacao)
+            return resultado
+
+    def submatriz(self, simbolos: List[str], universo: Optional[List[str]] = None,
+                  janela: Optional[int] = JANELA_PADRAO, ate: Optional[str] = None) -> Dict:
+        """
+        Recorte da matriz do universo para `simbolos` (a matriz completa é
+        calculada uma vez e reaproveitada entre consultas)
+
+        Raises:
+            KeyError: se algum símbolo não pertence ao universo
+        """
+        resultado = self.matrizes(universo, janela, ate)
+        posicoes = {s: i for i, s in enumerate(resultado['simbolos'])}
+        pedidos = [s.upper() for s in simbolos]
+        faltando = [s for s in pedidos if s not in posicoes]
+        if faltando:
+            raise KeyError(f"Ativos fora do universo: {faltando}")
+
+        indices = np.array([posicoes[s] for s in pedidos], dtype=int)
+        recorte = np.ix_(indices, indices)
+        return {'simbolos': pedidos, 'data': resultado['data'], 'janela': janela,
+                'covariancia': resultado['covariancia'][recorte],
+                'correlacao': resultado['correlacao'][recorte]}
+
+
+_motores: Dict[str, MotorCorrelacao] = {}
+_motores_lock = threading.Lock()
+
+
+def obter_motor_correlacao(db_path: str, **config) -> MotorCorrelacao:
+    """Motor compartilhado por banco (o cache vale para todo o processo)"""
+    chave = os.path.abspath(db_path)
+    with _motores_lock:
+        if chave not in _motores:
+            _motores[chave] = MotorCorrelacao(db_path, **config)
+        return _motores[chave]
+
+
+def invalidar_motores(db_path: Optional[str] = None):
+    """Descarta o estado dos motores compartilhados do banco (todos, se None) após uma carga"""
+    with _motores_lock:
+        motores = [motor for chave, motor in _motores.items()
+                   if db_path is None or chave == os.path.abspath(db_path)]
+    for motor in motores:
+        motor.invalidar()
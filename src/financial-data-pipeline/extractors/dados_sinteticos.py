@@ -0,0 +1,271 @@
+# dados_sinteticos.py - Gerador vetorizado de painéis OHLCV (GBM) para testes de carga
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from correlacoes import invalidar_motores
+from indicadores import recalcular_indicadores
+from resumo_ativos import atualizar_resumo
+
+DIAS_UTEIS_ANO = 252
+LINHAS_POR_BLOCO = 1_000_000  # linhas (ativo x dia) por DataFrame gerado
+SIMBOLOS_POR_RECALCULO = 500  # limita a memória do recálculo de indicadores
+
+# Colunas no formato de price_history (o mesmo de transform_price_data)
+COLUNAS_PRECOS = ['symbol', 'date', 'open_price', 'high_price', 'low_price',
+                  'close_price', 'adjusted_close', 'volume']
+
+# Um gerador independente por componente: a sequência de cada um é consumida
+# dia a dia, então o painel não depende do tamanho do bloco
+COMPONENTES = ('parametros', 'retornos', 'abertura', 'amplitude', 'volume')
+
+
+def _geradores(semente: Optional[int]) -> Dict[str, np.random.Generator]:
+    filhos = np.random.SeedSequence(semente).spawn(len(COMPONENTES))
+    return {nome: np.random.default_rng(filho) for nome, filho in zip(COMPONENTES, filhos)}
+
+
+def _simbolos(simbolos: Union[int, Sequence[str]]) -> np.ndarray:
+    if isinstance(simbolos, int):
+        return np.array([f"SIM{i:05d}" for i in range(simbolos)], dtype=object)
+    return np.array([s.upper() for s in simbolos], dtype=object)
+
+
+def _datas(dias: int, inicio: Optional[str], fim: Optional[str],
+           frequencia: str) -> pd.DatetimeIndex:
+    if inicio:
+        return pd.date_range(start=inicio, periods=dias, freq=frequencia)
+    return pd.date_range(end=pd.Timestamp(fim or datetime.now().date()), periods=dias,
+                         freq=frequencia)
+
+
+def gerar_blocos(simbolos: Union[int, Sequence[str]], dias: int, semente: Optional[int] = None,
+                 inicio: Optional[str] = None, fim: Optional[str] = None, frequencia: str = 'B',
+                 drift: float = 0.08, volatilidade: Tuple[float, float] = (0.15, 0.60),
+                 preco_inicial: Tuple[float, float] = (20.0, 200.0),
+                 volume_medio: Tuple[float, float] = (1e5, 1e7),
+                 linhas_por_bloco: int = LINHAS_POR_BLOCO) -> Iterator[pd.DataFrame]:
+    """
+    Painel OHLCV sintético por movimento browniano geométrico, em blocos
+
+    Cada ativo recebe drift, volatilidade anual, preço inicial e volume
+    médio próprios; os fechamentos saem da soma acumulada dos log-retornos
+    de um bloco de dias x ativos inteiro (uma chamada NumPy por bloco).
+    Abertura, máxima e mínima são coerentes com o fechamento e o volume
+    cresce com o tamanho do movimento do dia.
+
+    Args:
+        simbolos: Quantidade de ativos (SIM00000, ...) ou lista de códigos
+        dias: Pregões por ativo
+        semente: Mesma semente -> mesmo painel, para qualquer linhas_por_bloco
+        inicio / fim: Primeira ou última data (padrão: termina hoje)
+        frequencia: 'B' (dias úteis) ou 'D' (corridos)
+        linhas_por_bloco: Tamanho aproximado de cada DataFrame
+
+    Yields:
+        DataFrames com COLUNAS_PRECOS, ordenados por (data, símbolo)
+    """
+    codigos = _simbolos(simbolos)
+    n = len(codigos)
+    if n == 0 or dias <= 0:
+        return
+    datas = _datas(dias, inicio, fim, frequencia).strftime('%Y-%m-%d').to_numpy(dtype=object)
+    geradores = _geradores(semente)
+
+    parametros = geradores['parametros']
+    sigma = parametros.uniform(*volatilidade, size=n)
+    mu = drift + parametros.normal(0.0, 0.05, size=n)
+    log_preco = np.log(parametros.uniform(*preco_inicial, size=n))
+    log_volume = parametros.uniform(*np.log(volume_medio), size=n)
+
+    dt = 1.0 / DIAS_UTEIS_ANO
+    sigma_dia = sigma * np.sqrt(dt)
+    tendencia = (mu - 0.5 * sigma ** 2) * dt
+    dias_por_bloco = max(1, linhas_por_bloco // n)
+
+    for inicio_bloco in range(0, dias, dias_por_bloco):
+        k = min(dias_por_bloco, dias - inicio_bloco)
+        log_retornos = tendencia + sigma_dia * geradores['retornos'].standard_normal((k, n))
+        log_fechamento = log_preco + np.cumsum(log_retornos, axis=0)
+        anterior = np.exp(np.vstack([log_preco, log_fechamento[:-1]]))
+        fechamento = np.exp(log_fechamento)
+        log_preco = log_fechamento[-1]
+
+        choque_abertura = geradores['abertura'].standard_normal((k, n))
+        abertura = anterior * np.exp(0.25 * sigma_dia * choque_abertura)
+        amplitude = 0.5 * sigma_dia * np.abs(geradores['amplitude'].standard_normal((k, 2, n)))
+        maxima = np.maximum(abertura, fechamento) * np.exp(amplitude[:, 0])
+        minima = np.minimum(abertura, fechamento) * np.exp(-amplitude[:, 1])
+        volume = np.exp(log_volume + 0.4 * geradores['volume'].standard_normal((k, n)))
+        volume *= 1 + np.abs(log_retornos) / sigma_dia
+
+        fechamento = np.round(fechamento, 4).ravel()
+        yield pd.DataFrame({
+            'symbol': np.tile(codigos, k),
+            'date': np.repeat(datas[inicio_bloco:inicio_bloco + k], n),
+            'open_price': np.round(abertura, 4).ravel(),
+            'high_price': np.round(maxima, 4).ravel(),
+            'low_price': np.round(minima, 4).ravel(),
+            'close_price': fechamento,
+            'adjusted_close': fechamento,
+            'volume': volume.astype(np.int64).ravel(),
+        }, columns=COLUNAS_PRECOS)
+
+
+def gerar_painel(simbolos: Union[int, Sequence[str]], dias: int, semente: Optional[int] = None,
+                 **opcoes) -> pd.DataFrame:
+    """Painel inteiro em memória (ver gerar_blocos), ordenado por (símbolo, data)"""
+    blocos = list(gerar_blocos(simbolos, dias, semente, **opcoes))
+    if not blocos:
+        return pd.DataFrame(columns=COLUNAS_PRECOS)
+    painel = pd.concat(blocos, ignore_index=True)
+    return painel.sort_values(['symbol', 'date'], kind='stable').reset_index(drop=True)
+
+
+def gerar_cotacoes(simbolos: Sequence[str], rng: np.random.Generator,
+                   precos_base: Optional[Dict[str, float]] = None,
+                   faixa_preco: Tuple[float, float] = (20.0, 100.0),
+                   faixa_volume: Tuple[int, int] = (100_000, 2_000_000),
+                   variacao_maxima: float = 5.0) -> pd.DataFrame:
+    """
+    Cotação do dia de vários ativos numa única amostragem
+
+    Ativos com preço base partem dele com variação de até
+    ±variacao_maxima%; os demais sorteiam o preço na faixa.
+
+    Returns:
+        DataFrame com codigo, preco, volume e variacao (%)
+    """
+    codigos = [s.upper() for s in simbolos]
+    precos_base = precos_base or {}
+    variacao = rng.uniform(-variacao_maxima, variacao_maxima, size=len(codigos))
+    sorteado = rng.uniform(*faixa_preco, size=len(codigos))
+    base = np.array([precos_base.get(c, np.nan) for c in codigos], dtype=float)
+    preco = np.where(np.isnan(base), sorteado, base * (1 + variacao / 100))
+    return pd.DataFrame({
+        'codigo': codigos,
+        'preco': np.round(preco, 2),
+        'volume': rng.integers(faixa_volume[0], faixa_volume[1], size=len(codigos), endpoint=True),
+        'variacao': np.round(variacao, 2),
+    })
+
+
+def carregar_blocos(db_path: str, blocos: Iterable[pd.DataFrame], recalcular: bool = True) -> int:
+    """
+    Grava blocos no formato de price_history (upsert em lote, um commit por
+    bloco) e, ao final, recalcula indicadores e resumo dos ativos tocados
+
+    O schema (price_history, assets, ...) deve existir - é criado pelo
+    ETLFinanceiroReal. O estado incremental dos ativos e dos motores de
+    correlação é descartado para ser reconstruído a partir do novo histórico.
+
+    Returns:
+        Número de linhas de preço gravadas
+    """
+    conn = sqlite3.connect(db_path)
+    simbolos: set = set()
+    linhas = 0
+    try:
+        existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                              "AND name = 'price_history'").fetchone()
+        if not existe:
+            raise RuntimeError(f"price_history não existe em {db_path} (crie o schema com o ETL)")
+
+        agora = datetime.now().isoformat()
+        for bloco in blocos:
+            novos = set(bloco['symbol'].unique()) - simbolos
+            conn.executemany('''
+                INSERT OR IGNORE INTO assets (symbol, name, exchange, updated_at)
+                VALUES (?, ?, 'Synthetic', ?)
+            ''', [(s, f"{s} Synthetic", agora) for s in sorted(novos)])
+            conn.executemany(f'''
+                INSERT OR REPLACE INTO price_history ({', '.join(COLUNAS_PRECOS)})
+                VALUES ({', '.join('?' * len(COLUNAS_PRECOS))})
+            ''', bloco[COLUNAS_PRECOS].itertuples(index=False, name=None))
+            conn.commit()
+            simbolos |= novos
+            linhas += len(bloco)
+        invalidar_motores(db_path)
+
+        estado = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                              "AND name = 'indicator_state'").fetchone()
+        if recalcular and simbolos and estado:
+            conn.executemany("DELETE FROM indicator_state WHERE symbol = ?",
+                             [(s,) for s in simbolos])
+            conn.commit()
+    finally:
+        conn.close()
+
+    if recalcular and simbolos:
+        ordenados = sorted(simbolos)
+        for i in range(0, len(ordenados), SIMBOLOS_POR_RECALCULO):
+            recalcular_indicadores(db_path, ordenados[i:i + SIMBOLOS_POR_RECALCULO])
+        conn = sqlite3.connect(db_path)
+        try:
+            atualizar_resumo(conn, ordenados)
+        finally:
+            conn.close()
+    return linhas
+
+
+def exportar_csv(caminho: str, blocos: Iterable[pd.DataFrame]) -> int:
+    """Escreve os blocos num CSV (gzip se o caminho terminar em .gz) sem montar o painel"""
+    linhas = 0
+    compressao = 'gzip' if caminho.endswith('.gz') else None
+    with open(caminho, 'wb') as arquivo:
+        for bloco in blocos:
+            bloco.to_csv(arquivo, index=False, header=linhas == 0, compression=compressao)
+            linhas += len(bloco)
+    return linhas
+
+
+def main():
+    """
+    CLI: python dados_sinteticos.py --simbolos 1000 --dias 252 --semente 42
+    --db data/financial_data.db
+    """
+    parser = argparse.ArgumentParser(
+        description="Gera painéis OHLCV sintéticos (GBM) para testes de carga")
+    parser.add_argument('--simbolos', type=int, default=1000, help="Quantidade de ativos")
+    parser.add_argument('--dias', type=int, default=DIAS_UTEIS_ANO, help="Pregões por ativo")
+    parser.add_argument('--semente', type=int, help="Semente (mesma semente -> mesmo painel)")
+    parser.add_argument('--inicio', help="Primeira data YYYY-MM-DD (padrão: termina hoje)")
+    parser.add_argument('--bloco', type=int, default=LINHAS_POR_BLOCO, help="Linhas por bloco")
+    parser.add_argument('--db', help="Banco do ETL para carga (schema já criado)")
+    parser.add_argument('--csv', help="Arquivo CSV de saída (.csv.gz para gzip)")
+    parser.add_argument('--sem-indicadores', action='store_true',
+                        help="Não recalcula indicadores na carga")
+    args = parser.parse_args()
+
+    if not args.db and not args.csv:
+        parser.error("informe --db e/ou --csv")
+
+    def blocos():
+        return gerar_blocos(args.simbolos, args.dias, args.semente, inicio=args.inicio,
+                            linhas_por_bloco=args.bloco)
+
+    total = args.simbolos * args.dias
+    print(f"🎲 Gerando {args.simbolos} ativos x {args.dias} pregões ({total:,} linhas)")
+    if args.csv:
+        inicio = time.perf_counter()
+        os.makedirs(os.path.dirname(args.csv) or '.', exist_ok=True)
+        linhas = exportar_csv(args.csv, blocos())
+        print(f"📄 {linhas:,} linhas em {args.csv} ({time.perf_counter() - inicio:.1f}s)")
+    if args.db:
+        inicio = time.perf_counter()
+        try:
+            linhas = carregar_blocos(args.db, blocos(), recalcular=not args.sem_indicadores)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return
+        print(f"💾 {linhas:,} linhas carregadas em {args.db} ({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
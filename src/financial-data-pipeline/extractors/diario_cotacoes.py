@@ -0,0 +1,236 @@
+# diario_cotacoes.py - Diário append-only de cotações (NDJSON) com rotação
+# e índice de offsets por ativo
+import argparse
+import glob
+import json
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pool_chaves import trava_arquivo
+
+PASTA_PADRAO = "data/diario"
+TAMANHO_MAXIMO_SEGMENTO = 64 * 1024 * 1024  # bytes por segmento antes de rotacionar
+
+
+class DiarioCotacoes:
+    """
+    Cotações gravadas só por append em segmentos NDJSON (um JSON por linha):
+
+        cotacoes-000001.ndjson   registros
+        cotacoes-000001.idx      "CODIGO<TAB>offset<TAB>bytes" por registro
+
+    Salvar custa o tamanho do lote, não do arquivo. Quando o segmento passa
+    de `tamanho_maximo`, o próximo lote abre um novo. Para ler um ativo, o
+    leitor consulta o índice (pequeno, lido de forma incremental) e faz seek
+    direto nos registros, sem decodificar o resto do diário.
+
+    Vários processos podem gravar na mesma pasta: cada lote (dados + índice)
+    é gravado sob o lock de arquivo <prefixo>.lock. Se um processo cair entre
+    os dados e o índice, o .idx fica atrás do .ndjson; a próxima gravação ou
+    leitura do segmento percebe e chama reindexar().
+    """
+
+    def __init__(self, pasta: str = PASTA_PADRAO, tamanho_maximo: int = TAMANHO_MAXIMO_SEGMENTO,
+                 prefixo: str = "cotacoes", chave: str = "codigo"):
+        self.pasta = pasta
+        self.tamanho_maximo = tamanho_maximo
+        self.prefixo = prefixo
+        self.chave = chave
+        self._trava = threading.Lock()
+        self._caminho_trava = os.path.join(pasta, f"{prefixo}.lock")
+        # segmento -> (bytes do .idx já lidos, fim do último registro indexado,
+        #              codigo -> [(offset, bytes)])
+        self._indices: Dict[str, Tuple[int, int, Dict[str, List[Tuple[int, int]]]]] = {}
+        os.makedirs(pasta, exist_ok=True)
+
+    def segmentos(self) -> List[str]:
+        """Segmentos em ordem de gravação"""
+        return sorted(glob.glob(os.path.join(self.pasta, f"{self.prefixo}-*.ndjson")))
+
+    def _segmento_para(self, tamanho_lote: int) -> str:
+        segmentos = self.segmentos()
+        if segmentos:
+            atual = segmentos[-1]
+            tamanho = os.path.getsize(atual)
+            if tamanho == 0 or tamanho + tamanho_lote <= self.tamanho_maximo:
+                return atual
+            numero = int(os.path.basename(atual)[len(self.prefixo) + 1:-len(".ndjson")]) + 1
+        else:
+            numero = 1
+        return os.path.join(self.pasta, f"{self.prefixo}-{numero:06d}.ndjson")
+
+    def registrar(self, registros: Iterable[Dict], chave: Optional[str] = None) -> int:
+        """
+        Acrescenta os registros ao diário (o lote inteiro vai para um segmento)
+
+        Args:
+            registros: Dicts serializáveis em JSON, com o código do ativo em `chave`
+            chave: Campo usado no índice (padrão: o do diário)
+
+        Returns:
+            Registros gravados
+        """
+        chave = chave or self.chave
+        linhas, codigos = [], []
+        for registro in registros:
+            linhas.append((json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8"))
+            codigos.append(str(registro[chave]).upper())
+        if not linhas:
+            return 0
+
+        with self._trava, trava_arquivo(self._caminho_trava):
+            segmentos = self.segmentos()
+            if segmentos:
+                # Lote anterior interrompido: indexa antes de acrescentar depois dele
+                self._reindexar(segmentos[-1])
+            segmento = self._segmento_para(sum(len(linha) for linha in linhas))
+            with open(segmento, "ab") as dados:
+                offset = dados.tell()
+                dados.write(b"".join(linhas))
+            # Índice depois dos dados: se cair no meio, o índice fica atrasado
+            # e reindexar() recupera os registros órfãos
+            entradas = []
+            for codigo, linha in zip(codigos, linhas):
+                entradas.append(f"{codigo}\t{offset}\t{len(linha)}\n")
+                offset += len(linha)
+            with open(segmento[:-len(".ndjson")] + ".idx", "a", encoding="utf-8") as indice:
+                indice.write("".join(entradas))
+        return len(linhas)
+
+    def _atualizar_indice(self, segmento: str) -> Tuple[int, int, Dict[str, List[Tuple[int, int]]]]:
+        # Lê só o que foi acrescentado ao .idx desde a última consulta
+        lidos, fim, indice = self._indices.get(segmento, (0, 0, {}))
+        caminho = segmento[:-len(".ndjson")] + ".idx"
+        if os.path.exists(caminho) and os.path.getsize(caminho) > lidos:
+            with open(caminho, "rb") as arquivo:
+                arquivo.seek(lidos)
+                novos = arquivo.read()
+            completos = novos[:novos.rfind(b"\n") + 1]  # ignora linha em escrita
+            for linha in completos.decode("utf-8").splitlines():
+                codigo, offset, tamanho = linha.split("\t")
+                indice.setdefault(codigo, []).append((int(offset), int(tamanho)))
+                fim = max(fim, int(offset) + int(tamanho))
+            lidos += len(completos)
+        self._indices[segmento] = (lidos, fim, indice)
+        return lidos, fim, indice
+
+    def _indice(self, segmento: str) -> Dict[str, List[Tuple[int, int]]]:
+        _, fim, indice = self._atualizar_indice(segmento)
+        if fim < os.path.getsize(segmento):
+            # Dados além do índice: lote em gravação (o lock espera terminar) ou queda
+            self.reindexar(segmento)
+            _, _, indice = self._atualizar_indice(segmento)
+        return indice
+
+    def reindexar(self, segmento: str) -> int:
+        """
+        Indexa os registros do segmento que ficaram sem entrada no .idx
+        (queda entre a gravação dos dados e a do índice), reescaneando o
+        .ndjson a partir do fim do último registro indexado
+
+        Returns:
+            Registros acrescentados ao índice
+        """
+        with self._trava, trava_arquivo(self._caminho_trava):
+            return self._reindexar(segmento)
+
+    def _reindexar(self, segmento: str) -> int:
+        # Chamado com as travas tomadas: nenhum lote está no meio da gravação
+        lidos, fim, _ = self._atualizar_indice(segmento)
+        caminho_indice = segmento[:-len(".ndjson")] + ".idx"
+        if os.path.exists(caminho_indice) and os.path.getsize(caminho_indice) > lidos:
+            os.truncate(caminho_indice, lidos)  # linha de índice incompleta
+        if fim >= os.path.getsize(segmento):
+            return 0
+
+        entradas = []
+        with open(segmento, "r+b") as dados:
+            dados.seek(fim)
+            offset = fim
+            for linha in iter(dados.readline, b""):
+                if not linha.endswith(b"\n"):
+                    dados.truncate(offset)  # registro incompleto: descartado
+                    break
+                codigo = str(json.loads(linha)[self.chave]).upper()
+                entradas.append(f"{codigo}\t{offset}\t{len(linha)}\n")
+                offset += len(linha)
+        if entradas:
+            with open(caminho_indice, "a", encoding="utf-8") as indice:
+                indice.write("".join(entradas))
+        return len(entradas)
+
+    def ler(self, codigo: str, limite: Optional[int] = None) -> List[Dict]:
+        """
+        Registros de um ativo em ordem de gravação (seek direto pelo índice)
+
+        Args:
+            codigo: Código do ativo
+            limite: Só os `limite` registros mais recentes
+        """
+        codigo = codigo.upper()
+        posicoes = [(segmento, posicao) for segmento in self.segmentos()
+                    for posicao in self._indice(segmento).get(codigo, [])]
+        if limite is not None:
+            posicoes = posicoes[-limite:] if limite else []
+
+        registros, aberto, arquivo = [], None, None
+        try:
+            for segmento, (offset, tamanho) in posicoes:
+                if segmento != aberto:
+                    if arquivo:
+                        arquivo.close()
+                    arquivo, aberto = open(segmento, "rb"), segmento
+                arquivo.seek(offset)
+                registros.append(json.loads(arquivo.read(tamanho)))
+        finally:
+            if arquivo:
+                arquivo.close()
+        return registros
+
+    def ultimo(self, codigo: str) -> Optional[Dict]:
+        """Registro mais recente do ativo (None se nunca foi salvo)"""
+        registros = self.ler(codigo, limite=1)
+        return registros[0] if registros else None
+
+    def simbolos(self) -> List[str]:
+        """Ativos presentes no diário"""
+        return sorted({codigo for segmento in self.segmentos()
+                       for codigo in self._indice(segmento)})
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Todos os registros, em ordem de gravação (leitura sequencial)"""
+        for segmento in self.segmentos():
+            with open(segmento, "rb") as arquivo:
+                for linha in arquivo:
+                    if linha.endswith(b"\n"):
+                        yield json.loads(linha)
+
+    def importar_json(self, caminho: str) -> int:
+        """Migra um arquivo no formato antigo (lista JSON de cotações) para o diário"""
+        with open(caminho, encoding="utf-8") as arquivo:
+            return self.registrar(json.load(arquivo))
+
+
+def main():
+    """CLI: python diario_cotacoes.py PETR4 --limite 5 | --importar minhas_acoes.json"""
+    parser = argparse.ArgumentParser(description="Consulta o diário de cotações")
+    parser.add_argument('codigos', nargs='*', help="Ativos (padrão: lista os ativos do diário)")
+    parser.add_argument('--limite', type=int, help="Só os N registros mais recentes")
+    parser.add_argument('--pasta', default=PASTA_PADRAO, help="Pasta do diário")
+    parser.add_argument('--importar', nargs='+', metavar='JSON',
+                        help="Arquivos JSON antigos a migrar")
+    args = parser.parse_args()
+
+    diario = DiarioCotacoes(args.pasta)
+    for caminho in args.importar or []:
+        print(f"📥 {diario.importar_json(caminho)} registros importados de {caminho}")
+    if not args.codigos:
+        print(f"📚 {len(diario.segmentos())} segmentos, ativos: {', '.join(diario.simbolos())}")
+    for codigo in args.codigos:
+        for registro in diario.ler(codigo, args.limite):
+            print(json.dumps(registro, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,23 @@ import time
 import random
 from typing import List, Dict, Optional
 
+import numpy as np
+
+from cache_relatorios import CacheRelatorios, chave_conteudo
+from dados_sinteticos import gerar_cotacoes
+from exportacao import de_dataframe, exportar_csv, exportar_excel
+from pipeline_estagios import Estagio, PipelineEstagios
+from planejador_refresh import PlanejadorRefresh, carregar_ultimas_atualizacoes
+from provedores import url_yahoo
+from resiliencia import (LimitadorTaxa, OrcamentoExecucao, PoliticaRetry, interpretar_retry_after,
+                         obter_roteador)
+from perfil import perfilavel
+from telemetria import FALLBACKS, RESPOSTAS_429, RETENTATIVAS, etapa, execucao
+
 class ETLFinanceiroRobusto:
     """ETL que resolve problemas de rate limiting e funciona 100%"""
     
-    def __init__(self):
+    def __init__(self, semente: Optional[int] = None):
         print("SISTEMA ETL FINANCEIRO - VERSÃO ROBUSTA")
         print("Solução para rate limiting + dados reais + fallback")
         print("=" * 60)
@@ -20,6 +33,9 @@ class ETLFinanceiroRobusto:
         # Criar estrutura de pastas
         self.criar_estrutura_pastas()
         
+        # Relatórios endereçados pelo conteúdo (mesmos dados -> mesmo arquivo)
+        self.cache_relatorios = CacheRelatorios("reports")
+        
         # Configurar banco
         self.db_path = "data/portfolio.db"
         self.criar_banco()
@@ -31,6 +47,17 @@ class ETLFinanceiroRobusto:
             'Accept-Language': 'en-US,en;q=0.9',
         }
         
+        # Gerador dos dados simulados (semente fixa -> fallback reproduzível)
+        self.rng = np.random.default_rng(semente)
+        
+        # Circuit breaker + roteamento compartilhado entre instâncias
+        self.roteador = obter_roteador('robusto')
+        self.roteador.registrar('yahoo', sonda_saude=self._sonda_yahoo,
+                                limite_falhas=3, tempo_abertura=60.0)
+        
+        # Backoff exponencial com teto e jitter completo
+        self.politica_retry = PoliticaRetry(max_tentativas=3, base=1.0, teto=8.0)
+        
         print("Sistema ETL iniciado com sucesso!")
         print("=" * 60)
 
@@ -65,20 +92,46 @@ class ETLFinanceiroRobusto:
         conn.close()
         print("Banco de dados SQLite criado!")
 
-    def extrair_yahoo_finance_alternativo(self, symbol: str, max_tentativas: int = 3) -> Optional[Dict]:
+    def extrair_yahoo_finance_alternativo(self, symbol: str, max_tentativas: Optional[int] = None,
+                                          orcamento: Optional[OrcamentoExecucao] = None
+                                          ) -> Optional[Dict]:
         """
         Extrator alternativo do Yahoo Finance com múltiplas tentativas
+        
+        Retentativas usam backoff exponencial com jitter (respeitando Retry-After)
+        e nunca ultrapassam o `orcamento` da execução.
         """
+        if max_tentativas is None:
+            max_tentativas = self.politica_retry.max_tentativas
+        orcamento = orcamento or OrcamentoExecucao()
+        retry_after = None
+        
         for tentativa in range(max_tentativas):
+            # Provedor sabidamente fora do ar: não gastar tentativas
+            if not self.roteador.disponivel('yahoo'):
+                print(f"   Circuito do Yahoo Finance aberto, pulando {symbol}")
+                return None
+            
+            # Backoff entre tentativas, limitado ao orçamento
+            if tentativa > 0:
+                RETENTATIVAS.inc(provedor='yahoo')
+                delay = self.politica_retry.atraso(tentativa - 1, retry_after)
+                if not orcamento.pode_aguardar(delay):
+                    # Desistência sem requisição: devolve a vaga de sonda do circuito
+                    self.roteador.liberar('yahoo')
+                    print(f"   Orçamento esgotado, desistindo de {symbol}")
+                    return None
+                print(f"   Aguardando {delay:.1f}s antes da tentativa {tentativa + 1}...")
+                time.sleep(delay)
+            
+            if orcamento.esgotado():
+                self.roteador.liberar('yahoo')
+                return None
+            
+            inicio = time.perf_counter()
             try:
-                # Delay progressivo entre tentativas
-                if tentativa > 0:
-                    delay = (tentativa * 2) + random.uniform(1, 3)
-                    print(f"   Aguardando {delay:.1f}s antes da tentativa {tentativa + 1}...")
-                    time.sleep(delay)
-                
                 # URL alternativa mais simples
-                url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+                url = url_yahoo(f"/v8/finance/chart/{symbol}")
                 params = {
                     'period1': int((datetime.now() - timedelta(days=7)).timestamp()),
                     'period2': int(datetime.now().timestamp()),
@@ -87,25 +140,47 @@ class ETLFinanceiroRobusto:
                 }
                 
                 print(f"   Tentativa {tentativa + 1}: Conectando com Yahoo Finance...")
-                response = requests.get(url, params=params, headers=self.headers, timeout=10)
+                with etapa('extract', 'yahoo'):
+                    response = requests.get(url, params=params, headers=self.headers,
+                                            timeout=orcamento.timeout(10))
+                latencia = time.perf_counter() - inicio
+                retry_after = None
                 
                 if response.status_code == 200:
-                    data = response.json()
-                    if 'chart' in data and data['chart']['result']:
-                        return self._processar_dados_yahoo(data, symbol)
+                    self.roteador.registrar_sucesso('yahoo', latencia)
+                    with etapa('parse', 'yahoo'):
+                        data = response.json()
+                        if 'chart' in data and data['chart']['result']:
+                            return self._processar_dados_yahoo(data, symbol)
                 
-                elif response.status_code == 429:
-                    print(f"   Rate limit atingido para {symbol} (tentativa {tentativa + 1})")
+                elif response.status_code == 429 or response.status_code >= 500:
+                    if response.status_code == 429:
+                        RESPOSTAS_429.inc(provedor='yahoo')
+                    self.roteador.registrar_falha('yahoo', latencia)
+                    retry_after = interpretar_retry_after(response.headers.get('Retry-After'))
+                    print(f"   Erro HTTP {response.status_code} para {symbol} "
+                          f"(tentativa {tentativa + 1})")
                     continue
                 else:
+                    # Provedor respondeu: o problema é do símbolo, não do serviço
+                    self.roteador.registrar_sucesso('yahoo', latencia)
                     print(f"   Erro HTTP {response.status_code} para {symbol}")
+                    return None
                     
             except Exception as e:
+                self.roteador.registrar_falha('yahoo', time.perf_counter() - inicio)
                 print(f"   Erro na tentativa {tentativa + 1}: {str(e)}")
                 continue
         
         return None
 
+    def _sonda_yahoo(self) -> bool:
+        """Sonda de saúde barata usada quando o circuito está meio-aberto"""
+        url = url_yahoo("/v8/finance/chart/AAPL")
+        response = requests.get(url, params={'range': '1d', 'interval': '1d'},
+                                headers=self.headers, timeout=5)
+        return response.status_code < 500 and response.status_code != 429
+
     def _processar_dados_yahoo(self, data: Dict, symbol: str) -> Dict:
         """Processa resposta da API do Yahoo Finance"""
         try:
@@ -160,39 +235,83 @@ class ETLFinanceiroRobusto:
             'VALE3.SA': 85.0, 'ITUB4.SA': 29.0
         }
         
-        preco_base = precos_base.get(symbol, 100.0)
-        variacao = random.uniform(-5, 5)
-        preco_atual = preco_base * (1 + variacao/100)
+        cotacao = gerar_cotacoes([symbol], self.rng,
+                                 {symbol.upper(): precos_base.get(symbol, 100.0)},
+                                 faixa_volume=(1000000, 10000000)).iloc[0]
         
         return {
             'codigo': symbol,
             'nome': empresas.get(symbol, f'{symbol} Corp'),
-            'preco': round(preco_atual, 2),
-            'volume': random.randint(1000000, 10000000),
-            'variacao': round(variacao, 2),
+            'preco': float(cotacao['preco']),
+            'volume': int(cotacao['volume']),
+            'variacao': float(cotacao['variacao']),
             'data': datetime.now().strftime('%Y-%m-%d'),
             'fonte': 'Simulado (API indisponível)'
         }
 
-    def extrair_dados_acao(self, symbol: str) -> Optional[Dict]:
+    def extrair_dados_acao(self, symbol: str,
+                           orcamento: Optional[OrcamentoExecucao] = None) -> Optional[Dict]:
         """
         Extrai dados de uma ação com fallback automático
         """
         print(f"\n[EXTRAINDO] {symbol}...")
         
-        # Primeira tentativa: Yahoo Finance
-        dados = self.extrair_yahoo_finance_alternativo(symbol)
+        # Provedores ordenados por saúde recente (circuitos abertos são pulados)
+        extratores = {'yahoo': self.extrair_yahoo_finance_alternativo}
+        for provedor in self.roteador.ordenar(list(extratores)):
+            if orcamento is not None and orcamento.esgotado():
+                break
+            dados = extratores[provedor](symbol, orcamento=orcamento)
+            if dados:
+                print(f"   SUCESSO ({provedor}): {symbol} - R$ {dados['preco']}")
+                return dados
         
-        if dados:
-            print(f"   SUCESSO (Yahoo): {symbol} - R$ {dados['preco']}")
-            return dados
+        return self._dados_fallback(symbol)
+
+    def _dados_fallback(self, symbol: str) -> Dict:
+        """Última cotação do banco marcada como desatualizada; senão, simulada"""
+        dados_cache = self._ultima_cotacao_banco(symbol)
+        if dados_cache:
+            FALLBACKS.inc(tipo='banco')
+            print(f"   APIs indisponiveis, usando ultima cotacao do banco para {symbol} "
+                  f"(desatualizada)")
+            return dados_cache
         
         # Fallback: Dados simulados
+        FALLBACKS.inc(tipo='simulado')
         print(f"   APIs indisponiveis, usando dados simulados para {symbol}")
         dados_simulados = self.gerar_dados_simulados(symbol)
         print(f"   SIMULADO: {symbol} - R$ {dados_simulados['preco']}")
         return dados_simulados
 
+    def _ultima_cotacao_banco(self, symbol: str) -> Optional[Dict]:
+        """Busca a cotação real mais recente salva para `symbol`"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('''
+            SELECT codigo, nome, preco, volume, variacao, data, fonte
+            FROM acoes
+            WHERE codigo = ? AND fonte NOT LIKE 'Simulado%' AND fonte NOT LIKE '%(desatualizado)'
+            ORDER BY data DESC
+            LIMIT 1
+            ''', (symbol,)).fetchone()
+        finally:
+            conn.close()
+        
+        if not row:
+            return None
+        codigo, nome, preco, volume, variacao, data, fonte = row
+        return {
+            'codigo': codigo,
+            'nome': nome,
+            'preco': preco,
+            'volume': volume,
+            'variacao': variacao,
+            'data': data,
+            'fonte': f'{fonte} (desatualizado)'
+        }
+
+    @etapa('load')
     def salvar_no_banco(self, dados: Dict):
         """Salva dados no banco SQLite"""
         conn = sqlite3.connect(self.db_path)
@@ -215,35 +334,94 @@ class ETLFinanceiroRobusto:
         finally:
             conn.close()
 
-    def processar_portfolio(self, symbols: List[str]):
-        """Processa portfolio completo com rate limiting inteligente"""
+    @perfilavel()
+    @execucao('robusto')
+    def processar_portfolio(self, symbols: List[str], orcamento_segundos: Optional[float] = None,
+                            workers_extracao: int = 1, capacidade_fila: int = 8,
+                            planejador: Optional[PlanejadorRefresh] = None,
+                            cota: Optional[int] = None):
+        """
+        Processa portfolio completo com rate limiting inteligente
+        
+        Extração e gravação rodam em estágios concorrentes ligados por uma
+        fila limitada: o INSERT do símbolo N sobrepõe a consulta do N+1.
+        
+        Args:
+            symbols: Lista de códigos
+            orcamento_segundos: Prazo total da execução. Quando esgota, os
+                símbolos pendentes recebem a última cotação do banco
+                (desatualizada) ou dados simulados, sem novas esperas.
+            workers_extracao: Threads de extração (compartilham o rate limit)
+            capacidade_fila: Capacidade da fila entre extração e gravação
+            planejador: Prioriza os símbolos mais defasados/importantes;
+                os que não couberem na `cota` usam a última cotação do banco
+                (ou dados simulados, que não são gravados)
+            cota: Consultas permitidas neste ciclo (usada com `planejador`)
+        """
+        adiados = set()
+        if planejador is not None:
+            # Linhas simuladas não são cotações: não tiram a prioridade do símbolo
+            ultimas = carregar_ultimas_atualizacoes(self.db_path, 'acoes', 'codigo',
+                                                    condicao="fonte NOT LIKE 'Simulado%'")
+            plano = planejador.planejar(symbols, ultimas, cota=cota)
+            adiados = set(plano['adiados'])
+            symbols = plano['agenda'] + plano['adiados']
+        
         print(f"\nINICIANDO PROCESSAMENTO DO PORTFOLIO")
         print(f"Total de ativos: {len(symbols)}")
+        if orcamento_segundos is not None:
+            print(f"Orçamento de tempo: {orcamento_segundos:.0f}s")
         print("=" * 50)
         
-        dados_extraidos = []
-        sucessos = 0
+        orcamento = OrcamentoExecucao(orcamento_segundos)
+        # Rate limiting inteligente: intervalo de 2-4s entre consultas
+        limitador = LimitadorTaxa(random.uniform(2, 4))
+        # Adiados ou sem orçamento: o fallback vai para o relatório, não para o banco
+        nao_consultados = set()
         
-        for i, symbol in enumerate(symbols, 1):
-            print(f"\n[{i}/{len(symbols)}] Processando {symbol}...")
+        def extrair(symbol: str) -> Dict:
+            print(f"\nProcessando {symbol}...")
             
-            # Rate limiting inteligente
-            if i > 1:
-                delay = random.uniform(2, 4)  # Delay entre 2-4 segundos
-                print(f"   Aguardando {delay:.1f}s (rate limiting)...")
-                time.sleep(delay)
+            if symbol in adiados:
+                print(f"   {symbol} fora da agenda deste ciclo")
+                nao_consultados.add(symbol)
+                return self._dados_fallback(symbol)
             
-            dados = self.extrair_dados_acao(symbol)
-            if dados:
+            if orcamento.esgotado() or not limitador.aguardar(orcamento):
+                print(f"   Orçamento esgotado: {symbol} sem nova consulta")
+                nao_consultados.add(symbol)
+                return self._dados_fallback(symbol)
+            
+            return self.extrair_dados_acao(symbol, orcamento=orcamento)
+        
+        def gravar(dados: Dict) -> Dict:
+            consultado = dados['codigo'] not in nao_consultados
+            if consultado and not dados['fonte'].endswith('(desatualizado)'):
                 self.salvar_no_banco(dados)
-                dados_extraidos.append(dados)
-                sucessos += 1
+            return dados
+        
+        pipeline = PipelineEstagios([
+            Estagio('extract', extrair, workers_extracao),
+            Estagio('load', gravar, 1),
+        ], capacidade_fila=capacidade_fila)
+        dados_extraidos = pipeline.executar(symbols)['resultados']
+        sucessos = len(dados_extraidos)
         
         print(f"\n✅ PROCESSAMENTO CONCLUIDO: {sucessos}/{len(symbols)} sucessos!")
         return dados_extraidos
 
-    def gerar_relatorio_executivo(self, dados: List[Dict]):
-        """Gera relatório executivo profissional"""
+    @etapa('report')
+    def gerar_relatorio_executivo(self, dados: List[Dict],
+                                  comprimir: bool = False) -> Optional[Dict[str, str]]:
+        """
+        Gera relatório executivo profissional (comprimir=True grava o CSV em .csv.gz)
+        
+        Os arquivos são nomeados pelo hash dos dados: se o mesmo conjunto já
+        foi exportado, os arquivos existentes são devolvidos sem regravar.
+        
+        Returns:
+            Extensão -> caminho dos arquivos do relatório
+        """
         if not dados:
             print("Nenhum dado para relatório")
             return
@@ -270,23 +448,27 @@ class ETLFinanceiroRobusto:
         print(f"   {pior['codigo']} ({pior['nome']}): {pior['variacao']:.2f}%")
         
         # Salvar relatório
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        # CSV
-        csv_path = f"reports/relatorio_{timestamp}.csv"
-        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-        print(f"\n💾 Relatório CSV salvo: {csv_path}")
-        
-        # Excel
-        excel_path = f"reports/relatorio_{timestamp}.xlsx"
-        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Portfolio', index=False)
-            
-            # Estatísticas em aba separada
+        def gerar_excel(caminho):
+            # Excel em modo write-only (linhas vão direto para o arquivo)
             stats = df[['preco', 'volume', 'variacao']].describe()
-            stats.to_excel(writer, sheet_name='Estatisticas')
+            exportar_excel(caminho, {
+                'Portfolio': de_dataframe(df),
+                'Estatisticas': de_dataframe(stats, index=True),  # aba separada
+            })
+        
+        extensao_csv = '.csv.gz' if comprimir else '.csv'
+        caminhos, reaproveitado = self.cache_relatorios.obter_ou_gerar(
+            chave_conteudo(df, relatorio='executivo'),
+            {
+                extensao_csv: lambda caminho: exportar_csv(caminho, de_dataframe(df)),  # em lotes
+                '.xlsx': gerar_excel,
+            })
         
-        print(f"📊 Relatório Excel salvo: {excel_path}")
+        if reaproveitado:
+            print("\n♻️ Mesmos dados de um relatório anterior, arquivos reaproveitados")
+        print(f"\n💾 Relatório CSV salvo: {caminhos[extensao_csv]}")
+        print(f"📊 Relatório Excel salvo: {caminhos['.xlsx']}")
+        return caminhos
 
     def consultar_banco(self):
         """Consulta dados salvos no banco"""
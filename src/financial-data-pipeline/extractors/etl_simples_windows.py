@@ -7,6 +7,9 @@ from datetime import datetime, timedelta
 import os
 import time
 
+from exportacao import de_dataframe, exportar_excel
+from provedores import url_yahoo
+
 class ETLSimples:
     """ETL simplificado que realmente funciona"""
     
@@ -50,7 +53,7 @@ class ETLSimples:
             print(f"Extraindo {symbol} do Yahoo Finance...")
             
             # Usando API pública do Yahoo Finance
-            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+            url = url_yahoo(f"/v8/finance/chart/{symbol}")
             
             response = requests.get(url, timeout=10)
             response.raise_for_status()
@@ -176,8 +179,8 @@ class ETLSimples:
         with open('reports/relatorio_portfolio.json', 'w', encoding='utf-8') as f:
             json.dump(relatorio, f, indent=2, ensure_ascii=False)
         
-        # Salvar Excel
-        df.to_excel('reports/portfolio_analysis.xlsx', index=False)
+        # Salvar Excel (write-only, em streaming)
+        exportar_excel('reports/portfolio_analysis.xlsx', {'Sheet1': de_dataframe(df)})
         
         print(f"\nARQUIVOS GERADOS:")
         print(f"- Banco de dados: data/acoes.db")
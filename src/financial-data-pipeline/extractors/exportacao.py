@@ -0,0 +1,231 @@
+# exportacao.py - Exportação em streaming com memória constante
+# (Excel write-only, CSV/NDJSON em lotes)
+import argparse
+import csv
+import gzip
+import functools
+import io
+import json
+import math
+import sqlite3
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from indicadores import INDICADORES
+
+TAMANHO_LOTE = 10_000
+NIVEL_GZIP = 6  # bem mais rápido que o padrão (9) e quase o mesmo tamanho
+LIMITE_LINHAS_EXCEL = 1_048_576  # por aba, incluindo o cabeçalho
+
+# Fonte de linhas: (nomes das colunas, iterador de lotes de linhas)
+Fonte = Tuple[List[str], Iterable[Sequence]]
+
+
+def de_consulta(conn: sqlite3.Connection, query: str, params: Sequence = (),
+                tamanho_lote: int = TAMANHO_LOTE) -> Fonte:
+    """Linhas direto do cursor (fetchmany), sem montar DataFrame"""
+    cursor = conn.execute(query, params)
+    colunas = [descricao[0] for descricao in cursor.description]
+
+    def lotes() -> Iterator[List[tuple]]:
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote:
+                return
+            yield lote
+
+    return colunas, lotes()
+
+
+def de_dataframe(df: pd.DataFrame, index: bool = False,
+                 tamanho_lote: int = TAMANHO_LOTE) -> Fonte:
+    """Linhas de um DataFrame já em memória, convertidas um lote por vez (NaN -> vazio)"""
+    if index:
+        df = df.reset_index()
+    colunas = [str(c) for c in df.columns]
+
+    def lotes() -> Iterator[List[tuple]]:
+        for inicio in range(0, len(df), tamanho_lote):
+            lote = df.iloc[inicio:inicio + tamanho_lote].astype(object)
+            yield list(lote.where(lote.notna(), None).itertuples(index=False, name=None))
+
+    return colunas, lotes()
+
+
+def exportar_excel(caminho: str, abas: Dict[str, Fonte]) -> Dict[str, int]:
+    """
+    Grava as abas com openpyxl em modo write-only: cada linha vai direto
+    para o arquivo, então a memória não cresce com o número de linhas.
+    Abas acima do limite do Excel continuam em 'Nome_2', 'Nome_3', ...
+
+    Returns:
+        Linhas de dados gravadas por aba
+    """
+    from openpyxl import Workbook  # dependência opcional
+
+    livro = Workbook(write_only=True)
+    totais = {}
+    try:
+        for nome, (colunas, lotes) in abas.items():
+            parte, linhas_aba, total = 1, 0, 0
+            planilha = livro.create_sheet(title=nome[:31])
+            planilha.append(colunas)
+            for lote in lotes:
+                for linha in lote:
+                    if linhas_aba == LIMITE_LINHAS_EXCEL - 1:
+                        parte += 1
+                        planilha = livro.create_sheet(title=f"{nome[:28]}_{parte}")
+                        planilha.append(colunas)
+                        linhas_aba = 0
+                    planilha.append(_celulas(linha))
+                    linhas_aba += 1
+                    total += 1
+            totais[nome] = total
+        livro.save(caminho)
+    finally:
+        livro.close()
+    return totais
+
+
+def _celulas(linha: Sequence) -> list:
+    # NaN / NaT não existem no Excel: célula vazia
+    return [None if isinstance(v, float) and math.isnan(v) else v for v in linha]
+
+
+def exportar_csv(caminho: str, fonte: Fonte, comprimir: Optional[bool] = None,
+                 encoding: str = 'utf-8-sig') -> int:
+    """
+    CSV escrito lote a lote; gzip se `comprimir` (padrão: caminho termina em .gz)
+
+    Returns:
+        Linhas de dados gravadas
+    """
+    colunas, lotes = fonte
+    if comprimir is None:
+        comprimir = caminho.endswith('.gz')
+    if comprimir and not caminho.endswith('.gz'):
+        caminho += '.gz'
+    abrir = functools.partial(gzip.open, compresslevel=NIVEL_GZIP) if comprimir else open
+
+    total = 0
+    with abrir(caminho, 'wt', encoding=encoding, newline='') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(colunas)
+        for lote in lotes:
+            escritor.writerows(lote)
+            total += len(lote)
+    return total
+
+
+def blocos_csv(fonte: Fonte) -> Iterator[bytes]:
+    """CSV em UTF-8, um bloco de bytes por lote (corpo de resposta HTTP em streaming)"""
+    colunas, lotes = fonte
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(colunas)
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # nenhuma linha: só o cabeçalho
+        yield buffer.getvalue().encode()
+
+
+def blocos_ndjson(fonte: Fonte) -> Iterator[bytes]:
+    """Um objeto JSON por linha (NDJSON), um bloco de bytes por lote"""
+    colunas, lotes = fonte
+    for lote in lotes:
+        yield ''.join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n'
+                      for linha in lote).encode()
+
+
+def comprimir_blocos(blocos: Iterable[bytes], nivel: int = NIVEL_GZIP) -> Iterator[bytes]:
+    """Comprime em gzip à medida que os blocos chegam (sem acumular o arquivo)"""
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # formato gzip
+    for bloco in blocos:
+        comprimido = compressor.compress(bloco)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+
+def _filtros(coluna_simbolo: str, coluna_data: str, simbolos: Optional[List[str]],
+             inicio: Optional[str], fim: Optional[str]) -> Tuple[str, list]:
+    # Símbolo + intervalo de datas: usa o índice UNIQUE(símbolo, data) das tabelas
+    where, params = " WHERE 1 = 1", []
+    if simbolos:
+        where += f" AND {coluna_simbolo} IN ({', '.join('?' * len(simbolos))})"
+        params += [s.upper() for s in simbolos]
+    if inicio:
+        where += f" AND {coluna_data} >= ?"
+        params.append(inicio)
+    if fim:
+        where += f" AND {coluna_data} <= ?"
+        params.append(fim)
+    return where + f" ORDER BY {coluna_simbolo}, {coluna_data}", params
+
+
+def consulta_historico(simbolos: Optional[List[str]] = None, inicio: Optional[str] = None,
+                       fim: Optional[str] = None) -> Tuple[str, list]:
+    """Histórico completo (preços + indicadores) de price_history, na ordem do índice"""
+    query = f'''
+        SELECT p.symbol, p.date, p.open_price, p.high_price, p.low_price, p.close_price,
+               p.adjusted_close, p.volume, {', '.join(f't.{c}' for c in INDICADORES)}
+        FROM price_history p
+        LEFT JOIN technical_indicators t ON t.symbol = p.symbol AND t.date = p.date
+    '''
+    filtros, params = _filtros('p.symbol', 'p.date', simbolos, inicio, fim)
+    return query + filtros, params
+
+
+def consulta_cotacoes(simbolos: Optional[List[str]] = None, inicio: Optional[str] = None,
+                      fim: Optional[str] = None) -> Tuple[str, list]:
+    """Cotações da tabela acoes (ETL robusto), na ordem do índice UNIQUE(codigo, data)"""
+    query = "SELECT codigo, nome, preco, volume, variacao, data, fonte, created_at FROM acoes"
+    filtros, params = _filtros('codigo', 'data', simbolos, inicio, fim)
+    return query + filtros, params
+
+
+def exportar_historico(db_path: str, caminho: str, simbolos: Optional[List[str]] = None,
+                       inicio: Optional[str] = None, fim: Optional[str] = None,
+                       comprimir: Optional[bool] = None) -> int:
+    """
+    Exporta o histórico do banco do ETL para .xlsx ou .csv(.gz) lendo do
+    cursor em lotes - memória constante mesmo com o histórico inteiro
+
+    Returns:
+        Linhas gravadas
+    """
+    query, params = consulta_historico(simbolos, inicio, fim)
+    conn = sqlite3.connect(db_path)
+    try:
+        fonte = de_consulta(conn, query, params)
+        if caminho.endswith('.xlsx'):
+            return exportar_excel(caminho, {'Historico': fonte})['Historico']
+        return exportar_csv(caminho, fonte, comprimir)
+    finally:
+        conn.close()
+
+
+def main():
+    """CLI: python exportacao.py reports/historico.csv.gz --db data/financial_data.db"""
+    parser = argparse.ArgumentParser(description="Exporta o histórico do ETL em streaming")
+    parser.add_argument('saida', help="Arquivo .xlsx, .csv ou .csv.gz (comprimido)")
+    parser.add_argument('simbolos', nargs='*', help="Ativos (padrão: todos)")
+    parser.add_argument('--inicio', help="Data inicial YYYY-MM-DD")
+    parser.add_argument('--fim', help="Data final YYYY-MM-DD")
+    parser.add_argument('--db', default="data/financial_data.db", help="Banco do ETL")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    linhas = exportar_historico(args.db, args.saida, args.simbolos, args.inicio, args.fim)
+    print(f"📤 {linhas:,} linhas exportadas para {args.saida} "
+          f"em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
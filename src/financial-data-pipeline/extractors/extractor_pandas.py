@@ -3,25 +3,156 @@
 import json
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
 import os
 
+from dados_sinteticos import gerar_blocos
+from exportacao import de_dataframe, exportar_excel
+from telemetria import etapa, registrar_cache
+
+# Classificação de tendência: (tendência, sinal), na ordem de avaliação
+TENDENCIAS = [
+    ("🚀 ALTA FORTE", "COMPRA"),
+    ("📈 ALTA MODERADA", "COMPRA"),
+    ("📉 BAIXA FORTE", "VENDA"),
+    ("📉 BAIXA MODERADA", "VENDA"),
+]
+TENDENCIA_LATERAL = ("➡️  LATERAL", "AGUARDAR")
+TENDENCIA_SEM_DADOS = ("❓ DADOS INSUFICIENTES", "AGUARDAR")
+
+EMPRESAS = {
+    "PETR4": {"nome": "Petrobras", "setor": "Petróleo e Gás"},
+    "VALE3": {"nome": "Vale", "setor": "Mineração"},
+    "ITUB4": {"nome": "Itaú Unibanco", "setor": "Bancos"},
+    "BBDC4": {"nome": "Bradesco", "setor": "Bancos"},
+    "ABEV3": {"nome": "Ambev", "setor": "Bebidas"},
+    "PVB11": {"nome": "Vanguard Value ETF", "setor": "ETF"},
+    "MGLU3": {"nome": "Magazine Luiza", "setor": "Varejo"},
+    "WEGE3": {"nome": "WEG", "setor": "Máquinas e Equipamentos"}
+}
+EMPRESA_DESCONHECIDA = {"nome": "Empresa Desconhecida", "setor": "Diversos"}
+
+
+def calcular_tendencias(df, coluna_codigo='codigo', coluna_data='data',
+                        coluna_preco='preco_fechamento', janela_curta=7, janela_longa=21):
+    """
+    Médias móveis e sinal de tendência de todas as ações de uma vez
+    
+    Ordena uma única vez por (código, data), calcula as duas médias com
+    rolling agrupado e classifica cada linha com operações vetorizadas -
+    sem filtro/cópia por ação.
+    
+    Parâmetros:
+    df (pandas.DataFrame): Histórico empilhado (uma linha por ação/dia)
+    janela_curta, janela_longa (int): Janelas das médias (MA_7 / MA_21)
+    
+    Retorna:
+    pandas.DataFrame: Histórico ordenado com MA_7, MA_21, tendencia e sinal
+    """
+    df = df.sort_values([coluna_codigo, coluna_data], kind='stable').reset_index(drop=True)
+    precos = df.groupby(coluna_codigo, sort=False)[coluna_preco]
+    
+    nome_curta, nome_longa = f'MA_{janela_curta}', f'MA_{janela_longa}'
+    df[nome_curta] = precos.rolling(window=janela_curta).mean().droplevel(0)
+    df[nome_longa] = precos.rolling(window=janela_longa).mean().droplevel(0)
+    
+    preco = df[coluna_preco].to_numpy()
+    ma_curta = df[nome_curta].to_numpy()
+    ma_longa = df[nome_longa].to_numpy()
+    
+    # NaN compara como falso: linhas sem dados caem no padrão abaixo
+    condicoes = [
+        (preco > ma_curta) & (ma_curta > ma_longa),
+        (preco > ma_curta) & (ma_curta < ma_longa),
+        (preco < ma_curta) & (ma_curta < ma_longa),
+        (preco < ma_curta) & (ma_curta > ma_longa),
+    ]
+    com_dados = ~(np.isnan(ma_curta) | np.isnan(ma_longa))
+    lateral_ou_sem_dados = np.where(com_dados, TENDENCIA_LATERAL[0], TENDENCIA_SEM_DADOS[0])
+    df['tendencia'] = np.select(condicoes, [t for t, _ in TENDENCIAS], lateral_ou_sem_dados)
+    df['sinal'] = np.select(condicoes, [s for _, s in TENDENCIAS], 'AGUARDAR')
+    return df
+
+
+def agregar_portfolio(df):
+    """
+    Agregações por ação usadas pelas análises, relatório e exportação
+    
+    Um único groupby calcula resumo de preços, volume médio e volatilidade;
+    a posição atual (última linha de cada ação) sai de um duplicated, sem
+    outro groupby.
+    
+    Retorna:
+    dict: 'resumo' (DataFrame por código, ordem alfabética), 'atual'
+    (últimas linhas, na ordem do portfolio), 'volatilidade' e 'liquidez'
+    (rankings decrescentes de desvio da variação e volume médio)
+    """
+    resumo = df.groupby('codigo').agg(
+        empresa=('empresa', 'first'),
+        preco_medio=('preco_fechamento', 'mean'),
+        preco_desvio=('preco_fechamento', 'std'),
+        preco_minimo=('preco_fechamento', 'min'),
+        preco_maximo=('preco_fechamento', 'max'),
+        dias=('preco_fechamento', 'count'),
+        volume_medio=('volume', 'mean'),
+        variacao_media=('variacao_dia', 'mean'),
+        volatilidade=('variacao_dia', 'std'),
+    )
+    return {
+        'resumo': resumo,
+        'atual': df[~df['codigo'].duplicated(keep='last')],
+        'volatilidade': resumo['volatilidade'].sort_values(ascending=False),
+        'liquidez': resumo['volume_medio'].sort_values(ascending=False),
+    }
+
+
 class ExtratorFinanceiroProfissional:
     """
     Extrator financeiro com análises profissionais usando Pandas.
     Ideal para impressionar recrutadores!
     """
     
-    def __init__(self):
+    def __init__(self, semente=None):
         print("🚀 Extrator Financeiro Profissional iniciado!")
         print("📊 Powered by Pandas - Análises de nível empresarial")
         self.dados_extraidos = []
+        self._versao_portfolio = 0
+        self._agregacoes = None
         self.df_portfolio = None
         
+        # Semente fixa -> mesma sequência de simulações (testes reproduzíveis)
+        self.rng = np.random.default_rng(semente)
+        
         # Criar pastas para organização
         self._criar_estrutura_pastas()
     
+    @property
+    def df_portfolio(self):
+        return self._df_portfolio
+    
+    @df_portfolio.setter
+    def df_portfolio(self, df):
+        # Nova versão do portfolio: agregações em cache deixam de valer
+        self._df_portfolio = df
+        self.invalidar_agregacoes()
+    
+    def invalidar_agregacoes(self):
+        """Chamar após alterar df_portfolio no lugar (ex: df_portfolio.loc[...] = ...)"""
+        self._versao_portfolio += 1
+        self._agregacoes = None
+    
+    def agregacoes(self):
+        """
+        Agregações da versão atual do portfolio (ver agregar_portfolio),
+        calculadas uma vez e compartilhadas por análises, relatório e Excel
+        """
+        versao = (self._versao_portfolio, len(self.df_portfolio))
+        acerto = self._agregacoes is not None and self._agregacoes[0] == versao
+        registrar_cache('agregacoes_portfolio', acerto)
+        if not acerto:
+            self._agregacoes = (versao, agregar_portfolio(self.df_portfolio))
+        return self._agregacoes[1]
+    
     def _criar_estrutura_pastas(self):
         """Cria estrutura de pastas profissional"""
         pastas = ['data/raw', 'data/processed', 'data/reports', 'data/charts']
@@ -41,48 +172,47 @@ class ExtratorFinanceiroProfissional:
         list: Lista com dados históricos
         """
         print(f"📈 Simulando {dias} dias de histórico para {codigo_acao}")
+        historico = self._simular_painel([codigo_acao], dias)
+        historico['data'] = historico['data'].dt.strftime('%Y-%m-%d')
+        return historico.to_dict('records')
+    
+    def _simular_painel(self, lista_acoes, dias):
+        """
+        Histórico simulado de todas as ações numa única geração vetorizada
+        (movimento browniano geométrico, ver dados_sinteticos.gerar_blocos)
         
-        historico = []
-        preco_base = random.uniform(30.0, 100.0)
-        
-        for i in range(dias):
-            # Simula variação diária realista
-            variacao_dia = random.uniform(-0.05, 0.05)  # -5% a +5%
-            preco_base = preco_base * (1 + variacao_dia)
-            
-            data = datetime.now() - timedelta(days=dias-i-1)
-            
-            dados_dia = {
-                'codigo': codigo_acao.upper(),
-                'empresa': self._obter_nome_empresa(codigo_acao),
-                'data': data.strftime('%Y-%m-%d'),
-                'preco_abertura': round(preco_base * random.uniform(0.98, 1.02), 2),
-                'preco_fechamento': round(preco_base, 2),
-                'preco_maximo': round(preco_base * random.uniform(1.00, 1.05), 2),
-                'preco_minimo': round(preco_base * random.uniform(0.95, 1.00), 2),
-                'volume': random.randint(100000, 3000000),
-                'variacao_dia': round(variacao_dia * 100, 2)
-            }
-            
-            historico.append(dados_dia)
-        
-        return historico
+        Retorna:
+        pandas.DataFrame: Uma linha por ação/dia, na ordem de lista_acoes
+        """
+        codigos = [codigo.upper() for codigo in lista_acoes]
+        painel = pd.concat(gerar_blocos(
+            codigos, dias, semente=int(self.rng.integers(2**63)), frequencia='D',
+            volatilidade=(0.30, 0.60), preco_inicial=(30.0, 100.0), volume_medio=(3e5, 1.5e6)
+        ), ignore_index=True)
+        
+        # Gerado dia a dia (linha = dia x n + ação): reordena por ação, depois data
+        ordem = np.argsort(np.arange(len(painel)) % len(codigos), kind='stable')
+        painel = painel.iloc[ordem].reset_index(drop=True)
+        acao = np.arange(len(painel)) // dias
+        fechamento = painel['close_price']
+        variacao = fechamento / fechamento.groupby(acao).shift(1) - 1
+        variacao = variacao.fillna(fechamento / painel['open_price'] - 1)
+        
+        return pd.DataFrame({
+            'codigo': painel['symbol'],
+            'empresa': np.array([self._obter_nome_empresa(c) for c in codigos], dtype=object)[acao],
+            'data': pd.to_datetime(painel['date']),
+            'preco_abertura': painel['open_price'].round(2),
+            'preco_fechamento': fechamento.round(2),
+            'preco_maximo': painel['high_price'].round(2),
+            'preco_minimo': painel['low_price'].round(2),
+            'volume': painel['volume'],
+            'variacao_dia': (variacao * 100).round(2),
+        })
     
     def _obter_nome_empresa(self, codigo):
         """Retorna nome da empresa com setor"""
-        empresas = {
-            "PETR4": {"nome": "Petrobras", "setor": "Petróleo e Gás"},
-            "VALE3": {"nome": "Vale", "setor": "Mineração"},
-            "ITUB4": {"nome": "Itaú Unibanco", "setor": "Bancos"},
-            "BBDC4": {"nome": "Bradesco", "setor": "Bancos"},
-            "ABEV3": {"nome": "Ambev", "setor": "Bebidas"},
-            "PVB11": {"nome": "Vanguard Value ETF", "setor": "ETF"},
-            "MGLU3": {"nome": "Magazine Luiza", "setor": "Varejo"},
-            "WEGE3": {"nome": "WEG", "setor": "Máquinas e Equipamentos"}
-        }
-        
-        info = empresas.get(codigo.upper(), {"nome": "Empresa Desconhecida", "setor": "Diversos"})
-        return info["nome"]
+        return EMPRESAS.get(codigo.upper(), EMPRESA_DESCONHECIDA)["nome"]
     
     def extrair_portfolio_completo(self, lista_acoes, incluir_historico=True):
         """
@@ -97,28 +227,10 @@ class ExtratorFinanceiroProfissional:
         """
         print(f"🔄 Extraindo portfolio completo de {len(lista_acoes)} ações...")
         
-        todos_dados = []
-        
-        for codigo in lista_acoes:
-            if incluir_historico:
-                # Dados históricos dos últimos 30 dias
-                historico = self.simular_dados_historicos(codigo, 30)
-                todos_dados.extend(historico)
-            else:
-                # Apenas dados do dia atual
-                dados_hoje = self.simular_dados_historicos(codigo, 1)[0]
-                todos_dados.append(dados_hoje)
-        
-        # Converter para DataFrame do pandas
-        self.df_portfolio = pd.DataFrame(todos_dados)
-        
-        # Conversões de tipos (importante para análises)
-        self.df_portfolio['data'] = pd.to_datetime(self.df_portfolio['data'])
-        colunas_numericas = ['preco_abertura', 'preco_fechamento', 'preco_maximo', 
-                           'preco_minimo', 'volume', 'variacao_dia']
-        
-        for coluna in colunas_numericas:
-            self.df_portfolio[coluna] = pd.to_numeric(self.df_portfolio[coluna])
+        # Histórico dos últimos 30 dias ou apenas o dia atual, todas as ações
+        # numa única geração vetorizada (já com os tipos certos para análise)
+        dias = 30 if incluir_historico else 1
+        self.df_portfolio = self._simular_painel(lista_acoes, dias)
         
         print(f"✅ Portfolio extraído: {len(self.df_portfolio)} registros")
         return self.df_portfolio
@@ -137,7 +249,8 @@ class ExtratorFinanceiroProfissional:
         print("="*60)
         
         # Análise por ação (dados mais recentes)
-        df_atual = self.df_portfolio.groupby('codigo').tail(1)
+        agregacoes = self.agregacoes()
+        df_atual = agregacoes['atual']
         
         print("\n🎯 PERFORMANCE ATUAL POR AÇÃO:")
         print("-" * 50)
@@ -150,16 +263,16 @@ class ExtratorFinanceiroProfissional:
         # Estatísticas descritivas
         print("\n📈 ESTATÍSTICAS DESCRITIVAS (30 dias):")
         print("-" * 50)
-        stats = self.df_portfolio.groupby('codigo')['preco_fechamento'].agg([
-            'mean', 'std', 'min', 'max', 'count'
-        ]).round(2)
+        stats = agregacoes['resumo'][[
+            'preco_medio', 'preco_desvio', 'preco_minimo', 'preco_maximo', 'dias'
+        ]].round(2)
         stats.columns = ['Preço_Médio', 'Desvio_Padrão', 'Mínimo', 'Máximo', 'Dias']
         print(stats)
         
         # Análise de volatilidade
         print("\n⚡ ANÁLISE DE VOLATILIDADE:")
         print("-" * 50)
-        volatilidade = self.df_portfolio.groupby('codigo')['variacao_dia'].std().sort_values(ascending=False)
+        volatilidade = agregacoes['volatilidade']
         
         print("Ranking de volatilidade (maior = mais arriscada):")
         for i, (codigo, vol) in enumerate(volatilidade.items(), 1):
@@ -169,7 +282,7 @@ class ExtratorFinanceiroProfissional:
         # Análise de volume
         print("\n📊 ANÁLISE DE LIQUIDEZ (Volume médio):")
         print("-" * 50)
-        volume_medio = self.df_portfolio.groupby('codigo')['volume'].mean().sort_values(ascending=False)
+        volume_medio = agregacoes['liquidez']
         
         for i, (codigo, volume) in enumerate(volume_medio.items(), 1):
             liquidez = "🟢 ALTA" if volume > 2000000 else "🟡 MÉDIA" if volume > 1000000 else "🔴 BAIXA"
@@ -178,6 +291,10 @@ class ExtratorFinanceiroProfissional:
     def detectar_tendencias(self):
         """
         Detecta tendências usando médias móveis (análise técnica profissional)
+        
+        Retorna:
+        pandas.DataFrame: Uma linha por ação com preço atual, MA_7, MA_21,
+        tendência e sinal
         """
         if self.df_portfolio is None:
             print("⚠️ Execute extrair_portfolio_completo() primeiro")
@@ -187,60 +304,32 @@ class ExtratorFinanceiroProfissional:
         print("📈 === ANÁLISE DE TENDÊNCIAS (Médias Móveis) ===")
         print("="*60)
         
-        resultados_tendencia = []
+        # Último dia de cada ação, na ordem em que aparecem no portfolio
+        df_sinais = calcular_tendencias(self.df_portfolio)
+        ultimos = df_sinais.groupby('codigo', sort=False).tail(1).set_index('codigo')
+        ultimos = ultimos.loc[self.df_portfolio['codigo'].unique()].reset_index()
         
-        for codigo in self.df_portfolio['codigo'].unique():
-            df_acao = self.df_portfolio[self.df_portfolio['codigo'] == codigo].copy()
-            df_acao = df_acao.sort_values('data')
-            
-            # Calcular médias móveis
-            df_acao['MA_7'] = df_acao['preco_fechamento'].rolling(window=7).mean()
-            df_acao['MA_21'] = df_acao['preco_fechamento'].rolling(window=21).mean()
-            
-            # Últimos valores
-            preco_atual = df_acao['preco_fechamento'].iloc[-1]
-            ma_7 = df_acao['MA_7'].iloc[-1]
-            ma_21 = df_acao['MA_21'].iloc[-1]
-            
-            # Determinar tendência
-            if pd.notna(ma_7) and pd.notna(ma_21):
-                if preco_atual > ma_7 > ma_21:
-                    tendencia = "🚀 ALTA FORTE"
-                    sinal = "COMPRA"
-                elif preco_atual > ma_7 and ma_7 < ma_21:
-                    tendencia = "📈 ALTA MODERADA"
-                    sinal = "COMPRA"
-                elif preco_atual < ma_7 < ma_21:
-                    tendencia = "📉 BAIXA FORTE"
-                    sinal = "VENDA"
-                elif preco_atual < ma_7 and ma_7 > ma_21:
-                    tendencia = "📉 BAIXA MODERADA"
-                    sinal = "VENDA"
-                else:
-                    tendencia = "➡️  LATERAL"
-                    sinal = "AGUARDAR"
-            else:
-                tendencia = "❓ DADOS INSUFICIENTES"
-                sinal = "AGUARDAR"
-            
-            resultados_tendencia.append({
-                'codigo': codigo,
-                'preco_atual': preco_atual,
-                'ma_7_dias': ma_7,
-                'ma_21_dias': ma_21,
-                'tendencia': tendencia,
-                'sinal': sinal
-            })
+        resultados_tendencia = pd.DataFrame({
+            'codigo': ultimos['codigo'],
+            'preco_atual': ultimos['preco_fechamento'],
+            'ma_7_dias': ultimos['MA_7'],
+            'ma_21_dias': ultimos['MA_21'],
+            'tendencia': ultimos['tendencia'],
+            'sinal': ultimos['sinal']
+        })
         
         # Mostrar resultados
         print("\n🎯 SINAIS DE TRADING:")
         print("-" * 70)
         
-        for resultado in resultados_tendencia:
-            print(f"{resultado['codigo']:6} | R$ {resultado['preco_atual']:7.2f} | "
-                  f"MA7: {resultado['ma_7_dias']:7.2f} | MA21: {resultado['ma_21_dias']:7.2f} | "
-                  f"{resultado['tendencia']:15} | 🎯 {resultado['sinal']}")
+        for resultado in resultados_tendencia.itertuples(index=False):
+            print(f"{resultado.codigo:6} | R$ {resultado.preco_atual:7.2f} | "
+                  f"MA7: {resultado.ma_7_dias:7.2f} | MA21: {resultado.ma_21_dias:7.2f} | "
+                  f"{resultado.tendencia:15} | 🎯 {resultado.sinal}")
+        
+        return resultados_tendencia
     
+    @etapa('report')
     def gerar_relatorio_executivo(self):
         """
         Gera relatório executivo completo (tipo que CEOs recebem)
@@ -254,7 +343,7 @@ class ExtratorFinanceiroProfissional:
         print("="*80)
         
         # Dados atuais
-        df_atual = self.df_portfolio.groupby('codigo').tail(1)
+        df_atual = self.agregacoes()['atual']
         
         # Métricas principais
         valor_total = (df_atual['preco_fechamento'] * 100).sum()  # Assumindo 100 ações de cada
@@ -287,6 +376,7 @@ class ExtratorFinanceiroProfissional:
         
         print(f"\n💾 Relatório salvo em: {nome_relatorio}")
     
+    @etapa('report')
     def exportar_para_excel(self):
         """
         Exporta dados para Excel (formato que empresas adoram)
@@ -299,22 +389,23 @@ class ExtratorFinanceiroProfissional:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             nome_arquivo = f"data/processed/portfolio_completo_{timestamp}.xlsx"
             
-            # Criar arquivo Excel com múltiplas abas
-            with pd.ExcelWriter(nome_arquivo, engine='openpyxl') as writer:
-                # Aba 1: Dados completos
-                self.df_portfolio.to_excel(writer, sheet_name='Dados_Completos', index=False)
-                
-                # Aba 2: Resumo por ação
-                resumo = self.df_portfolio.groupby(['codigo', 'empresa']).agg({
-                    'preco_fechamento': ['mean', 'min', 'max', 'std'],
-                    'volume': 'mean',
-                    'variacao_dia': 'mean'
-                }).round(2)
-                resumo.to_excel(writer, sheet_name='Resumo_Por_Acao')
-                
-                # Aba 3: Dados atuais
-                df_atual = self.df_portfolio.groupby('codigo').tail(1)
-                df_atual.to_excel(writer, sheet_name='Posicao_Atual', index=False)
+            # Resumo por ação (colunas achatadas: preco_fechamento_mean, ...)
+            agregacoes = self.agregacoes()
+            resumo = agregacoes['resumo'].reset_index().set_index(['codigo', 'empresa'])[[
+                'preco_medio', 'preco_minimo', 'preco_maximo', 'preco_desvio',
+                'volume_medio', 'variacao_media'
+            ]].round(2)
+            resumo.columns = ['preco_fechamento_mean', 'preco_fechamento_min',
+                              'preco_fechamento_max', 'preco_fechamento_std',
+                              'volume_mean', 'variacao_dia_mean']
+            df_atual = agregacoes['atual']
+            
+            # Arquivo Excel com múltiplas abas, gravado em streaming (write-only)
+            exportar_excel(nome_arquivo, {
+                'Dados_Completos': de_dataframe(self.df_portfolio),
+                'Resumo_Por_Acao': de_dataframe(resumo, index=True),
+                'Posicao_Atual': de_dataframe(df_atual),
+            })
             
             print(f"📋 Dados exportados para Excel: {nome_arquivo}")
             
@@ -1,15 +1,20 @@
 # extrator_simples.py - Versão bem fácil para começar
 
-import json
 from datetime import datetime
-import random
+
+import numpy as np
+
+from dados_sinteticos import gerar_cotacoes
+from diario_cotacoes import DiarioCotacoes
 
 class ExtratorFinanceiro:
     """Classe simples para extrair dados de ações"""
     
-    def __init__(self):
+    def __init__(self, semente=None, pasta_diario="data/diario"):
         print("🚀 Extrator Financeiro iniciado!")
         self.dados_extraidos = []
+        self.rng = np.random.default_rng(semente)  # semente fixa = mesmos dados
+        self.diario = DiarioCotacoes(pasta_diario)  # cotações salvas (append-only)
     
     def simular_dados_acao(self, codigo_acao):
         """
@@ -21,19 +26,23 @@ class ExtratorFinanceiro:
         Retorna:
         dict: Dados da ação
         """
-        # Gerar dados aleatórios (simula API real)
-        dados_acao = {
-            "codigo": codigo_acao.upper(),
-            "empresa": self._obter_nome_empresa(codigo_acao),
-            "preco": round(random.uniform(20.0, 100.0), 2),
-            "volume": random.randint(100000, 2000000),
-            "variacao": round(random.uniform(-5.0, 5.0), 2),
-            "data_hora": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        
+        dados_acao = self._simular_cotacoes([codigo_acao])[0]
         print(f"📊 Dados extraídos para {codigo_acao}: R$ {dados_acao['preco']}")
         return dados_acao
     
+    def _simular_cotacoes(self, lista_acoes):
+        """Gera dados aleatórios (simula API real) de todas as ações de uma vez"""
+        cotacoes = gerar_cotacoes(lista_acoes, self.rng)
+        data_hora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return [{
+            "codigo": codigo,
+            "empresa": self._obter_nome_empresa(codigo),
+            "preco": float(preco),
+            "volume": int(volume),
+            "variacao": float(variacao),
+            "data_hora": data_hora
+        } for codigo, preco, volume, variacao in cotacoes.itertuples(index=False, name=None)]
+    
     def _obter_nome_empresa(self, codigo):
         """Retorna nome da empresa baseado no código"""
         empresas = {
@@ -60,31 +69,41 @@ class ExtratorFinanceiro:
         
         todas_acoes = []
         
-        for codigo in lista_acoes:
-            dados = self.simular_dados_acao(codigo)
+        for dados in self._simular_cotacoes(lista_acoes):
+            print(f"📊 Dados extraídos para {dados['codigo']}: R$ {dados['preco']}")
             todas_acoes.append(dados)
             self.dados_extraidos.append(dados)
         
         print(f"✅ Extração concluída! {len(todas_acoes)} ações processadas")
         return todas_acoes
     
-    def salvar_dados(self, dados, nome_arquivo="dados_acoes.json"):
+    def salvar_dados(self, dados):
         """
-        Salva dados em arquivo JSON
+        Acrescenta os dados ao diário de cotações (só o lote novo é gravado)
         
         Parâmetros:
         dados (list): Lista com dados das ações
-        nome_arquivo (str): Nome do arquivo para salvar
         """
         try:
-            with open(nome_arquivo, 'w', encoding='utf-8') as arquivo:
-                json.dump(dados, arquivo, indent=2, ensure_ascii=False)
-            
-            print(f"💾 Dados salvos em '{nome_arquivo}'")
+            total = self.diario.registrar(dados)
+            print(f"💾 {total} cotações salvas no diário '{self.diario.pasta}'")
             
         except Exception as erro:
             print(f"❌ Erro ao salvar: {erro}")
     
+    def carregar_dados(self, codigo_acao, limite=None):
+        """
+        Cotações salvas de uma ação, da mais antiga para a mais recente
+        
+        Parâmetros:
+        codigo_acao (str): Código da ação
+        limite (int): Só as N mais recentes (padrão: todas)
+        
+        Retorna:
+        list: Dados salvos da ação
+        """
+        return self.diario.ler(codigo_acao, limite)
+    
     def mostrar_resumo(self, dados):
         """
         Mostra resumo dos dados extraídos
@@ -147,9 +166,8 @@ class ExtratorFinanceiro:
         print(f"🎯 Extraindo dados específicos de {codigo_acao}...")
         dados = self.simular_dados_acao(codigo_acao)
         
-        # Salvar em arquivo separado
-        nome_arquivo = f"{codigo_acao.lower()}_dados.json"
-        self.salvar_dados([dados], nome_arquivo)
+        # Mesmo diário das outras ações (leitura por ação via índice)
+        self.salvar_dados([dados])
         
         return dados
 
@@ -170,8 +188,8 @@ if __name__ == "__main__":
     # Mostrar resumo
     extrator.mostrar_resumo(dados_extraidos)
     
-    # Salvar dados em arquivo
-    extrator.salvar_dados(dados_extraidos, "minhas_acoes.json")
+    # Salvar dados no diário
+    extrator.salvar_dados(dados_extraidos)
 
     dados_vale = extrator.extrair_acao_especifica("VALE3")
     
@@ -183,4 +201,5 @@ if __name__ == "__main__":
     print(f"Dados da Petrobras: {dados_petrobras}")
     
     print("\n🎉 Programa executado com sucesso!")
-    print("📄 Verifique o arquivo 'portfolio_brasileiro.json' criado na pasta do projeto")
\ No newline at end of file
+    print(f"📄 Histórico salvo da VALE3: {len(extrator.carregar_dados('VALE3'))} cotações")
+    print("📄 Consulte o diário com: python diario_cotacoes.py VALE3 --limite 5")
\ No newline at end of file
@@ -0,0 +1,163 @@
+# indicadores.py - Motor vetorizado de indicadores técnicos (todos os ativos de uma vez)
+import sqlite3
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+# Colunas da tabela technical_indicators preenchidas pelo motor
+INDICADORES = [
+    'sma_20', 'sma_50', 'sma_200',
+    'ema_12', 'ema_26',
+    'rsi', 'macd', 'macd_signal',
+    'bollinger_upper', 'bollinger_lower',
+]
+
+# Parâmetros padrão (mesmas janelas de transform_price_data)
+JANELA_RSI = 14
+JANELA_BOLLINGER = 20
+DESVIOS_BOLLINGER = 2
+SPAN_MACD_SINAL = 9
+
+
+def _por_grupo(serie: pd.Series, grupos: pd.Series):
+    """GroupBy sem reordenar: o painel já vem ordenado por (símbolo, data)"""
+    return serie.groupby(grupos, sort=False)
+
+
+def _media_movel(serie: pd.Series, grupos: pd.Series, janela: int) -> pd.Series:
+    return _por_grupo(serie, grupos).rolling(janela).mean().droplevel(0)
+
+
+def _media_exponencial(serie: pd.Series, grupos: pd.Series, span: int) -> pd.Series:
+    # adjust=False: recursão y_t = a*x_t + (1-a)*y_{t-1}, atualizável em O(1)
+    return _por_grupo(serie, grupos).ewm(span=span, adjust=False).mean().droplevel(0)
+
+
+def calcular_indicadores(painel: pd.DataFrame, indicadores: Optional[Iterable[str]] = None,
+                         coluna_simbolo: str = 'symbol', coluna_data: str = 'date',
+                         coluna_preco: str = 'close_price') -> pd.DataFrame:
+    """
+    Calcula indicadores para todos os símbolos numa única passada vetorizada
+
+    O painel empilhado (uma linha por símbolo/data) é ordenado uma vez e cada
+    indicador sai de um rolling/ewm agrupado - sem loop Python por símbolo.
+
+    Args:
+        painel: DataFrame com símbolo, data e preço de fechamento
+        indicadores: Subconjunto de INDICADORES (padrão: todos)
+        coluna_simbolo, coluna_data, coluna_preco: Nomes das colunas
+
+    Returns:
+        DataFrame com símbolo, data e os indicadores pedidos, no mesmo
+        índice/ordem do painel recebido
+    """
+    selecionados = list(indicadores) if indicadores is not None else list(INDICADORES)
+    desconhecidos = set(selecionados) - set(INDICADORES)
+    if desconhecidos:
+        raise ValueError(f"Indicadores desconhecidos: {sorted(desconhecidos)}")
+
+    if not painel.index.is_unique:
+        painel = painel.reset_index(drop=True)
+
+    ordenado = painel.sort_values([coluna_simbolo, coluna_data], kind='stable')
+    grupos = ordenado[coluna_simbolo]
+    preco = pd.to_numeric(ordenado[coluna_preco], errors='coerce')
+
+    calculados = {}
+
+    for janela in (20, 50, 200):
+        nome = f'sma_{janela}'
+        if nome in selecionados or (janela == JANELA_BOLLINGER and
+                                    {'bollinger_upper', 'bollinger_lower'} & set(selecionados)):
+            calculados[nome] = _media_movel(preco, grupos, janela)
+
+    precisa_macd = bool({'macd', 'macd_signal'} & set(selecionados))
+    for span in (12, 26):
+        nome = f'ema_{span}'
+        if nome in selecionados or precisa_macd:
+            calculados[nome] = _media_exponencial(preco, grupos, span)
+
+    if precisa_macd:
+        calculados['macd'] = calculados['ema_12'] - calculados['ema_26']
+        if 'macd_signal' in selecionados:
+            calculados['macd_signal'] = _media_exponencial(calculados['macd'], grupos,
+                                                           SPAN_MACD_SINAL)
+
+    if 'rsi' in selecionados:
+        # Mesma definição de transform_price_data (médias simples de 14 períodos)
+        delta = _por_grupo(preco, grupos).diff()
+        ganho = delta.where(delta > 0, 0)
+        perda = -delta.where(delta < 0, 0)
+        media_ganho = _media_movel(ganho, grupos, JANELA_RSI)
+        media_perda = _media_movel(perda, grupos, JANELA_RSI)
+        calculados['rsi'] = 100 - (100 / (1 + media_ganho / media_perda))
+
+    if {'bollinger_upper', 'bollinger_lower'} & set(selecionados):
+        desvio = _por_grupo(preco, grupos).rolling(JANELA_BOLLINGER).std().droplevel(0)
+        media = calculados[f'sma_{JANELA_BOLLINGER}']
+        calculados['bollinger_upper'] = media + DESVIOS_BOLLINGER * desvio
+        calculados['bollinger_lower'] = media - DESVIOS_BOLLINGER * desvio
+
+    resultado = painel[[coluna_simbolo, coluna_data]].copy()
+    for nome in selecionados:
+        resultado[nome] = calculados[nome]  # alinhado pelo índice
+    return resultado
+
+
+def gravar_indicadores(conn: sqlite3.Connection, indicadores_df: pd.DataFrame,
+                       coluna_simbolo: str = 'symbol', coluna_data: str = 'date',
+                       commit: bool = True) -> int:
+    """
+    Grava indicadores em lote (executemany numa única transação)
+
+    Em (símbolo, data) já existentes só as colunas presentes em
+    `indicadores_df` são atualizadas; as demais mantêm o valor gravado.
+    Com commit=False a gravação entra na transação já aberta pelo chamador.
+    """
+    colunas = [c for c in indicadores_df.columns if c in INDICADORES]
+    if indicadores_df.empty or not colunas:
+        return 0
+
+    dados = indicadores_df[[coluna_simbolo, coluna_data] + colunas].copy()
+    dados[coluna_data] = dados[coluna_data].astype(str)
+    dados = dados.astype(object).where(dados.notna(), None)
+
+    # Upsert só das colunas recalculadas: INSERT OR REPLACE apagaria a linha inteira
+    sql = (f"INSERT INTO technical_indicators (symbol, date, {', '.join(colunas)}) "
+           f"VALUES ({', '.join('?' * (len(colunas) + 2))}) "
+           f"ON CONFLICT(symbol, date) DO UPDATE SET "
+           f"{', '.join(f'{c} = excluded.{c}' for c in colunas)}")
+    conn.executemany(sql, dados.itertuples(index=False, name=None))
+    if commit:
+        conn.commit()
+    return len(dados)
+
+
+def recalcular_indicadores(db_path: str, simbolos: Optional[List[str]] = None,
+                           indicadores: Optional[Iterable[str]] = None) -> int:
+    """
+    Recalcula indicadores a partir de price_history e grava em lote
+
+    Args:
+        db_path: Banco SQLite do ETL
+        simbolos: Restringe a estes símbolos (padrão: todos)
+        indicadores: Subconjunto de INDICADORES (padrão: todos)
+
+    Returns:
+        Número de linhas gravadas
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        query = "SELECT symbol, date, close_price FROM price_history"
+        params: list = []
+        if simbolos:
+            query += f" WHERE symbol IN ({', '.join('?' * len(simbolos))})"
+            params = list(simbolos)
+        query += " ORDER BY symbol, date"
+
+        painel = pd.read_sql_query(query, conn, params=params)
+        if painel.empty:
+            return 0
+        return gravar_indicadores(conn, calcular_indicadores(painel, indicadores))
+    finally:
+        conn.close()
@@ -0,0 +1,282 @@
+# indicadores_streaming.py - Atualização incremental O(1) de indicadores com estado persistido
+import json
+import math
+import sqlite3
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from indicadores import (DESVIOS_BOLLINGER, INDICADORES, JANELA_BOLLINGER, JANELA_RSI,
+                         SPAN_MACD_SINAL)
+
+JANELAS_SMA = (20, 50, 200)
+SPANS_EMA = (12, 26)
+# Soma acumulada perde precisão com o tempo: recalcula a partir do buffer
+RESSINCRONIZAR_A_CADA = 1000
+
+
+class EstadoIndicadores:
+    """
+    Estado compacto de um símbolo para atualizar indicadores barra a barra
+
+    - SMA/Bollinger: ring buffer dos últimos 200 fechamentos + somas correntes
+    - EMA/MACD: último valor de cada média exponencial
+    - RSI: ring buffers de ganhos/perdas (14) + somas correntes
+
+    Cada nova barra custa O(1) e produz os mesmos valores do cálculo em lote
+    (calcular_indicadores / transform_price_data). Os buffers guardam um
+    elemento a mais para permitir desfazer a última barra: num refresh
+    intraday o candle do dia é revisado em vez de acrescentado.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.ultima_data: Optional[str] = None
+        self.data_anterior: Optional[str] = None
+        self.ultimo_preco: Optional[float] = None
+        self.precos = deque(maxlen=max(JANELAS_SMA) + 1)
+        self.somas = {w: 0.0 for w in JANELAS_SMA}
+        self.soma_quadrados = 0.0  # janela de Bollinger
+        self.emas: Dict[str, Optional[float]] = {'ema_12': None, 'ema_26': None,
+                                                 'macd_signal': None}
+        self.emas_anteriores: Optional[Dict[str, Optional[float]]] = None
+        self.ganhos = deque(maxlen=JANELA_RSI + 1)
+        self.perdas = deque(maxlen=JANELA_RSI + 1)
+        self.soma_ganhos = 0.0
+        self.soma_perdas = 0.0
+
+    # === PERSISTÊNCIA ===
+    def para_dict(self) -> Dict:
+        return {
+            'n': self.n, 'ultima_data': self.ultima_data, 'data_anterior': self.data_anterior,
+            'ultimo_preco': self.ultimo_preco, 'precos': list(self.precos),
+            'emas': self.emas, 'emas_anteriores': self.emas_anteriores,
+            'ganhos': list(self.ganhos), 'perdas': list(self.perdas),
+        }
+
+    @classmethod
+    def de_dict(cls, dados: Dict) -> 'EstadoIndicadores':
+        estado = cls()
+        estado.n = dados['n']
+        estado.ultima_data = dados['ultima_data']
+        estado.data_anterior = dados['data_anterior']
+        estado.ultimo_preco = dados['ultimo_preco']
+        estado.precos.extend(dados['precos'])
+        estado.emas.update(dados['emas'])
+        estado.emas_anteriores = dados['emas_anteriores']
+        estado.ganhos.extend(dados['ganhos'])
+        estado.perdas.extend(dados['perdas'])
+        estado._ressincronizar()
+        return estado
+
+    def _ressincronizar(self):
+        """Recalcula as somas correntes a partir dos buffers"""
+        precos = list(self.precos)
+        for w in JANELAS_SMA:
+            self.somas[w] = math.fsum(precos[-w:])
+        self.soma_quadrados = math.fsum(p * p for p in precos[-JANELA_BOLLINGER:])
+        self.soma_ganhos = math.fsum(list(self.ganhos)[-JANELA_RSI:])
+        self.soma_perdas = math.fsum(list(self.perdas)[-JANELA_RSI:])
+
+    # === ATUALIZAÇÃO ===
+    @staticmethod
+    def _ema(anterior: Optional[float], valor: float, span: int) -> float:
+        if anterior is None:
+            return valor
+        alpha = 2 / (span + 1)
+        return alpha * valor + (1 - alpha) * anterior
+
+    def atualizar(self, data: str, preco: float) -> Dict[str, Optional[float]]:
+        """Incorpora uma nova barra e retorna os indicadores da data"""
+        # Valores que saem das janelas (antes do append no ring buffer)
+        saindo = {w: self.precos[-w] if len(self.precos) >= w else None for w in JANELAS_SMA}
+
+        for w in JANELAS_SMA:
+            self.somas[w] += preco - (saindo[w] or 0.0)
+        saindo_bb = saindo[JANELA_BOLLINGER]
+        self.soma_quadrados += preco * preco - (saindo_bb * saindo_bb
+                                                if saindo_bb is not None else 0.0)
+        self.precos.append(preco)
+
+        # RSI: primeira barra entra com ganho/perda 0, como no cálculo em lote
+        delta = preco - self.ultimo_preco if self.ultimo_preco is not None else 0.0
+        ganho, perda = max(delta, 0.0), max(-delta, 0.0)
+        if len(self.ganhos) >= JANELA_RSI:
+            self.soma_ganhos -= self.ganhos[-JANELA_RSI]
+            self.soma_perdas -= self.perdas[-JANELA_RSI]
+        self.ganhos.append(ganho)
+        self.perdas.append(perda)
+        self.soma_ganhos += ganho
+        self.soma_perdas += perda
+
+        self.emas_anteriores = dict(self.emas)
+        for span in SPANS_EMA:
+            self.emas[f'ema_{span}'] = self._ema(self.emas[f'ema_{span}'], preco, span)
+        macd = self.emas['ema_12'] - self.emas['ema_26']
+        self.emas['macd_signal'] = self._ema(self.emas['macd_signal'], macd, SPAN_MACD_SINAL)
+
+        self.n += 1
+        self.data_anterior = self.ultima_data
+        self.ultima_data = data
+        self.ultimo_preco = preco
+        if self.n % RESSINCRONIZAR_A_CADA == 0:
+            self._ressincronizar()
+
+        return self.valores(macd)
+
+    @property
+    def pode_desfazer(self) -> bool:
+        return self.emas_anteriores is not None
+
+    def desfazer(self):
+        """Remove a última barra (apenas um nível de desfazer)"""
+        if not self.pode_desfazer:
+            raise ValueError("Estado não guarda a barra anterior para desfazer")
+
+        preco = self.precos.pop()
+        for w in JANELAS_SMA:
+            self.somas[w] -= preco - (self.precos[-w] if len(self.precos) >= w else 0.0)
+        volta_bb = self.precos[-JANELA_BOLLINGER] if len(self.precos) >= JANELA_BOLLINGER else None
+        self.soma_quadrados -= preco * preco - (volta_bb * volta_bb
+                                                if volta_bb is not None else 0.0)
+
+        ganho, perda = self.ganhos.pop(), self.perdas.pop()
+        self.soma_ganhos -= ganho
+        self.soma_perdas -= perda
+        if len(self.ganhos) >= JANELA_RSI:
+            self.soma_ganhos += self.ganhos[-JANELA_RSI]
+            self.soma_perdas += self.perdas[-JANELA_RSI]
+
+        self.emas = self.emas_anteriores
+        self.emas_anteriores = None
+        self.n -= 1
+        self.ultima_data, self.data_anterior = self.data_anterior, None
+        self.ultimo_preco = self.precos[-1] if self.precos else None
+
+    def revisar(self, data: str, preco: float) -> Dict[str, Optional[float]]:
+        """Aplica a barra: substitui a última se for da mesma data, senão acrescenta"""
+        if data == self.ultima_data and self.pode_desfazer:
+            self.desfazer()
+        return self.atualizar(data, preco)
+
+    def valores(self, macd: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Indicadores da última barra (None enquanto a janela não enche)"""
+        resultado: Dict[str, Optional[float]] = {}
+        for w in JANELAS_SMA:
+            resultado[f'sma_{w}'] = self.somas[w] / w if self.n >= w else None
+        resultado['ema_12'] = self.emas['ema_12']
+        resultado['ema_26'] = self.emas['ema_26']
+        resultado['macd'] = macd if macd is not None else (
+            self.emas['ema_12'] - self.emas['ema_26'] if self.n else None)
+        resultado['macd_signal'] = self.emas['macd_signal']
+
+        if self.n >= JANELA_RSI:
+            media_ganho = self.soma_ganhos / JANELA_RSI
+            media_perda = self.soma_perdas / JANELA_RSI
+            if media_perda > 0:
+                resultado['rsi'] = 100 - 100 / (1 + media_ganho / media_perda)
+            else:
+                resultado['rsi'] = 100.0 if media_ganho > 0 else None
+        else:
+            resultado['rsi'] = None
+
+        if self.n >= JANELA_BOLLINGER:
+            w = JANELA_BOLLINGER
+            media = self.somas[w] / w
+            variancia = max(0.0, (self.soma_quadrados - w * media * media) / (w - 1))
+            desvio = math.sqrt(variancia)
+            resultado['bollinger_upper'] = media + DESVIOS_BOLLINGER * desvio
+            resultado['bollinger_lower'] = media - DESVIOS_BOLLINGER * desvio
+        else:
+            resultado['bollinger_upper'] = resultado['bollinger_lower'] = None
+
+        return resultado
+
+
+class MotorIndicadoresStreaming:
+    """
+    Mantém o estado de todos os símbolos na tabela indicator_state e grava
+    apenas as barras novas em technical_indicators.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._criar_tabela()
+
+    def _criar_tabela(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS indicator_state (
+                symbol VARCHAR(10) PRIMARY KEY,
+                last_date DATE,
+                state TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def carregar_estado(self, conn: sqlite3.Connection, symbol: str) -> EstadoIndicadores:
+        """Estado salvo do símbolo (vazio se nunca processado ou invalidado)"""
+        linha = conn.execute("SELECT state FROM indicator_state WHERE symbol = ?",
+                             (symbol,)).fetchone()
+        return EstadoIndicadores.de_dict(json.loads(linha[0])) if linha else EstadoIndicadores()
+
+    def atualizar(self, conn: sqlite3.Connection, symbol: str,
+                  barras: Iterable[Tuple[str, float]]) -> List[Tuple]:
+        """
+        Aplica barras (data, fechamento) em ordem e grava indicadores + estado
+        na transação do chamador. Uma barra com a data da última revisa o
+        candle do dia; barras anteriores a ela são ignoradas.
+
+        Returns:
+            Linhas gravadas em technical_indicators
+        """
+        estado = self.carregar_estado(conn, symbol)
+        linhas = []
+        for data, preco in barras:
+            data = str(data)
+            if preco is None or (estado.ultima_data is not None and data < estado.ultima_data):
+                continue
+            valores = estado.revisar(data, float(preco))
+            linhas.append((symbol, data) + tuple(valores[c] for c in INDICADORES))
+
+        if not linhas:
+            return linhas
+
+        conn.executemany(
+            f"INSERT OR REPLACE INTO technical_indicators (symbol, date, {', '.join(INDICADORES)}) "
+            f"VALUES ({', '.join('?' * (len(INDICADORES) + 2))})", linhas)
+        conn.execute('''
+            INSERT OR REPLACE INTO indicator_state (symbol, last_date, state, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (symbol, estado.ultima_data, json.dumps(estado.para_dict())))
+        return linhas
+
+    def atualizar_simbolo(self, conn: sqlite3.Connection, symbol: str) -> int:
+        """
+        Processa as barras de price_history a partir da última data do estado
+        (na primeira vez, todo o histórico vira o estado inicial)
+
+        Returns:
+            Número de barras processadas
+        """
+        linha = conn.execute("SELECT last_date FROM indicator_state WHERE symbol = ?",
+                             (symbol,)).fetchone()
+        barras = conn.execute('''
+            SELECT date, close_price FROM price_history
+            WHERE symbol = ? AND date >= ?
+            ORDER BY date
+        ''', (symbol, linha[0] if linha else '')).fetchall()
+        return len(self.atualizar(conn, symbol, barras))
+
+    def atualizar_de_price_history(self, simbolos: Optional[List[str]] = None) -> int:
+        """Atualiza todos os símbolos (ou `simbolos`) numa única transação"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if simbolos is None:
+                simbolos = [s for (s,) in conn.execute("SELECT DISTINCT symbol FROM price_history")]
+            total = sum(self.atualizar_simbolo(conn, symbol) for symbol in simbolos)
+            conn.commit()
+            return total
+        finally:
+            conn.close()
@@ -0,0 +1,272 @@
+# metricas_portfolio.py - Métricas de risco por carteira (vetorizadas e incrementais)
+import hashlib
+import json
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DIAS_UTEIS_ANO = 252
+JANELA_VOLATILIDADE = 21  # ~1 mês de pregões
+QUANTIDADE_PADRAO = 100   # carteira padrão: 100 ações de cada ativo
+CARTEIRA_PADRAO = 'default'
+
+
+def _assinatura(posicoes: Dict[str, float], janela: int, taxa_livre_risco: float) -> str:
+    """Muda quando a carteira ou os parâmetros mudam (estado salvo deixa de valer)"""
+    conteudo = json.dumps([sorted(posicoes.items()), janela, taxa_livre_risco])
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:12]
+
+
+def calcular_metricas(precos: pd.DataFrame, quantidades: pd.Series,
+                      estado: Optional[Dict] = None, janela: int = JANELA_VOLATILIDADE,
+                      taxa_livre_risco: float = 0.0) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Métricas diárias de uma carteira a partir da matriz de preços (datas x ativos)
+
+    O valor da carteira sai de um único produto matriz-vetor; retornos,
+    volatilidade/Sharpe móveis e drawdown são operações sobre arrays.
+    Com `estado` (de uma execução anterior) só as novas datas são calculadas:
+    o último valor, pico, pior drawdown e os últimos retornos da janela
+    continuam de onde pararam.
+
+    Args:
+        precos: Fechamentos das novas datas, colunas = ativos, índice = data
+        quantidades: Quantidade de cada ativo na carteira
+        estado: Estado retornado pela chamada anterior (None = do zero)
+        janela: Pregões da volatilidade/Sharpe móveis
+        taxa_livre_risco: Taxa anual usada no Sharpe
+
+    Returns:
+        (DataFrame com date, total_value, daily_return, volatility,
+         sharpe_ratio, max_drawdown, num_assets; novo estado)
+    """
+    ativos = list(quantidades.index)
+    precos = precos.reindex(columns=ativos).sort_index()
+    cotados = precos.notna().sum(axis=1)  # ativos com cotação na própria data
+
+    # Último preço conhecido de cada ativo vale até a próxima cotação
+    if estado is not None:
+        anteriores = pd.DataFrame([estado['precos']], columns=ativos, index=[None])
+        precos = pd.concat([anteriores, precos]).ffill().iloc[1:]
+    else:
+        precos = precos.ffill()
+
+    # Carteira só é avaliada quando todos os ativos já têm preço
+    completos = precos.notna().all(axis=1)
+    precos = precos[completos]
+    negociados = cotados[completos].to_numpy()
+
+    colunas = ['date', 'total_value', 'daily_return', 'volatility',
+               'sharpe_ratio', 'max_drawdown', 'num_assets']
+    if precos.empty:
+        return pd.DataFrame(columns=colunas), estado
+
+    valores = precos.to_numpy(dtype=float) @ quantidades.to_numpy(dtype=float)
+
+    valor_anterior = estado['valor'] if estado is not None else np.nan
+    retornos = valores / np.concatenate(([valor_anterior], valores[:-1])) - 1
+
+    # Janela móvel continua sobre os retornos da execução anterior
+    historico = estado['retornos'] if estado is not None else []
+    serie = pd.Series(np.concatenate((historico, retornos)))
+    movel = serie.rolling(janela)
+    desvio = movel.std().to_numpy()[-len(valores):]
+    media = movel.mean().to_numpy()[-len(valores):]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatilidade = desvio * np.sqrt(DIAS_UTEIS_ANO)
+        sharpe = (media - taxa_livre_risco / DIAS_UTEIS_ANO) / desvio * np.sqrt(DIAS_UTEIS_ANO)
+    sharpe[~np.isfinite(sharpe)] = np.nan
+
+    pico_anterior = estado['pico'] if estado is not None else -np.inf
+    picos = np.maximum.accumulate(np.maximum(valores, pico_anterior))
+    drawdowns = valores / picos - 1
+    pior_anterior = estado['max_drawdown'] if estado is not None else 0.0
+    max_drawdown = np.minimum.accumulate(np.minimum(drawdowns, pior_anterior))
+
+    datas = [str(pd.Timestamp(d).date()) for d in precos.index]
+    metricas = pd.DataFrame({
+        'date': datas,
+        'total_value': valores,
+        'daily_return': retornos,
+        'volatility': volatilidade,
+        'sharpe_ratio': sharpe,
+        'max_drawdown': max_drawdown,
+        'num_assets': negociados,
+    }, columns=colunas)
+
+    novo_estado = {
+        'ultima_data': datas[-1],
+        'precos': [float(p) for p in precos.iloc[-1]],
+        'valor': float(valores[-1]),
+        'pico': float(picos[-1]),
+        'max_drawdown': float(max_drawdown[-1]),
+        'retornos': [float(r) for r in serie.to_numpy()[-(janela - 1):]] if janela > 1 else [],
+    }
+    return metricas, novo_estado
+
+
+def _versao(conn: sqlite3.Connection, ativos: List[str], ate: str) -> List:
+    """Impressão dos fechamentos até `ate`: muda se uma data já calculada for regravada"""
+    marcadores = ', '.join('?' * len(ativos))
+    contagem, soma = conn.execute(
+        f"SELECT COUNT(*), TOTAL(close_price) FROM price_history "
+        f"WHERE symbol IN ({marcadores}) AND date <= ?", ativos + [ate]).fetchone()
+    return [contagem, soma]
+
+
+class MotorMetricasPortfolio:
+    """
+    Popula portfolio_metrics (uma linha por carteira e data) a partir de
+    price_history. O estado de cada carteira fica em portfolio_metrics_state,
+    guardado na véspera da última data calculada: a execução seguinte relê
+    essa data (o candle do dia é regravado pelo load_incremental) e as novas.
+    Se o histórico anterior mudar (recarga com outros preços), tudo é refeito.
+    """
+
+    def __init__(self, db_path: str, janela: int = JANELA_VOLATILIDADE,
+                 taxa_livre_risco: float = 0.0):
+        self.db_path = db_path
+        self.janela = janela
+        self.taxa_livre_risco = taxa_livre_risco
+        self._preparar_tabelas()
+
+    def _preparar_tabelas(self):
+        """Migração: coluna portfolio + chave única (portfolio, date) + tabela de estado"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(portfolio_metrics)")]
+            if colunas and 'portfolio' not in colunas:
+                conn.execute(f"ALTER TABLE portfolio_metrics "
+                             f"ADD COLUMN portfolio TEXT NOT NULL DEFAULT '{CARTEIRA_PADRAO}'")
+            conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_portfolio_metrics_portfolio_date
+                ON portfolio_metrics(portfolio, date)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS portfolio_metrics_state (
+                    portfolio TEXT PRIMARY KEY,
+                    signature TEXT NOT NULL,
+                    last_date DATE,
+                    state TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def carteira_padrao(conn: sqlite3.Connection) -> Dict[str, float]:
+        """QUANTIDADE_PADRAO ações de cada ativo com histórico"""
+        simbolos = conn.execute("SELECT DISTINCT symbol FROM price_history ORDER BY symbol")
+        return {s: QUANTIDADE_PADRAO for (s,) in simbolos}
+
+    def atualizar(self, carteiras: Optional[Dict[str, Dict[str, float]]] = None,
+                  completo: bool = False) -> Dict[str, int]:
+        """
+        Calcula as métricas pendentes de cada carteira
+
+        Args:
+            carteiras: Nome -> {ativo: quantidade}. Padrão: carteira 'default'
+                com QUANTIDADE_PADRAO de cada ativo em price_history
+            completo: Descarta o estado e recalcula todo o histórico
+
+        Returns:
+            Carteira -> número de datas gravadas
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if carteiras is None:
+                carteiras = {CARTEIRA_PADRAO: self.carteira_padrao(conn)}
+
+            gravadas = {}
+            for nome, posicoes in carteiras.items():
+                gravadas[nome] = self._atualizar_carteira(conn, nome, posicoes, completo)
+            conn.commit()
+            return gravadas
+        finally:
+            conn.close()
+
+    def _atualizar_carteira(self, conn: sqlite3.Connection, nome: str,
+                            posicoes: Dict[str, float], completo: bool) -> int:
+        posicoes = {s: q for s, q in posicoes.items() if q}
+        if not posicoes:
+            return 0
+        assinatura = _assinatura(posicoes, self.janela, self.taxa_livre_risco)
+        ativos = sorted(posicoes)
+
+        linha = conn.execute("SELECT signature, state FROM portfolio_metrics_state "
+                             "WHERE portfolio = ?", (nome,)).fetchone()
+        estado = None
+        if linha and linha[0] == assinatura and not completo:
+            salvo = json.loads(linha[1])
+            anterior = salvo.get('anterior')
+            if anterior and salvo.get('versao') == _versao(conn, ativos, anterior['ultima_data']):
+                estado = anterior
+        if estado is None:
+            # Carteira nova/alterada, histórico regravado ou recálculo: série refeita do início
+            conn.execute("DELETE FROM portfolio_metrics WHERE portfolio = ?", (nome,))
+
+        marcadores = ', '.join('?' * len(ativos))
+        historico = pd.read_sql_query(
+            f"SELECT symbol, date, close_price FROM price_history "
+            f"WHERE symbol IN ({marcadores}) AND date > ? ORDER BY date",
+            conn, params=ativos + [estado['ultima_data'] if estado else ''])
+        if historico.empty:
+            return 0
+
+        precos = historico.pivot_table(index='date', columns='symbol',
+                                       values='close_price', aggfunc='last')
+        quantidades = pd.Series(posicoes).reindex(ativos)
+        metricas, novo_estado = calcular_metricas(
+            precos, quantidades, estado, self.janela, self.taxa_livre_risco)
+        if metricas.empty:
+            return 0
+        # Estado salvo = véspera da última data (a última linha de precos é completa)
+        _, anterior = calcular_metricas(
+            precos.iloc[:-1], quantidades, estado, self.janela, self.taxa_livre_risco)
+        salvo = {
+            'anterior': anterior,
+            'versao': _versao(conn, ativos, anterior['ultima_data']) if anterior else None,
+        }
+
+        metricas.insert(0, 'portfolio', nome)
+        dados = metricas.astype(object).where(metricas.notna(), None)
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO portfolio_metrics ({', '.join(dados.columns)})
+            VALUES ({', '.join('?' * len(dados.columns))})
+        ''', dados.itertuples(index=False, name=None))
+        conn.execute('''
+            INSERT OR REPLACE INTO portfolio_metrics_state
+                (portfolio, signature, last_date, state, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (nome, assinatura, novo_estado['ultima_data'], json.dumps(salvo)))
+        return len(metricas)
+
+
+def consultar_metricas(db_path: str, portfolio: str = CARTEIRA_PADRAO,
+                       inicio: Optional[str] = None, fim: Optional[str] = None,
+                       limite: Optional[int] = None) -> List[Dict]:
+    """Série de métricas de uma carteira (mais recentes primeiro)"""
+    query = ("SELECT date, total_value, daily_return, volatility, sharpe_ratio, "
+             "max_drawdown, num_assets FROM portfolio_metrics WHERE portfolio = ?")
+    params: list = [portfolio]
+    if inicio:
+        query += " AND date >= ?"
+        params.append(inicio)
+    if fim:
+        query += " AND date <= ?"
+        params.append(fim)
+    query += " ORDER BY date DESC"
+    if limite:
+        query += " LIMIT ?"
+        params.append(limite)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+    return df.astype(object).where(df.notna(), None).to_dict('records')
@@ -0,0 +1,363 @@
+# mock_provedores.py - Servidor local que imita Yahoo Finance e Alpha Vantage (testes offline)
+import argparse
+import json
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+
+from dados_sinteticos import gerar_painel
+
+DIAS_COMPACT = 100  # outputsize=compact da Alpha Vantage
+DIAS_FULL = 1260  # ~5 anos para outputsize=full / range=max
+RANGES_YAHOO = {'1d': 1, '5d': 5, '1mo': 21, '3mo': 63, '6mo': 126, '1y': 252,
+                '2y': 504, '5y': 1260, 'max': DIAS_FULL}
+
+NOTA_COTA = ("Thank you for using Alpha Vantage! Our standard API call frequency is "
+             "5 calls per minute and 25 calls per day.")
+
+
+class ConfiguracaoMock:
+    """
+    Comportamento do servidor simulado
+
+    Args:
+        latencia_ms: Latência mediana de cada resposta
+        dispersao: Desvio do log da latência (0 = fixa; 1 = cauda longa)
+        taxa_429: Fração de respostas HTTP 429 (com Retry-After)
+        retry_after: Valor do header Retry-After em segundos
+        taxa_note: Fração de respostas da Alpha Vantage com "Note" (cota)
+        taxa_erro: Fração de respostas HTTP 500
+        taxa_queda: Fração de conexões fechadas sem resposta
+        limite_minuto: Chamadas por minuto por apikey antes do "Note" (0 = sem limite)
+        semente: Semente das falhas, latências e séries de preços
+    """
+
+    def __init__(self, latencia_ms: float = 50.0, dispersao: float = 0.5,
+                 taxa_429: float = 0.0, retry_after: int = 1, taxa_note: float = 0.0,
+                 taxa_erro: float = 0.0, taxa_queda: float = 0.0, limite_minuto: int = 0,
+                 semente: Optional[int] = None):
+        self.latencia_ms = latencia_ms
+        self.dispersao = dispersao
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self.taxa_note = taxa_note
+        self.taxa_erro = taxa_erro
+        self.taxa_queda = taxa_queda
+        self.limite_minuto = limite_minuto
+        self.semente = semente
+
+
+@lru_cache(maxsize=1024)
+def _historico(symbol: str, semente: Optional[int], fim: str):
+    """Série sintética determinística do ativo (mesmo símbolo -> mesmos preços)"""
+    semente_ativo = zlib.crc32(symbol.encode('utf-8')) + (semente or 0)
+    return gerar_painel([symbol], DIAS_FULL, semente_ativo, fim=fim)
+
+
+class ServidorMock(ThreadingHTTPServer):
+    """HTTP server com o estado compartilhado entre as requisições"""
+
+    daemon_threads = True
+
+    def __init__(self, endereco: Tuple[str, int], configuracao: ConfiguracaoMock):
+        super().__init__(endereco, ManipuladorMock)
+        self.configuracao = configuracao
+        self.rng = np.random.default_rng(configuracao.semente)
+        self.fim = datetime.now().strftime('%Y-%m-%d')
+        self.lock = threading.Lock()
+        self.estatisticas: Counter = Counter()
+        self.chamadas_por_chave: Dict[str, deque] = {}
+
+    @property
+    def url(self) -> str:
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def sortear(self) -> Tuple[float, float]:
+        """(latência em segundos, número uniforme para escolher a falha)"""
+        with self.lock:
+            normal, uniforme = self.rng.standard_normal(), self.rng.random()
+        c = self.configuracao
+        return c.latencia_ms / 1000 * float(np.exp(c.dispersao * normal)), float(uniforme)
+
+    def cota_excedida(self, chave: str) -> bool:
+        limite = self.configuracao.limite_minuto
+        if not limite:
+            return False
+        agora = time.monotonic()
+        with self.lock:
+            chamadas = self.chamadas_por_chave.setdefault(chave, deque())
+            while chamadas and agora - chamadas[0] > 60:
+                chamadas.popleft()
+            if len(chamadas) >= limite:
+                return True
+            chamadas.append(agora)
+            return False
+
+    def registrar(self, rota: str, resultado):
+        with self.lock:
+            self.estatisticas[f"{rota}:{resultado}"] += 1
+
+
+class ManipuladorMock(BaseHTTPRequestHandler):
+    """Rotas: /query (Alpha Vantage), /v8/finance/chart, /v7/finance/download, /_stats"""
+
+    server: ServidorMock
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass  # sem log por requisição (atrapalha medições de throughput)
+
+    def _responder(self, status: int, corpo, tipo: str = 'application/json',
+                   headers: Optional[Dict[str, str]] = None):
+        dados = (json.dumps(corpo) if tipo == 'application/json' else corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        partes = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+        caminho = partes.path.rstrip('/')
+
+        if caminho == '/_stats':
+            with self.server.lock:
+                self._responder(200, dict(self.server.estatisticas))
+            return
+
+        if caminho == '/query':
+            rota = 'alpha_vantage'
+        elif caminho.startswith('/v8/finance/chart/'):
+            rota = 'yahoo_chart'
+        elif caminho.startswith('/v7/finance/download/'):
+            rota = 'yahoo_download'
+        else:
+            self.server.registrar('desconhecida', 404)
+            self._responder(404, {'error': 'rota desconhecida'})
+            return
+
+        # Falhas de transporte/HTTP, na ordem: queda, 500, 429
+        latencia, sorteio = self.server.sortear()
+        time.sleep(latencia)
+        c = self.server.configuracao
+        if sorteio < c.taxa_queda:
+            self.server.registrar(rota, 'queda')
+            self.close_connection = True
+            return
+        sorteio -= c.taxa_queda
+        if sorteio < c.taxa_erro:
+            self.server.registrar(rota, 500)
+            self._responder(500, {'error': 'Internal Server Error'})
+            return
+        sorteio -= c.taxa_erro
+        if sorteio < c.taxa_429:
+            self.server.registrar(rota, 429)
+            self._responder(429, {'error': 'Too Many Requests'},
+                            headers={'Retry-After': str(c.retry_after)})
+            return
+        sorteio -= c.taxa_429
+
+        if rota == 'alpha_vantage':
+            self._alpha_vantage(params, params.get('symbol', '').upper(), sorteio < c.taxa_note)
+            return
+        simbolo = unquote(caminho.rsplit('/', 1)[-1]).upper()
+        if rota == 'yahoo_chart':
+            self._yahoo_chart(params, simbolo)
+        else:
+            self._yahoo_download(params, simbolo)
+
+    # === Alpha Vantage ===
+
+    def _alpha_vantage(self, params: Dict[str, str], simbolo: str, nota: bool):
+        funcao = params.get('function', '')
+        if nota or self.server.cota_excedida(params.get('apikey', '')):
+            self.server.registrar('alpha_vantage', 'note')
+            self._responder(200, {'Note': NOTA_COTA})
+            return
+        if not simbolo or simbolo.startswith('INVALID') or funcao not in (
+                'TIME_SERIES_DAILY', 'TIME_SERIES_DAILY_ADJUSTED', 'GLOBAL_QUOTE'):
+            self.server.registrar('alpha_vantage', 'error_message')
+            self._responder(200, {'Error Message': "Invalid API call. Please retry or visit the "
+                                                   "documentation for TIME_SERIES_DAILY."})
+            return
+
+        historico = _historico(simbolo, self.server.configuracao.semente, self.server.fim)
+        if funcao == 'GLOBAL_QUOTE':
+            atual, anterior = historico.iloc[-1], historico.iloc[-2]
+            variacao = atual['close_price'] - anterior['close_price']
+            corpo = {'Global Quote': {
+                '01. symbol': simbolo,
+                '02. open': f"{atual['open_price']:.4f}",
+                '03. high': f"{atual['high_price']:.4f}",
+                '04. low': f"{atual['low_price']:.4f}",
+                '05. price': f"{atual['close_price']:.4f}",
+                '06. volume': str(int(atual['volume'])),
+                '07. latest trading day': atual['date'],
+                '08. previous close': f"{anterior['close_price']:.4f}",
+                '09. change': f"{variacao:.4f}",
+                '10. change percent': f"{variacao / anterior['close_price'] * 100:.4f}%",
+            }}
+        else:
+            dias = DIAS_FULL if params.get('outputsize') == 'full' else DIAS_COMPACT
+            ajustada = funcao == 'TIME_SERIES_DAILY_ADJUSTED'
+            serie = {}
+            for linha in historico.tail(dias).iloc[::-1].itertuples():
+                barra = {
+                    '1. open': f"{linha.open_price:.4f}",
+                    '2. high': f"{linha.high_price:.4f}",
+                    '3. low': f"{linha.low_price:.4f}",
+                    '4. close': f"{linha.close_price:.4f}",
+                }
+                if ajustada:
+                    barra.update({'5. adjusted close': f"{linha.adjusted_close:.4f}",
+                                  '6. volume': str(linha.volume),
+                                  '7. dividend amount': '0.0000',
+                                  '8. split coefficient': '1.0'})
+                else:
+                    barra['5. volume'] = str(linha.volume)
+                serie[linha.date] = barra
+            corpo = {
+                'Meta Data': {
+                    '1. Information': (
+                        'Daily Time Series with Splits and Dividend Events' if ajustada
+                        else 'Daily Prices (open, high, low, close) and Volumes'),
+                    '2. Symbol': simbolo,
+                    '3. Last Refreshed': historico['date'].iloc[-1],
+                    '4. Output Size': 'Full size' if dias == DIAS_FULL else 'Compact',
+                    '5. Time Zone': 'US/Eastern',
+                },
+                'Time Series (Daily)': serie,
+            }
+        self.server.registrar('alpha_vantage', 200)
+        self._responder(200, corpo)
+
+    # === Yahoo Finance ===
+
+    def _periodo(self, params: Dict[str, str], simbolo: str):
+        historico = _historico(simbolo, self.server.configuracao.semente, self.server.fim)
+        if 'period1' in params or 'period2' in params:
+            datas = historico['date']
+            inicio = datetime.fromtimestamp(int(params.get('period1', 0)), timezone.utc)
+            fim = datetime.fromtimestamp(int(params.get('period2', time.time())), timezone.utc)
+            return historico[(datas >= inicio.strftime('%Y-%m-%d'))
+                             & (datas <= fim.strftime('%Y-%m-%d'))]
+        return historico.tail(RANGES_YAHOO.get(params.get('range', '1mo'), 21))
+
+    def _simbolo_inexistente(self, rota: str):
+        self.server.registrar(rota, 404)
+        self._responder(404, {'chart': {'result': None, 'error': {
+            'code': 'Not Found', 'description': 'No data found, symbol may be delisted'}}})
+
+    def _yahoo_chart(self, params: Dict[str, str], simbolo: str):
+        if simbolo.startswith('INVALID'):
+            self._simbolo_inexistente('yahoo_chart')
+            return
+        periodo = self._periodo(params, simbolo)
+        historico = _historico(simbolo, self.server.configuracao.semente, self.server.fim)
+        atual, anterior = historico.iloc[-1], historico.iloc[-2]
+        timestamps = [int(datetime.strptime(d, '%Y-%m-%d').replace(
+            hour=14, minute=30, tzinfo=timezone.utc).timestamp()) for d in periodo['date']]
+        corpo = {'chart': {'result': [{
+            'meta': {
+                'currency': 'USD',
+                'symbol': simbolo,
+                'shortName': f"{simbolo} Inc.",
+                'longName': f"{simbolo} Incorporated",
+                'regularMarketPrice': round(float(atual['close_price']), 4),
+                'regularMarketVolume': int(atual['volume']),
+                'regularMarketChangePercent': round(float(
+                    (atual['close_price'] / anterior['close_price'] - 1) * 100), 4),
+                'chartPreviousClose': round(float(anterior['close_price']), 4),
+                'dataGranularity': params.get('interval', '1d'),
+            },
+            'timestamp': timestamps,
+            'indicators': {
+                'quote': [{
+                    'open': periodo['open_price'].round(4).tolist(),
+                    'high': periodo['high_price'].round(4).tolist(),
+                    'low': periodo['low_price'].round(4).tolist(),
+                    'close': periodo['close_price'].round(4).tolist(),
+                    'volume': periodo['volume'].astype(int).tolist(),
+                }],
+                'adjclose': [{'adjclose': periodo['adjusted_close'].round(4).tolist()}],
+            },
+        }], 'error': None}}
+        self.server.registrar('yahoo_chart', 200)
+        self._responder(200, corpo)
+
+    def _yahoo_download(self, params: Dict[str, str], simbolo: str):
+        if simbolo.startswith('INVALID'):
+            self._simbolo_inexistente('yahoo_download')
+            return
+        periodo = self._periodo(params, simbolo)
+        csv = periodo.rename(columns={
+            'date': 'Date', 'open_price': 'Open', 'high_price': 'High', 'low_price': 'Low',
+            'close_price': 'Close', 'adjusted_close': 'Adj Close', 'volume': 'Volume',
+        })[['Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']].to_csv(index=False)
+        self.server.registrar('yahoo_download', 200)
+        self._responder(200, csv, tipo='text/csv')
+
+
+def iniciar_mock(configuracao: Optional[ConfiguracaoMock] = None, host: str = '127.0.0.1',
+                 porta: int = 0) -> ServidorMock:
+    """
+    Sobe o servidor numa thread (porta 0 = livre) - para benchmarks no
+    mesmo processo. Encerrar com servidor.shutdown().
+
+    Para apontar os extratores: ALPHAVANTAGE_BASE_URL=<url>/query e
+    YAHOO_BASE_URL=<url>
+    """
+    servidor = ServidorMock((host, porta), configuracao or ConfiguracaoMock())
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    """CLI: python mock_provedores.py --porta 8765 --latencia-ms 80 --taxa-429 0.05"""
+    parser = argparse.ArgumentParser(description="Mock local de Yahoo Finance e Alpha Vantage")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia-ms', type=float, default=50.0, help="Latência mediana")
+    parser.add_argument('--dispersao', type=float, default=0.5, help="Desvio do log da latência")
+    parser.add_argument('--taxa-429', type=float, default=0.0, help="Fração de HTTP 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After dos 429 (s)")
+    parser.add_argument('--taxa-note', type=float, default=0.0,
+                        help="Fração de 'Note' da Alpha Vantage")
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help="Fração de HTTP 500")
+    parser.add_argument('--taxa-queda', type=float, default=0.0,
+                        help="Fração de conexões derrubadas")
+    parser.add_argument('--limite-minuto', type=int, default=0,
+                        help="Chamadas/min por apikey (0 = livre)")
+    parser.add_argument('--semente', type=int, help="Semente (falhas, latências e preços)")
+    args = parser.parse_args()
+
+    configuracao = ConfiguracaoMock(args.latencia_ms, args.dispersao, args.taxa_429,
+                                    args.retry_after, args.taxa_note, args.taxa_erro,
+                                    args.taxa_queda, args.limite_minuto, args.semente)
+    servidor = ServidorMock((args.host, args.porta), configuracao)
+    print(f"🧪 Mock de provedores em {servidor.url}")
+    print(f"   export ALPHAVANTAGE_BASE_URL={servidor.url}/query")
+    print(f"   export YAHOO_BASE_URL={servidor.url}")
+    print(f"   Estatísticas: {servidor.url}/_stats")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Mock encerrado")
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# otimizacao_parametros.py - Varredura paralela de janelas de médias e limites de RSI
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest import (BLOCO_ATIVOS, ESTRATEGIAS, _metricas_bloco, base_metricas, calcular_rsi,
+                      carregar_matriz_precos, media_de_somas, metricas_carteira,
+                      posicoes_de_sinais, sinais_medias, sinais_rsi, somas_acumuladas)
+from indicadores import JANELA_RSI
+from telemetria import registrar_cache
+
+# Grades padrão: valores usados hoje no pipeline (7/21, 20/50, 30/70) e vizinhos
+GRADE_MEDIAS = {'janela_curta': [5, 7, 10, 20], 'janela_longa': [21, 30, 50, 100, 200]}
+GRADE_RSI = {'sobrevendido': [20, 25, 30, 35], 'sobrecomprado': [65, 70, 75, 80],
+             'janela': [JANELA_RSI]}
+CRITERIOS = ('sharpe', 'retorno_total', 'retorno_anual', 'max_drawdown', 'taxa_acerto')
+
+# Estado de cada processo do pool (preenchido uma vez pelo initializer)
+_dados_worker: Dict = {}
+
+
+def gerar_grade(estrategia: str = 'medias', **valores: Sequence) -> List[Dict]:
+    """
+    Produto cartesiano dos valores de cada parâmetro (os não informados
+    usam a grade padrão), descartando combinações sem sentido
+    (janela curta >= longa, sobrevendido >= sobrecomprado)
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estratégia desconhecida: {estrategia} (use {', '.join(ESTRATEGIAS)})")
+    padrao = GRADE_MEDIAS if estrategia == 'medias' else GRADE_RSI
+    desconhecidos = set(valores) - set(padrao)
+    if desconhecidos:
+        raise ValueError(f"Parâmetros inválidos para '{estrategia}': "
+                         f"{', '.join(sorted(desconhecidos))}")
+
+    eixos = {nome: sorted(set(valores.get(nome) or padrao_eixo))
+             for nome, padrao_eixo in padrao.items()}
+    grade = [dict(zip(eixos, combinacao)) for combinacao in product(*eixos.values())]
+    if estrategia == 'medias':
+        return [p for p in grade if p['janela_curta'] < p['janela_longa']]
+    return [p for p in grade if p['sobrevendido'] < p['sobrecomprado']]
+
+
+def avaliar_bloco(precos: np.ndarray, estrategia: str, grade: List[Dict],
+                  vendido: bool = False, custo: float = 0.0) -> List[Dict]:
+    """
+    Avalia as combinações da grade sobre um bloco de ativos
+
+    Retornos, somas acumuladas (médias) e RSI de cada janela são calculados
+    uma única vez para o bloco; cada combinação custa só as diferenças de
+    somas e as métricas, O(n) sobre a matriz.
+
+    Returns:
+        Para cada combinação: soma diária dos retornos dos ativos negociados,
+        soma/quantidade das taxas de acerto e total de operações
+    """
+    base = base_metricas(precos)
+    if estrategia == 'medias':
+        somas = somas_acumuladas(precos)
+        janelas = {p[nome] for p in grade for nome in ('janela_curta', 'janela_longa')}
+        medias = {janela: media_de_somas(somas, janela) for janela in janelas}
+    else:
+        rsis = {janela: calcular_rsi(precos, janela) for janela in {p['janela'] for p in grade}}
+
+    parciais = []
+    for parametros in grade:
+        if estrategia == 'medias':
+            sinais = sinais_medias(precos, parametros['janela_curta'], parametros['janela_longa'],
+                                   medias=medias)
+        else:
+            sinais = sinais_rsi(precos, parametros['sobrevendido'], parametros['sobrecomprado'],
+                                rsi=rsis[parametros['janela']])
+        metricas = _metricas_bloco(precos, posicoes_de_sinais(sinais, vendido), custo, base)
+        acerto = metricas['taxa_acerto']
+        parciais.append({
+            'soma_diaria': np.where(base['ativo_no_dia'],
+                                    metricas['_retornos_diarios'], 0.0).sum(axis=1),
+            'soma_acerto': float(np.nansum(acerto)),
+            'qtd_acerto': int(np.isfinite(acerto).sum()),
+            'operacoes': int(metricas['operacoes'].sum()),
+        })
+    return parciais
+
+
+def _init_worker(precos: np.ndarray, estrategia: str, vendido: bool, custo: float):
+    """Recebe a matriz de preços uma vez por processo (não a cada tarefa)"""
+    _dados_worker.update({'precos': precos, 'estrategia': estrategia,
+                          'vendido': vendido, 'custo': custo})
+
+
+def _avaliar_tarefa(tarefa):
+    inicio, fim, indices, grade = tarefa
+    bloco = _dados_worker['precos'][:, inicio:fim]
+    return indices, avaliar_bloco(bloco, _dados_worker['estrategia'], grade,
+                                  _dados_worker['vendido'], _dados_worker['custo'])
+
+
+def varrer_parametros(precos: np.ndarray, estrategia: str, grade: List[Dict],
+                      vendido: bool = False, custo: float = 0.0, workers: int = 1,
+                      bloco_ativos: int = BLOCO_ATIVOS) -> List[Dict]:
+    """
+    Métricas da carteira igualmente ponderada para cada combinação da grade
+
+    O trabalho é dividido em tarefas (bloco de ativos x fatia da grade) e
+    distribuído num pool de processos; com poucos blocos a grade é fatiada
+    para ocupar todos os workers. O resultado não depende de `workers`.
+
+    Args:
+        precos: Matriz datas x ativos (ver backtest.matriz_precos)
+        estrategia: 'medias' ou 'rsi'
+        grade: Combinações de parâmetros (ver gerar_grade)
+        workers: Processos do pool (1 = no processo atual)
+        bloco_ativos: Colunas por tarefa (limita a memória de cada worker)
+
+    Returns:
+        Lista na ordem da grade com os parâmetros, as métricas de
+        backtest.metricas_carteira e o total de operações
+    """
+    if not grade:
+        return []
+    n_datas, n_ativos = precos.shape
+    blocos = [(inicio, min(inicio + bloco_ativos, n_ativos))
+              for inicio in range(0, n_ativos, bloco_ativos)]
+    fatias = max(1, min(len(grade), math.ceil(workers / max(len(blocos), 1))))
+    tamanho_fatia = math.ceil(len(grade) / fatias)
+    tarefas = []
+    for inicio, fim in blocos:
+        for i in range(0, len(grade), tamanho_fatia):
+            indices = list(range(i, min(i + tamanho_fatia, len(grade))))
+            tarefas.append((inicio, fim, indices, [grade[j] for j in indices]))
+
+    soma_diaria = np.zeros((len(grade), n_datas))
+    soma_acerto = np.zeros(len(grade))
+    qtd_acerto = np.zeros(len(grade), dtype=np.int64)
+    operacoes = np.zeros(len(grade), dtype=np.int64)
+
+    def agregar(indices: List[int], parciais: List[Dict]):
+        for j, parcial in zip(indices, parciais):
+            soma_diaria[j] += parcial['soma_diaria']
+            soma_acerto[j] += parcial['soma_acerto']
+            qtd_acerto[j] += parcial['qtd_acerto']
+            operacoes[j] += parcial['operacoes']
+
+    if workers > 1 and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(precos, estrategia, vendido, custo)) as pool:
+            for indices, parciais in pool.map(_avaliar_tarefa, tarefas):
+                agregar(indices, parciais)
+    else:
+        for inicio, fim, indices, fatia in tarefas:
+            agregar(indices, avaliar_bloco(precos[:, inicio:fim], estrategia, fatia,
+                                           vendido, custo))
+
+    # Ativos negociados por dia: mesma regra de base_metricas, para a matriz inteira
+    listado = np.maximum.accumulate(~np.isnan(precos), axis=0)
+    ativos_diarios = np.concatenate(([0], listado[:-1].sum(axis=1))) if n_datas else np.zeros(0)
+
+    resultados = []
+    for j, parametros in enumerate(grade):
+        taxa_acerto = soma_acerto[j] / qtd_acerto[j] if qtd_acerto[j] else float('nan')
+        resultados.append({**parametros,
+                           **metricas_carteira(soma_diaria[j], ativos_diarios, taxa_acerto),
+                           'operacoes': int(operacoes[j])})
+    return resultados
+
+
+def versao_dados(conn: sqlite3.Connection, simbolos: Optional[List[str]] = None,
+                 inicio: Optional[str] = None, fim: Optional[str] = None) -> str:
+    """
+    Versão do recorte de price_history usado na varredura: muda quando
+    linhas entram, saem ou são regravadas (created_at / soma dos preços)
+    """
+    query = ("SELECT COUNT(*), MIN(date), MAX(date), MAX(created_at), TOTAL(close_price) "
+             "FROM price_history WHERE 1 = 1")
+    params: list = []
+    if simbolos:
+        query += f" AND symbol IN ({', '.join('?' * len(simbolos))})"
+        params += [s.upper() for s in simbolos]
+    if inicio:
+        query += " AND date >= ?"
+        params.append(inicio)
+    if fim:
+        query += " AND date <= ?"
+        params.append(fim)
+    linha = conn.execute(query, params).fetchone()
+    return hashlib.sha256(repr(tuple(linha)).encode('utf-8')).hexdigest()[:16]
+
+
+def _chave(estrategia: str, parametros: Dict, vendido: bool, custo: float,
+           simbolos: Optional[List[str]], inicio: Optional[str], fim: Optional[str]) -> str:
+    conteudo = json.dumps([estrategia, sorted(parametros.items()), vendido, custo,
+                           sorted(s.upper() for s in simbolos) if simbolos else None, inicio, fim])
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:24]
+
+
+def _criar_tabela_cache(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS parameter_sweep_cache (
+            chave VARCHAR(24) PRIMARY KEY,
+            estrategia VARCHAR(10),
+            versao VARCHAR(16),
+            resultado TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def otimizar_parametros(db_path: str, estrategia: str = 'medias',
+                        grade: Optional[List[Dict]] = None,
+                        simbolos: Optional[List[str]] = None, inicio: Optional[str] = None,
+                        fim: Optional[str] = None, vendido: bool = False, custo: float = 0.0,
+                        workers: int = 1, usar_cache: bool = True, criterio: str = 'sharpe',
+                        bloco_ativos: int = BLOCO_ATIVOS) -> Dict:
+    """
+    Varredura sobre o banco do ETL com cache por versão dos dados
+
+    Cada combinação é guardada em parameter_sweep_cache junto com a versão
+    do recorte de preços; numa nova execução só são recalculadas as
+    combinações novas ou as de dados que mudaram desde a última varredura.
+
+    Returns:
+        Dicionário com versão dos dados, contagens (em cache / calculadas),
+        duração e `ranking` (DataFrame ordenado pelo critério, melhor primeiro)
+    """
+    if criterio not in CRITERIOS:
+        raise ValueError(f"Critério desconhecido: {criterio} (use {', '.join(CRITERIOS)})")
+    grade = grade if grade is not None else gerar_grade(estrategia)
+    inicio_execucao = time.perf_counter()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        _criar_tabela_cache(conn)
+        versao = versao_dados(conn, simbolos, inicio, fim)
+        chaves = [_chave(estrategia, p, vendido, custo, simbolos, inicio, fim) for p in grade]
+        em_cache: Dict[str, Dict] = {}
+        if usar_cache:
+            for i in range(0, len(chaves), 500):
+                lote = chaves[i:i + 500]
+                linhas = conn.execute(
+                    f"SELECT chave, resultado FROM parameter_sweep_cache "
+                    f"WHERE versao = ? AND chave IN ({', '.join('?' * len(lote))})",
+                    [versao] + lote)
+                em_cache.update((chave, json.loads(resultado)) for chave, resultado in linhas)
+
+        pendentes = [i for i, chave in enumerate(chaves) if chave not in em_cache]
+        registrar_cache('varredura_parametros', True, len(chaves) - len(pendentes))
+        registrar_cache('varredura_parametros', False, len(pendentes))
+        if pendentes:
+            precos, _, _ = carregar_matriz_precos(db_path, simbolos, inicio, fim)
+            calculados = varrer_parametros(precos, estrategia, [grade[i] for i in pendentes],
+                                           vendido, custo, workers, bloco_ativos)
+            for i, resultado in zip(pendentes, calculados):
+                em_cache[chaves[i]] = resultado
+            conn.executemany('''
+                INSERT OR REPLACE INTO parameter_sweep_cache
+                    (chave, estrategia, versao, resultado, created_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', [(chaves[i], estrategia, versao, json.dumps(r))
+                  for i, r in zip(pendentes, calculados)])
+            conn.commit()
+    finally:
+        conn.close()
+
+    ranking = pd.DataFrame([em_cache[chave] for chave in chaves])
+    if len(ranking):
+        ranking = ranking.sort_values(criterio, ascending=False,
+                                      na_position='last').reset_index(drop=True)
+    return {
+        'estrategia': estrategia,
+        'versao_dados': versao,
+        'criterio': criterio,
+        'combinacoes': len(grade),
+        'em_cache': len(grade) - len(pendentes),
+        'calculadas': len(pendentes),
+        'ranking': ranking,
+        'duracao_segundos': round(time.perf_counter() - inicio_execucao, 3),
+    }
+
+
+def _lista(tipo):
+    return lambda valor: [tipo(v) for v in valor.split(',') if v.strip()]
+
+
+def main():
+    """
+    CLI: python otimizacao_parametros.py --estrategia medias --curtas 5,7,10
+    --longas 21,50 --workers 4
+    """
+    parser = argparse.ArgumentParser(description="Varredura de janelas de médias e limites de RSI")
+    parser.add_argument('simbolos', nargs='*', help="Ativos (padrão: todos do banco)")
+    parser.add_argument('--estrategia', choices=ESTRATEGIAS, default='medias')
+    parser.add_argument('--curtas', type=_lista(int), help="Janelas curtas (ex: 5,7,10)")
+    parser.add_argument('--longas', type=_lista(int), help="Janelas longas (ex: 21,50,200)")
+    parser.add_argument('--sobrevendido', type=_lista(float),
+                        help="Limites inferiores de RSI (ex: 25,30)")
+    parser.add_argument('--sobrecomprado', type=_lista(float),
+                        help="Limites superiores de RSI (ex: 70,75)")
+    parser.add_argument('--janelas-rsi', type=_lista(int), help="Janelas do RSI (ex: 9,14)")
+    parser.add_argument('--inicio', help="Data inicial YYYY-MM-DD")
+    parser.add_argument('--fim', help="Data final YYYY-MM-DD")
+    parser.add_argument('--vendido', action='store_true', help="VENDA abre posição vendida")
+    parser.add_argument('--custo', type=float, default=0.0, help="Custo por giro (ex: 0.001)")
+    parser.add_argument('--criterio', choices=CRITERIOS, default='sharpe')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--sem-cache', action='store_true', help="Recalcula todas as combinações")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--db', default="data/financial_data.db", help="Banco do ETL")
+    args = parser.parse_args()
+
+    if args.estrategia == 'medias':
+        grade = gerar_grade('medias', janela_curta=args.curtas, janela_longa=args.longas)
+    else:
+        grade = gerar_grade('rsi', sobrevendido=args.sobrevendido,
+                            sobrecomprado=args.sobrecomprado, janela=args.janelas_rsi)
+
+    resultado = otimizar_parametros(args.db, args.estrategia, grade, args.simbolos, args.inicio,
+                                    args.fim, args.vendido, args.custo, args.workers,
+                                    usar_cache=not args.sem_cache, criterio=args.criterio)
+    print(f"🔍 Varredura '{resultado['estrategia']}': {resultado['combinacoes']} combinações "
+          f"({resultado['em_cache']} em cache, {resultado['calculadas']} calculadas) "
+          f"em {resultado['duracao_segundos']:.2f}s")
+
+    parametros = list(grade[0]) if grade else []
+    for posicao, linha in enumerate(resultado['ranking'].head(args.top).to_dict('records'), 1):
+        descricao = ', '.join(f"{nome}={linha[nome]:g}" for nome in parametros)
+        print(f"{posicao:3d}. {descricao:45} | Sharpe {linha['sharpe']:6.2f} | "
+              f"retorno {linha['retorno_total']:+8.2%} | "
+              f"max drawdown {linha['max_drawdown']:7.2%} | "
+              f"acerto {linha['taxa_acerto']:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# perfil.py - Perfilamento sob demanda (cProfile) de execuções do ETL e requisições da API
+import argparse
+import cProfile
+import functools
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PASTA_PADRAO = os.getenv("ETL_PROFILE_DIR", "profiles")
+TOP_PADRAO = int(os.getenv("ETL_PROFILE_TOP", "30"))
+ORDENACAO_PADRAO = os.getenv("ETL_PROFILE_SORT", "cumulative")
+
+# ETL_PROFILE=processar_portfolio,/acoes/{codigo} -> perfila só esses; 1, all ou * -> tudo
+TODOS = {"1", "all", "*"}
+ALVOS = frozenset(alvo.strip() for alvo in os.getenv("ETL_PROFILE", "").split(",") if alvo.strip())
+
+# Um cProfile ativo por vez no processo: chamadas aninhadas ou concorrentes
+# enquanto outra é medida rodam sem perfil (aparecem no perfil de quem chegou primeiro)
+_trava = threading.Lock()
+
+# 3.12+: o cProfile roda sobre sys.monitoring, que é do interpretador inteiro -
+# um único Profile já enxerga todas as threads e um segundo enable() levanta ValueError
+_PERFIL_GLOBAL = sys.version_info >= (3, 12)
+
+
+def habilitado(nome: str) -> bool:
+    """True se ETL_PROFILE pede o perfil de `nome` (função ou rota da API)"""
+    return bool(ALVOS) and (nome in ALVOS or not ALVOS.isdisjoint(TODOS))
+
+
+def _nome_arquivo(nome: str) -> str:
+    # '/acoes/{codigo}' -> 'acoes_codigo'
+    return re.sub(r'[^0-9A-Za-z_-]+', '_', nome).strip('_') or 'raiz'
+
+
+def resumo(estatisticas: pstats.Stats, top: int = TOP_PADRAO,
+           ordenacao: str = ORDENACAO_PADRAO) -> str:
+    """Top N funções, no formato do pstats"""
+    texto = io.StringIO()
+    estatisticas.stream = texto
+    estatisticas.strip_dirs().sort_stats(ordenacao).print_stats(top)
+    return texto.getvalue()
+
+
+def salvar(perfis: List[cProfile.Profile], nome: str, pasta: str = PASTA_PADRAO,
+           top: int = TOP_PADRAO) -> Dict[str, str]:
+    """
+    Soma os perfis (thread principal + threads do bloco) e grava
+    <nome>_<timestamp>_<pid>.prof (abre com snakeviz ou `python -m pstats`)
+    e o .txt com o top N
+
+    Returns:
+        {'prof': caminho, 'txt': caminho}
+    """
+    os.makedirs(pasta, exist_ok=True)
+    carimbo = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{os.getpid()}"
+    base = os.path.join(pasta, f"{_nome_arquivo(nome)}_{carimbo}")
+    estatisticas = pstats.Stats(*perfis)
+    estatisticas.dump_stats(base + ".prof")
+    with open(base + ".txt", "w", encoding="utf-8") as arquivo:
+        arquivo.write(resumo(estatisticas, top))
+    return {'prof': base + ".prof", 'txt': base + ".txt"}
+
+
+@contextmanager
+def perfilar(nome: str, pasta: str = PASTA_PADRAO, top: int = TOP_PADRAO):
+    """
+    Perfila o bloco com cProfile (determinístico). Até o 3.11 as threads
+    criadas dentro do bloco (estágios do pipeline) ganham perfil próprio,
+    somado ao da thread atual, e as que já existiam ficam de fora; no 3.12+
+    um só perfil cobre todas as threads do processo enquanto o bloco roda.
+
+    Produz um dict preenchido com os caminhos gravados ao sair do bloco,
+    inclusive se ele levantar exceção; fica vazio se outro perfil já
+    estava em andamento.
+    """
+    arquivos: Dict[str, str] = {}
+    if not _trava.acquire(blocking=False):
+        yield arquivos
+        return
+    perfis: List[cProfile.Profile] = []
+    anterior = threading.getprofile()
+
+    def iniciar_na_thread(*_):
+        # Chamado no primeiro evento da thread nova: troca o gancho por um cProfile dela
+        sys.setprofile(None)
+        perfil = cProfile.Profile()
+        perfil.enable()
+        perfis.append(perfil)
+
+    try:
+        principal = cProfile.Profile()
+        try:
+            principal.enable()
+        except ValueError:
+            # Outra ferramenta de perfil já ativa (sys.monitoring no 3.12+): roda sem perfil
+            yield arquivos
+            return
+        perfis.append(principal)
+        if not _PERFIL_GLOBAL:
+            threading.setprofile(iniciar_na_thread)
+        try:
+            yield arquivos
+        finally:
+            principal.disable()
+            if not _PERFIL_GLOBAL:
+                threading.setprofile(anterior)
+            arquivos.update(salvar(list(perfis), nome, pasta, top))
+            print(f"🔬 Perfil de {nome} salvo em {arquivos['prof']}")
+    finally:
+        _trava.release()
+
+
+def perfilavel(nome: Optional[str] = None):
+    """
+    Decorator: perfila cada chamada quando ETL_PROFILE inclui `nome`
+    (padrão: nome da função). Desligado, devolve a própria função - nenhum
+    custo por chamada.
+    """
+    def decorar(funcao):
+        alvo = nome or funcao.__name__
+        if not habilitado(alvo):
+            return funcao
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with perfilar(alvo):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorar
+
+
+def main():
+    """CLI: python perfil.py profiles/processar_portfolio_*.prof --top 20 --ordem tottime"""
+    parser = argparse.ArgumentParser(description="Resumo de perfis gravados (.prof)")
+    parser.add_argument('arquivos', nargs='+', help="Arquivos .prof (vários são somados)")
+    parser.add_argument('--top', type=int, default=TOP_PADRAO, help="Funções listadas")
+    parser.add_argument('--ordem', default=ORDENACAO_PADRAO,
+                        help="cumulative, tottime, ncalls, ... (ordenação do pstats)")
+    args = parser.parse_args()
+
+    print(resumo(pstats.Stats(*args.arquivos), args.top, args.ordem))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# pipeline_estagios.py - Pipeline produtor/consumidor com filas limitadas
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+# Marcador de fim de fluxo entre estágios
+_FIM = object()
+
+
+class Estagio:
+    """
+    Um estágio do pipeline (ex: extract, transform, load)
+
+    Args:
+        nome: Nome do estágio (usado nas estatísticas)
+        funcao: Recebe o item do estágio anterior e retorna o próximo item.
+            Retornar None descarta o item (ex: extração falhou).
+        workers: Número de threads dedicadas ao estágio
+    """
+
+    def __init__(self, nome: str, funcao: Callable[[Any], Any], workers: int = 1):
+        self.nome = nome
+        self.funcao = funcao
+        self.workers = max(1, workers)
+
+
+class PipelineEstagios:
+    """
+    Executa estágios em paralelo ligados por filas limitadas.
+
+    Enquanto o estágio de carga grava o símbolo N, a extração já busca o N+1.
+    As filas têm capacidade fixa: se um estágio fica para trás, os anteriores
+    bloqueiam (backpressure) em vez de acumular itens em memória. A vazão
+    total tende à do estágio mais lento, não à soma de todos.
+    """
+
+    def __init__(self, estagios: List[Estagio], capacidade_fila: int = 8):
+        if not estagios:
+            raise ValueError("Pipeline precisa de pelo menos um estágio")
+        self.estagios = estagios
+        self.capacidade_fila = capacidade_fila
+
+    def executar(self, itens: Iterable[Any]) -> Dict:
+        """
+        Processa `itens` por todos os estágios
+
+        Returns:
+            Dicionário com:
+            - resultados: saídas do último estágio, na ordem de entrada
+            - erros: lista de (estagio, item, mensagem)
+            - descartados: itens para os quais algum estágio retornou None
+            - tempo_por_estagio: segundos acumulados em cada estágio
+            - duracao: tempo total de parede
+        """
+        filas = [queue.Queue(maxsize=self.capacidade_fila) for _ in range(len(self.estagios) + 1)]
+        resultados: List[Tuple[int, Any]] = []
+        erros: List[Tuple[str, Any, str]] = []
+        descartados: List[Any] = []
+        tempo_por_estagio = {estagio.nome: 0.0 for estagio in self.estagios}
+        lock = threading.Lock()
+        inicio = time.perf_counter()
+
+        def worker(indice_estagio: int, ativos: List[int]):
+            estagio = self.estagios[indice_estagio]
+            entrada, saida = filas[indice_estagio], filas[indice_estagio + 1]
+            while True:
+                mensagem = entrada.get()
+                if mensagem is _FIM:
+                    with lock:
+                        ativos[0] -= 1
+                        ultimo = ativos[0] == 0
+                    # Último worker do estágio encerra o próximo estágio
+                    if ultimo:
+                        proximos = (self.estagios[indice_estagio + 1].workers
+                                    if indice_estagio + 1 < len(self.estagios) else 1)
+                        for _ in range(proximos):
+                            saida.put(_FIM)
+                    return
+
+                seq, original, item = mensagem
+                t0 = time.perf_counter()
+                try:
+                    resultado = estagio.funcao(item)
+                except Exception as e:
+                    with lock:
+                        erros.append((estagio.nome, original, str(e)))
+                    continue
+                finally:
+                    with lock:
+                        tempo_por_estagio[estagio.nome] += time.perf_counter() - t0
+
+                if resultado is None:
+                    with lock:
+                        descartados.append(original)
+                    continue
+                saida.put((seq, original, resultado))
+
+        threads = []
+        for indice, estagio in enumerate(self.estagios):
+            ativos = [estagio.workers]
+            for n in range(estagio.workers):
+                t = threading.Thread(target=worker, args=(indice, ativos),
+                                     name=f"{estagio.nome}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        # Coletor do último estágio (também limitado pela fila)
+        def coletor():
+            while True:
+                mensagem = filas[-1].get()
+                if mensagem is _FIM:
+                    return
+                seq, _, resultado = mensagem
+                resultados.append((seq, resultado))
+
+        t_coletor = threading.Thread(target=coletor, name="coletor", daemon=True)
+        t_coletor.start()
+
+        # Produtor: bloqueia quando a primeira fila está cheia
+        for seq, item in enumerate(itens):
+            filas[0].put((seq, item, item))
+        for _ in range(self.estagios[0].workers):
+            filas[0].put(_FIM)
+
+        for t in threads:
+            t.join()
+        t_coletor.join()
+
+        resultados.sort(key=lambda par: par[0])
+        return {
+            'resultados': [resultado for _, resultado in resultados],
+            'erros': erros,
+            'descartados': descartados,
+            'tempo_por_estagio': tempo_por_estagio,
+            'duracao': time.perf_counter() - inicio,
+        }
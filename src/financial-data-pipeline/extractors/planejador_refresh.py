@@ -0,0 +1,155 @@
+# planejador_refresh.py - Agenda de atualização que cabe na cota das APIs
+import sqlite3
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Dict, List, Optional
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
+
+# Pregões por sufixo do código: (fuso, abertura, fechamento, offset UTC fixo de fallback)
+PREGOES = {
+    '.SA': ('America/Sao_Paulo', dtime(10, 0), dtime(17, 0), -3),
+    '': ('America/New_York', dtime(9, 30), dtime(16, 0), -5),
+}
+
+
+def _fuso(nome: str, offset_horas: int):
+    """Fuso do pregão; sem base tz (ex: Windows sem tzdata) usa offset fixo"""
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(nome)
+        except Exception:
+            pass
+    return timezone(timedelta(hours=offset_horas))
+
+
+def _pregao(symbol: str):
+    for sufixo, pregao in PREGOES.items():
+        if sufixo and symbol.upper().endswith(sufixo):
+            return pregao
+    return PREGOES['']
+
+
+def ultimo_momento_pregao(symbol: str, agora: datetime) -> datetime:
+    """
+    Último instante (UTC) em que o preço de `symbol` pode ter mudado:
+    `agora` se o pregão está aberto, senão o fechamento mais recente.
+    Fins de semana são pulados (feriados não são considerados).
+    """
+    nome_fuso, abertura, fechamento, offset = _pregao(symbol)
+    local = agora.astimezone(_fuso(nome_fuso, offset))
+
+    if local.weekday() < 5 and abertura <= local.time() < fechamento:
+        return agora
+
+    dia = local.date()
+    if local.weekday() >= 5 or local.time() < abertura:
+        dia -= timedelta(days=1)
+    while dia.weekday() >= 5:
+        dia -= timedelta(days=1)
+
+    fechamento_local = datetime.combine(dia, fechamento, tzinfo=local.tzinfo)
+    return fechamento_local.astimezone(timezone.utc)
+
+
+def carregar_ultimas_atualizacoes(db_path: str, tabela: str, coluna_simbolo: str,
+                                  coluna_data: str = "created_at",
+                                  condicao: Optional[str] = None) -> Dict[str, datetime]:
+    """
+    Última atualização de cada símbolo numa tabela do banco
+    (ex: acoes/codigo, cotacoes/symbol, price_history/symbol).
+    Datas sem fuso são tratadas como UTC, como o CURRENT_TIMESTAMP do SQLite.
+    `condicao` (SQL) restringe as linhas que contam como atualização
+    (ex: "fonte NOT LIKE 'Simulado%'").
+    """
+    filtro = f" WHERE {condicao}" if condicao else ""
+    conn = sqlite3.connect(db_path)
+    try:
+        linhas = conn.execute(
+            f"SELECT {coluna_simbolo}, MAX({coluna_data}) FROM {tabela}{filtro} "
+            f"GROUP BY {coluna_simbolo}"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+    ultimas = {}
+    for simbolo, valor in linhas:
+        if not valor:
+            continue
+        try:
+            data = datetime.fromisoformat(str(valor))
+        except ValueError:
+            continue
+        if data.tzinfo is None:
+            data = data.replace(tzinfo=timezone.utc)
+        ultimas[simbolo] = data
+    return ultimas
+
+
+class PlanejadorRefresh:
+    """
+    Decide quais símbolos atualizar neste ciclo sem estourar a cota.
+
+    Pontuação = horas de defasagem x prioridade. A defasagem conta só até o
+    último momento de pregão: um ativo atualizado depois do fechamento não
+    tem dado novo e fica de fora. Nunca atualizados vêm primeiro.
+
+    Args:
+        prioridades: Peso por símbolo (ex: mais consultados / maior posição)
+        prioridade_padrao: Peso de símbolos sem prioridade configurada
+        custo_por_simbolo: Requisições consumidas por símbolo
+            (ex: 2 quando também busca histórico)
+    """
+
+    def __init__(self, prioridades: Optional[Dict[str, float]] = None,
+                 prioridade_padrao: float = 1.0, custo_por_simbolo: int = 1):
+        self.prioridades = {k.upper(): v for k, v in (prioridades or {}).items()}
+        self.prioridade_padrao = prioridade_padrao
+        self.custo_por_simbolo = max(1, custo_por_simbolo)
+
+    def pontuar(self, symbol: str, ultima: Optional[datetime], agora: datetime) -> float:
+        prioridade = self.prioridades.get(symbol.upper(), self.prioridade_padrao)
+        if ultima is None:
+            return float('inf') if prioridade > 0 else 0.0
+        defasagem = (ultimo_momento_pregao(symbol, agora) - ultima).total_seconds() / 3600
+        return max(0.0, defasagem) * prioridade
+
+    def planejar(self, universo: List[str], ultimas_atualizacoes: Dict[str, datetime],
+                 cota: Optional[int] = None, agora: Optional[datetime] = None,
+                 custo_por_simbolo: Optional[int] = None) -> Dict:
+        """
+        Monta a agenda do ciclo
+
+        Args:
+            universo: Todos os símbolos acompanhados
+            ultimas_atualizacoes: Símbolo -> última atualização (UTC)
+            cota: Requisições restantes (None = sem limite)
+            agora: Referência de tempo (padrão: agora, UTC)
+            custo_por_simbolo: Requisições por símbolo neste ciclo
+                (padrão: o do planejador)
+
+        Returns:
+            - agenda: símbolos a atualizar, do mais para o menos urgente
+            - adiados: símbolos que ficam para o próximo ciclo
+            - pontuacoes: pontuação de cada símbolo
+        """
+        agora = agora or datetime.now(timezone.utc)
+        universo = list(dict.fromkeys(universo))
+        pontuacoes = {s: self.pontuar(s, ultimas_atualizacoes.get(s), agora) for s in universo}
+
+        candidatos = sorted((s for s in universo if pontuacoes[s] > 0),
+                            key=lambda s: pontuacoes[s], reverse=True)
+        if cota is not None:
+            custo = max(1, custo_por_simbolo or self.custo_por_simbolo)
+            candidatos = candidatos[:max(0, cota) // custo]
+
+        agendados = set(candidatos)
+        return {
+            'agenda': candidatos,
+            'adiados': [s for s in universo if s not in agendados],
+            'pontuacoes': pontuacoes,
+        }
@@ -0,0 +1,203 @@
+# pool_chaves.py - Rotação de chaves da Alpha Vantage com controle de cota por chave
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from resiliencia import OrcamentoExecucao
+
+
+def carregar_chaves(api_key: Optional[str] = None) -> List[str]:
+    """
+    Lê as chaves configuradas, na ordem de prioridade:
+
+    1. ALPHAVANTAGE_API_KEYS (várias chaves separadas por vírgula)
+    2. ALPHAVANTAGE_API_KEY
+    3. `api_key` recebida pelo construtor do ETL
+    4. "demo"
+    """
+    chaves = [c.strip() for c in os.getenv('ALPHAVANTAGE_API_KEYS', '').split(',') if c.strip()]
+    if not chaves and os.getenv('ALPHAVANTAGE_API_KEY'):
+        chaves = [os.getenv('ALPHAVANTAGE_API_KEY').strip()]
+    if not chaves and api_key:
+        chaves = [api_key]
+    return chaves or ['demo']
+
+
+@contextmanager
+def trava_arquivo(caminho: str):
+    """Lock exclusivo entre processos (fcntl no POSIX, msvcrt no Windows)"""
+    with open(caminho, 'a+b') as arquivo:
+        if os.name == 'nt':
+            import msvcrt
+            arquivo.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK desiste após ~10s: continua esperando
+                    continue
+            try:
+                yield
+            finally:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+
+
+def _impressao_digital(chave: str) -> str:
+    """Identificador da chave no ledger (a chave em si nunca vai para o disco)"""
+    return hashlib.sha256(chave.encode('utf-8')).hexdigest()[:12]
+
+
+class PoolChavesAlphaVantage:
+    """
+    Distribui requisições entre várias chaves da Alpha Vantage.
+
+    Cada chave tem limite por minuto e por dia (plano gratuito: 5/min, 25/dia).
+    O uso é registrado em um ledger JSON persistido, então a contagem diária
+    sobrevive entre execuções. Chaves esgotadas ficam de fora até o reset
+    (janela de 60s ou virada do dia UTC). A vazão cresce com o número de chaves.
+
+    Cada operação relê o ledger sob lock de arquivo antes de gravar: processos
+    que dividem as chaves (ETL particionado) somam o uso em vez de sobrescrever
+    o dos outros.
+    """
+
+    def __init__(self, chaves: List[str], limite_minuto: int = 5, limite_dia: int = 25,
+                 caminho_ledger: str = "data/alpha_vantage_ledger.json"):
+        if not chaves:
+            raise ValueError("Nenhuma chave da Alpha Vantage configurada")
+        self.chaves = list(dict.fromkeys(chaves))  # remove duplicadas, mantém ordem
+        self.limite_minuto = limite_minuto
+        self.limite_dia = limite_dia
+        self.caminho_ledger = caminho_ledger
+        self._lock = threading.Lock()
+        self._ledger = self._carregar_ledger()
+
+    def __len__(self) -> int:
+        return len(self.chaves)
+
+    # === LEDGER ===
+    def _carregar_ledger(self) -> Dict:
+        try:
+            with open(self.caminho_ledger, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _salvar_ledger(self):
+        """Escrita atômica (arquivo temporário do processo + replace)"""
+        temporario = f"{self.caminho_ledger}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self._ledger, f)
+        os.replace(temporario, self.caminho_ledger)
+
+    @contextmanager
+    def _transacao(self, gravar: bool = True):
+        """Ledger recarregado do disco sob lock (thread + processo); grava ao sair se `gravar`"""
+        os.makedirs(os.path.dirname(self.caminho_ledger) or '.', exist_ok=True)
+        with self._lock, trava_arquivo(f"{self.caminho_ledger}.lock"):
+            self._ledger = self._carregar_ledger()
+            yield
+            if gravar:
+                self._salvar_ledger()
+
+    @staticmethod
+    def _hoje() -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    def _registro(self, chave: str, agora: float) -> Dict:
+        """Registro da chave no ledger, com janelas expiradas já limpas"""
+        registro = self._ledger.setdefault(_impressao_digital(chave), {
+            'dia': self._hoje(), 'uso_dia': 0, 'minuto': [], 'esgotada_ate': 0.0
+        })
+        if registro['dia'] != self._hoje():
+            registro.update({'dia': self._hoje(), 'uso_dia': 0, 'esgotada_ate': 0.0})
+        registro['minuto'] = [t for t in registro['minuto'] if agora - t < 60]
+        return registro
+
+    def _espera_para(self, chave: str, agora: float) -> Optional[float]:
+        """Segundos até a chave ter cota (0 = já), None se esgotada no dia"""
+        registro = self._registro(chave, agora)
+        if registro['uso_dia'] >= self.limite_dia:
+            return None
+        espera = max(0.0, registro['esgotada_ate'] - agora)
+        if len(registro['minuto']) >= self.limite_minuto:
+            espera = max(espera, registro['minuto'][0] + 60 - agora)
+        return espera
+
+    # === API PÚBLICA ===
+    def adquirir(self, orcamento: Optional[OrcamentoExecucao] = None) -> Optional[str]:
+        """
+        Reserva uma requisição em alguma chave com cota
+
+        Prefere a chave com menos uso no dia. Se todas estão no limite do
+        minuto, espera a primeira liberar (dentro do orçamento).
+
+        Returns:
+            A chave, ou None se todas esgotaram a cota diária / o orçamento acabou
+        """
+        while True:
+            with self._transacao(gravar=False):
+                agora = time.time()
+                esperas = {chave: self._espera_para(chave, agora) for chave in self.chaves}
+                livres = [c for c, espera in esperas.items() if espera == 0]
+                if livres:
+                    chave = min(livres, key=lambda c: self._registro(c, agora)['uso_dia'])
+                    registro = self._registro(chave, agora)
+                    registro['uso_dia'] += 1
+                    registro['minuto'].append(agora)
+                    self._salvar_ledger()
+                    return chave
+
+                pendentes = [espera for espera in esperas.values() if espera is not None]
+                if not pendentes:
+                    return None
+                espera = min(pendentes)
+
+            if orcamento is not None and not orcamento.pode_aguardar(espera):
+                return None
+            time.sleep(espera)
+
+    def marcar_esgotada(self, chave: str, mensagem: str = ""):
+        """
+        Marca a chave como sem cota após uma resposta "Note"/"Information"
+        da API. Mensagens sobre limite diário esgotam a chave até o próximo dia;
+        as demais a suspendem por um minuto.
+        """
+        with self._transacao():
+            agora = time.time()
+            registro = self._registro(chave, agora)
+            if 'per day' in mensagem.lower() or 'daily' in mensagem.lower():
+                registro['uso_dia'] = max(registro['uso_dia'], self.limite_dia)
+            else:
+                registro['esgotada_ate'] = agora + 60
+
+    def cota_restante(self) -> int:
+        """Requisições ainda disponíveis hoje somando todas as chaves"""
+        with self._transacao(gravar=False):
+            agora = time.time()
+            return sum(max(0, self.limite_dia - self._registro(chave, agora)['uso_dia'])
+                       for chave in self.chaves)
+
+    def resumo(self) -> List[Dict]:
+        """Uso atual de cada chave (identificada pela impressão digital)"""
+        with self._transacao(gravar=False):
+            agora = time.time()
+            return [{
+                'chave': _impressao_digital(chave),
+                'uso_dia': self._registro(chave, agora)['uso_dia'],
+                'uso_minuto': len(self._registro(chave, agora)['minuto']),
+                'disponivel': self._espera_para(chave, agora) == 0,
+            } for chave in self.chaves]
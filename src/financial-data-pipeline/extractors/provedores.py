@@ -0,0 +1,21 @@
+# provedores.py - Endereços dos provedores de cotações (configuráveis por ambiente)
+import os
+
+ALPHA_VANTAGE_URL_PADRAO = "https://www.alphavantage.co/query"
+YAHOO_URL_PADRAO = "https://query1.finance.yahoo.com"
+
+
+def url_alpha_vantage() -> str:
+    """
+    Endpoint da Alpha Vantage. ALPHAVANTAGE_BASE_URL aponta os extratores
+    para outro servidor (ex: http://127.0.0.1:8765/query do mock_provedores)
+    """
+    return os.getenv('ALPHAVANTAGE_BASE_URL') or ALPHA_VANTAGE_URL_PADRAO
+
+
+def url_yahoo(caminho: str) -> str:
+    """
+    URL do Yahoo Finance para `caminho` (ex: /v8/finance/chart/AAPL).
+    YAHOO_BASE_URL troca o host (ex: http://127.0.0.1:8765)
+    """
+    return (os.getenv('YAHOO_BASE_URL') or YAHOO_URL_PADRAO).rstrip('/') + caminho
@@ -0,0 +1,335 @@
+# resiliencia.py - Circuit breaker, roteamento de provedores e retries com prazo
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por provedor (FECHADO -> ABERTO -> MEIO_ABERTO)
+
+    - FECHADO: requisições liberadas, falhas consecutivas são contadas
+    - ABERTO: provedor considerado fora do ar, requisições são puladas
+    - MEIO_ABERTO: após `tempo_abertura`, libera poucas sondas; sucesso fecha,
+      falha reabre o circuito
+
+    Cada vaga de sonda reservada por permite_requisicao() é devolvida por
+    registrar_sucesso, registrar_falha ou liberar (quem desistiu sem
+    resultado). Vagas presas há mais de `timeout_sonda` expiram sozinhas.
+    """
+
+    FECHADO = "FECHADO"
+    ABERTO = "ABERTO"
+    MEIO_ABERTO = "MEIO_ABERTO"
+
+    def __init__(self, nome: str, limite_falhas: int = 3, tempo_abertura: float = 60.0,
+                 max_sondas: int = 1, timeout_sonda: float = 60.0,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_abertura = tempo_abertura
+        self.max_sondas = max_sondas
+        self.timeout_sonda = timeout_sonda
+        self._relogio = relogio
+
+        self._estado = self.FECHADO
+        self._falhas_consecutivas = 0
+        self._aberto_em = 0.0
+        self._sondas: deque = deque()  # instantes em que cada vaga foi reservada
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            return self._atualizar_estado()
+
+    def _atualizar_estado(self) -> str:
+        """Transição ABERTO -> MEIO_ABERTO quando o tempo de abertura expira"""
+        agora = self._relogio()
+        if self._estado == self.ABERTO and agora - self._aberto_em >= self.tempo_abertura:
+            self._estado = self.MEIO_ABERTO
+            self._sondas.clear()
+        # Sonda que nunca registrou resultado não bloqueia o provedor para sempre
+        while self._sondas and agora - self._sondas[0] >= self.timeout_sonda:
+            self._sondas.popleft()
+        return self._estado
+
+    @property
+    def sondas_em_andamento(self) -> int:
+        with self._lock:
+            self._atualizar_estado()
+            return len(self._sondas)
+
+    def permite_requisicao(self) -> bool:
+        """Indica se uma requisição pode ser feita agora (reserva vaga de sonda)"""
+        with self._lock:
+            estado = self._atualizar_estado()
+            if estado == self.FECHADO:
+                return True
+            if estado == self.MEIO_ABERTO and len(self._sondas) < self.max_sondas:
+                self._sondas.append(self._relogio())
+                return True
+            return False
+
+    def liberar(self):
+        """Devolve a vaga de sonda sem resultado (ex: cota esgotada, sem chave, orçamento)"""
+        with self._lock:
+            if self._sondas:
+                self._sondas.popleft()
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._estado = self.FECHADO
+            self._falhas_consecutivas = 0
+            self._sondas.clear()
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas_consecutivas += 1
+            if (self._estado == self.MEIO_ABERTO
+                    or self._falhas_consecutivas >= self.limite_falhas):
+                self._estado = self.ABERTO
+                self._aberto_em = self._relogio()
+                self._sondas.clear()
+
+
+class RoteadorProvedores:
+    """
+    Ordena provedores pela taxa de sucesso e latência recentes,
+    pulando imediatamente os que estão com circuito aberto.
+    """
+
+    def __init__(self, janela: int = 20):
+        self.janela = janela
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._historico: Dict[str, deque] = {}
+        self._sondas: Dict[str, Optional[Callable[[], bool]]] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome: str, sonda_saude: Optional[Callable[[], bool]] = None,
+                  **config_breaker):
+        """
+        Registra um provedor (idempotente)
+
+        Args:
+            nome: Identificador do provedor (ex: 'yahoo', 'alpha_vantage')
+            sonda_saude: Função barata que retorna True se o provedor responde
+            **config_breaker: limite_falhas, tempo_abertura, max_sondas, timeout_sonda
+        """
+        with self._lock:
+            if nome in self._breakers:
+                return
+            self._breakers[nome] = CircuitBreaker(nome, **config_breaker)
+            self._historico[nome] = deque(maxlen=self.janela)
+            self._sondas[nome] = sonda_saude
+
+    def breaker(self, nome: str) -> CircuitBreaker:
+        return self._breakers[nome]
+
+    def disponivel(self, nome: str) -> bool:
+        """True se o circuito do provedor libera uma requisição agora"""
+        if nome not in self._breakers:
+            return True
+        return self._breakers[nome].permite_requisicao()
+
+    def liberar(self, nome: str):
+        """Desistiu da requisição liberada por disponivel() sem sucesso nem falha"""
+        if nome in self._breakers:
+            self._breakers[nome].liberar()
+
+    def registrar_sucesso(self, nome: str, latencia: float):
+        if nome not in self._breakers:
+            return
+        self._historico[nome].append((True, latencia))
+        self._breakers[nome].registrar_sucesso()
+
+    def registrar_falha(self, nome: str, latencia: float):
+        if nome not in self._breakers:
+            return
+        self._historico[nome].append((False, latencia))
+        self._breakers[nome].registrar_falha()
+
+    def verificar_saude(self):
+        """Executa sondas de saúde dos provedores em MEIO_ABERTO"""
+        for nome, sonda in list(self._sondas.items()):
+            breaker = self._breakers[nome]
+            if sonda is None or breaker.estado != CircuitBreaker.MEIO_ABERTO:
+                continue
+            if not breaker.permite_requisicao():
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                ok = bool(sonda())
+            except Exception:
+                ok = False
+            latencia = time.perf_counter() - inicio
+
+            if ok:
+                self.registrar_sucesso(nome, latencia)
+            else:
+                self.registrar_falha(nome, latencia)
+
+    def estatisticas(self, nome: str) -> Dict:
+        """Taxa de sucesso e latência média na janela recente"""
+        historico = list(self._historico.get(nome, ()))
+        if not historico:
+            return {'taxa_sucesso': 1.0, 'latencia_media': 0.0, 'amostras': 0}
+        sucessos = sum(1 for ok, _ in historico if ok)
+        return {
+            'taxa_sucesso': sucessos / len(historico),
+            'latencia_media': sum(lat for _, lat in historico) / len(historico),
+            'amostras': len(historico),
+        }
+
+    def ordenar(self, nomes: List[str]) -> List[str]:
+        """
+        Retorna os provedores que não estão com circuito aberto, do melhor
+        para o pior (maior taxa de sucesso, depois menor latência).
+        Empates preservam a ordem de preferência recebida.
+        """
+        self.verificar_saude()
+
+        candidatos = [n for n in nomes
+                      if n not in self._breakers
+                      or self._breakers[n].estado != CircuitBreaker.ABERTO]
+
+        def chave(item):
+            posicao, nome = item
+            stats = self.estatisticas(nome)
+            return (-round(stats['taxa_sucesso'], 2), round(stats['latencia_media'], 1), posicao)
+
+        return [nome for _, nome in sorted(enumerate(candidatos), key=chave)]
+
+
+class OrcamentoEsgotado(Exception):
+    """O prazo total da execução acabou antes da operação concluir"""
+
+
+class OrcamentoExecucao:
+    """
+    Prazo total (deadline) de uma execução.
+
+    Toda espera ou timeout de rede é limitado ao tempo restante, então uma
+    execução com orçamento termina em tempo previsível.
+    """
+
+    def __init__(self, segundos: Optional[float] = None,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.segundos = segundos
+        self._relogio = relogio
+        self._inicio = relogio()
+
+    def restante(self) -> float:
+        if self.segundos is None:
+            return float('inf')
+        return max(0.0, self.segundos - (self._relogio() - self._inicio))
+
+    def esgotado(self) -> bool:
+        return self.restante() <= 0
+
+    def pode_aguardar(self, segundos: float) -> bool:
+        """True se ainda sobra orçamento depois de aguardar `segundos`"""
+        return segundos < self.restante()
+
+    def timeout(self, padrao: float) -> float:
+        """Timeout de requisição limitado ao orçamento restante"""
+        return max(0.1, min(padrao, self.restante()))
+
+
+class PoliticaRetry:
+    """
+    Backoff exponencial com teto e "full jitter":
+    atraso = uniform(0, min(teto, base * 2**tentativa)).
+    Um cabeçalho Retry-After do servidor tem precedência sobre o jitter,
+    limitado ao mesmo teto (um valor absurdo não segura a execução).
+    """
+
+    def __init__(self, max_tentativas: int = 3, base: float = 1.0, teto: float = 30.0,
+                 aleatorio: Callable[[float, float], float] = random.uniform):
+        self.max_tentativas = max_tentativas
+        self.base = base
+        self.teto = teto
+        self._aleatorio = aleatorio
+
+    def atraso(self, tentativa: int, retry_after: Optional[float] = None) -> float:
+        """Atraso antes da tentativa `tentativa` (0 = primeira retentativa)"""
+        if retry_after is not None:
+            return min(self.teto, max(0.0, retry_after))
+        return self._aleatorio(0, min(self.teto, self.base * (2 ** tentativa)))
+
+    def aguardar(self, tentativa: int, orcamento: Optional[OrcamentoExecucao] = None,
+                 retry_after: Optional[float] = None) -> bool:
+        """
+        Dorme o atraso da tentativa. Retorna False (sem dormir) se o atraso
+        estourar o orçamento - o chamador deve desistir e usar fallback.
+        """
+        atraso = self.atraso(tentativa, retry_after)
+        if orcamento is not None and not orcamento.pode_aguardar(atraso):
+            return False
+        time.sleep(atraso)
+        return True
+
+
+class LimitadorTaxa:
+    """
+    Garante intervalo mínimo entre requisições a um provedor.
+    Só espera o que falta desde a última chamada (nada após a última).
+    """
+
+    def __init__(self, intervalo_minimo: float,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.intervalo_minimo = intervalo_minimo
+        self._relogio = relogio
+        self._ultima: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def aguardar(self, orcamento: Optional[OrcamentoExecucao] = None) -> bool:
+        """Espera a vez da próxima requisição; False se estourar o orçamento"""
+        with self._lock:
+            agora = self._relogio()
+            espera = 0.0
+            if self._ultima is not None:
+                espera = max(0.0, self._ultima + self.intervalo_minimo - agora)
+            if orcamento is not None and espera > 0 and not orcamento.pode_aguardar(espera):
+                return False
+            # Reserva o horário antes de dormir para serializar chamadores
+            self._ultima = agora + espera
+        if espera > 0:
+            time.sleep(espera)
+        return True
+
+
+def interpretar_retry_after(valor: Optional[str]) -> Optional[float]:
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos"""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        data = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return max(0.0, (data - datetime.now(timezone.utc)).total_seconds())
+
+
+# Roteadores compartilhados por processo: a API cria um ETL por requisição,
+# então o estado dos circuitos precisa sobreviver entre instâncias.
+_ROTEADORES: Dict[str, RoteadorProvedores] = {}
+_ROTEADORES_LOCK = threading.Lock()
+
+
+def obter_roteador(nome: str = "padrao") -> RoteadorProvedores:
+    """Retorna (criando se necessário) o roteador compartilhado `nome`"""
+    with _ROTEADORES_LOCK:
+        if nome not in _ROTEADORES:
+            _ROTEADORES[nome] = RoteadorProvedores()
+        return _ROTEADORES[nome]
@@ -0,0 +1,151 @@
+# resumo_ativos.py - Resumo por ativo em uma passada (NumPy) + tabela de cache
+import sqlite3
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Colunas do resumo (mesmas do relatório executivo)
+COLUNAS_RESUMO = [
+    'symbol', 'records_count', 'start_date', 'end_date',
+    'avg_price', 'min_price', 'max_price', 'price_volatility',
+    'avg_volume', 'avg_rsi', 'current_price', 'initial_price',
+]
+
+
+def _filtro_simbolos(simbolos: Optional[List[str]]):
+    if not simbolos:
+        return "", []
+    return f" WHERE symbol IN ({', '.join('?' * len(simbolos))})", list(simbolos)
+
+
+def resumir_por_simbolo(simbolos: np.ndarray, datas: np.ndarray,
+                        precos: np.ndarray, volumes: np.ndarray) -> pd.DataFrame:
+    """
+    Estatísticas por ativo com operações segmentadas (reduceat)
+
+    Os arrays devem vir ordenados por (símbolo, data): cada ativo é um
+    segmento contíguo, então contagem, soma, mínimo, máximo, primeiro e
+    último preço saem de uma varredura linear, sem subquery por ativo.
+    O desvio padrão é amostral (ddof=1), calculado em duas passadas sobre
+    os desvios em relação à média para não perder precisão.
+    """
+    if len(simbolos) == 0:
+        return pd.DataFrame(columns=[c for c in COLUNAS_RESUMO if c != 'avg_rsi'])
+
+    inicios = np.concatenate(([0], np.flatnonzero(simbolos[1:] != simbolos[:-1]) + 1))
+    fins = np.concatenate((inicios[1:], [len(simbolos)])) - 1
+    contagens = fins - inicios + 1
+
+    medias = np.add.reduceat(precos, inicios) / contagens
+    desvios = precos - np.repeat(medias, contagens)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variancias = np.add.reduceat(desvios * desvios, inicios) / (contagens - 1)
+    volatilidade = np.where(contagens > 1, np.sqrt(variancias), np.nan)
+
+    # AVG ignora volumes nulos, como no SQL
+    volume_valido = ~np.isnan(volumes)
+    soma_volume = np.add.reduceat(np.where(volume_valido, volumes, 0.0), inicios)
+    qtd_volume = np.add.reduceat(volume_valido.astype(np.int64), inicios)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media_volume = np.where(qtd_volume > 0, soma_volume / qtd_volume, np.nan)
+
+    return pd.DataFrame({
+        'symbol': simbolos[inicios],
+        'records_count': contagens,
+        'start_date': datas[inicios],
+        'end_date': datas[fins],
+        'avg_price': medias,
+        'min_price': np.minimum.reduceat(precos, inicios),
+        'max_price': np.maximum.reduceat(precos, inicios),
+        'price_volatility': volatilidade,
+        'avg_volume': media_volume,
+        'current_price': precos[fins],
+        'initial_price': precos[inicios],
+    })
+
+
+def calcular_resumo(conn: sqlite3.Connection,
+                    simbolos: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Resumo de price_history (+ RSI médio de technical_indicators) numa
+    leitura colunar ordenada pelo índice (symbol, date)
+    """
+    filtro, params = _filtro_simbolos(simbolos)
+    precos = pd.read_sql_query(
+        f"SELECT symbol, date, close_price, volume FROM price_history{filtro} "
+        f"ORDER BY symbol, date", conn, params=params)
+
+    resumo = resumir_por_simbolo(precos['symbol'].to_numpy(),
+                                 precos['date'].astype(str).to_numpy(),
+                                 precos['close_price'].to_numpy(dtype=float),
+                                 precos['volume'].to_numpy(dtype=float))
+
+    rsi = pd.read_sql_query(
+        f"SELECT symbol, AVG(rsi) AS avg_rsi FROM technical_indicators{filtro} "
+        f"GROUP BY symbol", conn, params=params)
+    resumo = resumo.merge(rsi, on='symbol', how='left')
+    return resumo[COLUNAS_RESUMO]
+
+
+def criar_tabela_resumo(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS symbol_summary (
+            symbol VARCHAR(10) PRIMARY KEY,
+            records_count INTEGER,
+            start_date DATE,
+            end_date DATE,
+            avg_price REAL,
+            min_price REAL,
+            max_price REAL,
+            price_volatility REAL,
+            avg_volume REAL,
+            avg_rsi REAL,
+            current_price REAL,
+            initial_price REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def atualizar_resumo(conn: sqlite3.Connection, simbolos: Optional[List[str]] = None,
+                     commit: bool = True) -> int:
+    """
+    Recalcula o resumo dos ativos informados (padrão: todos) e grava em
+    symbol_summary. Chamado na carga de cada ativo, lê só as linhas dele.
+    """
+    criar_tabela_resumo(conn)
+    resumo = calcular_resumo(conn, simbolos)
+    if simbolos:
+        # Ativos sem histórico saem do cache
+        conn.executemany("DELETE FROM symbol_summary WHERE symbol = ?",
+                         [(s,) for s in set(simbolos) - set(resumo['symbol'])])
+    else:
+        conn.execute("DELETE FROM symbol_summary")
+
+    dados = resumo.astype(object).where(resumo.notna(), None)
+    conn.executemany(f'''
+        INSERT OR REPLACE INTO symbol_summary ({', '.join(COLUNAS_RESUMO)}, updated_at)
+        VALUES ({', '.join('?' * len(COLUNAS_RESUMO))}, CURRENT_TIMESTAMP)
+    ''', dados.itertuples(index=False, name=None))
+    if commit:
+        conn.commit()
+    return len(resumo)
+
+
+def carregar_resumo(conn: sqlite3.Connection) -> pd.DataFrame:
+    """
+    Resumo de todos os ativos a partir do cache. Ativos com histórico mas
+    ainda fora do cache (ex: banco anterior à tabela) são calculados e
+    gravados antes da leitura.
+    """
+    criar_tabela_resumo(conn)
+    faltando = [s for (s,) in conn.execute('''
+        SELECT DISTINCT symbol FROM price_history
+        WHERE symbol NOT IN (SELECT symbol FROM symbol_summary)
+    ''')]
+    if faltando:
+        atualizar_resumo(conn, faltando)
+
+    return pd.read_sql_query(
+        f"SELECT {', '.join(COLUNAS_RESUMO)} FROM symbol_summary ORDER BY symbol", conn)
@@ -0,0 +1,222 @@
+# telemetria.py - Tempos por etapa e contadores do ETL no formato texto do Prometheus
+import atexit
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Limites (segundos) dos buckets: de uma leitura no SQLite a uma requisição lenta
+BUCKETS_ETAPA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_EXECUCAO = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metrica:
+    """Série temporal por combinação de rótulos (thread-safe)"""
+    tipo = ''
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._trava = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _chave(self, rotulos: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(rotulos.get(nome, '')) for nome in self.rotulos)
+
+    def _rotulos(self, chave: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pares = list(zip(self.rotulos, chave)) + list(extra)
+        if not pares:
+            return ''
+        return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+    def limpar(self):
+        with self._trava:
+            self._series.clear()
+
+
+class Contador(_Metrica):
+    """Contador monotônico (ex: retentativas, respostas 429)"""
+    tipo = 'counter'
+
+    def inc(self, valor: float = 1.0, **rotulos):
+        chave = self._chave(rotulos)
+        with self._trava:
+            self._series[chave] = self._series.get(chave, 0.0) + valor
+
+    def valor(self, **rotulos) -> float:
+        return self._series.get(self._chave(rotulos), 0.0)
+
+    def linhas(self) -> List[str]:
+        with self._trava:
+            series = sorted(self._series.items())
+        return [f"{self.nome}{self._rotulos(chave)} {_numero(valor)}" for chave, valor in series]
+
+
+class Histograma(_Metrica):
+    """Histograma de durações com buckets fixos (contagem, soma e buckets acumulados)"""
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_ETAPA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._trava:
+            serie = self._series.get(chave)
+            if serie is None:
+                # [contagem por bucket (não acumulada), total, soma]
+                serie = self._series[chave] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            serie[0][indice] += 1
+            serie[1] += 1
+            serie[2] += valor
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        """Mede o bloco (ou a função, usado como decorator), inclusive se levantar exceção"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def resumo(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(observações, soma em segundos) por combinação de rótulos"""
+        with self._trava:
+            return {chave: (serie[1], serie[2]) for chave, serie in self._series.items()}
+
+    def linhas(self) -> List[str]:
+        with self._trava:
+            series = sorted((chave, [list(serie[0]), serie[1], serie[2]])
+                            for chave, serie in self._series.items())
+        linhas = []
+        for chave, (contagens, total, soma) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                rotulos = self._rotulos(chave, [('le', _numero(limite))])
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            linhas.append(f"{self.nome}_bucket{self._rotulos(chave, [('le', '+Inf')])} {total}")
+            linhas.append(f"{self.nome}_sum{self._rotulos(chave)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{self._rotulos(chave)} {total}")
+        return linhas
+
+
+class Registro:
+    """Conjunto de métricas do processo, exportável para o Prometheus"""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._trava = threading.Lock()
+
+    def _obter(self, classe, nome: str, *args, **kwargs):
+        with self._trava:
+            if nome not in self._metricas:
+                self._metricas[nome] = classe(nome, *args, **kwargs)
+            return self._metricas[nome]
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._obter(Contador, nome, ajuda, rotulos)
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                   buckets: Sequence[float] = BUCKETS_ETAPA) -> Histograma:
+        return self._obter(Histograma, nome, ajuda, rotulos, buckets)
+
+    def exportar(self) -> str:
+        """Formato texto de exposição do Prometheus (version 0.0.4)"""
+        linhas = []
+        for metrica in list(self._metricas.values()):
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.linhas())
+        return '\n'.join(linhas) + '\n'
+
+    def limpar(self):
+        for metrica in list(self._metricas.values()):
+            metrica.limpar()
+
+    def resumo_texto(self) -> str:
+        """Tabela legível para execuções pela linha de comando"""
+        linhas = ["⏱️  MÉTRICAS DA EXECUÇÃO"]
+        for metrica in list(self._metricas.values()):
+            if isinstance(metrica, Histograma):
+                for chave, (total, soma) in sorted(metrica.resumo().items()):
+                    rotulos = ' '.join(v for v in chave if v)
+                    linhas.append(f"   {metrica.nome} {rotulos:<28} {total:>6}x  "
+                                  f"total {soma:8.3f}s  média {soma / total * 1000:9.1f}ms")
+            else:
+                for linha in metrica.linhas():
+                    linhas.append(f"   {linha}")
+        return '\n'.join(linhas)
+
+
+REGISTRO = Registro()
+
+# === MÉTRICAS DO PIPELINE ===
+ETAPAS = REGISTRO.histograma(
+    'etl_etapa_segundos',
+    "Duração de cada etapa (extract, parse, transform, load, report) por provedor",
+    ('etapa', 'provedor'))
+EXECUCOES = REGISTRO.histograma(
+    'etl_execucao_segundos', "Duração total de uma execução do pipeline", ('pipeline',),
+    buckets=BUCKETS_EXECUCAO)
+RETENTATIVAS = REGISTRO.contador(
+    'etl_retentativas_total', "Requisições repetidas após falha, 429 ou cota esgotada",
+    ('provedor',))
+RESPOSTAS_429 = REGISTRO.contador(
+    'etl_http_429_total', "Respostas HTTP 429 (rate limit) recebidas", ('provedor',))
+FALLBACKS = REGISTRO.contador(
+    'etl_fallback_total',
+    "Cotações servidas sem o provedor (banco = última real, simulado = gerada)",
+    ('tipo',))
+CACHE = REGISTRO.contador(
+    'etl_cache_total', "Consultas a caches (resultado = hit ou miss)", ('cache', 'resultado'))
+
+
+def etapa(nome: str, provedor: str = ''):
+    """Cronometra uma etapa: `with etapa('extract', 'yahoo'):` ou `@etapa('load')`"""
+    return ETAPAS.cronometrar(etapa=nome, provedor=provedor)
+
+
+def execucao(pipeline: str):
+    """Cronometra uma execução completa (decorator ou with)"""
+    return EXECUCOES.cronometrar(pipeline=pipeline)
+
+
+def registrar_cache(cache: str, acerto: bool, quantidade: int = 1):
+    if quantidade:
+        CACHE.inc(quantidade, cache=cache, resultado='hit' if acerto else 'miss')
+
+
+def salvar(caminho: str):
+    """Grava a exposição num arquivo (atômico: serve ao textfile collector do node_exporter)"""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(REGISTRO.exportar())
+    os.replace(temporario, caminho)
+
+
+def _salvar_ao_sair():
+    # Execuções pela CLI: ETL_METRICS_FILE=etl.prom grava o arquivo; '-' imprime o resumo no stderr
+    destino = os.getenv('ETL_METRICS_FILE')
+    if destino == '-':
+        print(REGISTRO.resumo_texto(), file=sys.stderr)
+    elif destino:
+        salvar(destino)
+
+
+atexit.register(_salvar_ao_sair)
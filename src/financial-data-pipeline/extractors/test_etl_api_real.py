@@ -7,7 +7,15 @@ from datetime import datetime, timedelta
 import json
 import os
 from typing import List, Dict, Optional
-import time
+
+from pipeline_estagios import Estagio, PipelineEstagios
+from planejador_refresh import PlanejadorRefresh, carregar_ultimas_atualizacoes
+from pool_chaves import PoolChavesAlphaVantage, carregar_chaves
+from provedores import url_alpha_vantage
+from resiliencia import (LimitadorTaxa, OrcamentoEsgotado, OrcamentoExecucao,
+                         PoliticaRetry, interpretar_retry_after)
+from perfil import perfilavel
+from telemetria import RESPOSTAS_429, RETENTATIVAS, etapa, execucao
 
 class ETLFinanceiroReal:
     """
@@ -25,8 +33,11 @@ class ETLFinanceiroReal:
         print("🚀 ETL Financeiro Real iniciado!")
         
         # Configuração da API Alpha Vantage (gratuita)
-        self.api_key = "IJ3XCT1IXT7W5AL0"  # Use "demo" para teste
-        self.base_url = "https://www.alphavantage.co/query"
+        # Várias chaves: ALPHAVANTAGE_API_KEYS="chave1,chave2,..."
+        self.pool_chaves = PoolChavesAlphaVantage(
+            carregar_chaves(api_key or "IJ3XCT1IXT7W5AL0"))  # Use "demo" para teste
+        self.api_key = self.pool_chaves.chaves[0]
+        self.base_url = url_alpha_vantage()
         
         # Configuração do banco
         self.db_name = "data/portfolio_real.db"
@@ -34,7 +45,11 @@ class ETLFinanceiroReal:
         self._setup_database()
         
         # Controle de rate limiting (API gratuita tem limites)
-        self.request_delay = 12  # 12 segundos entre requests (5 por minuto)
+        # 12 segundos entre requests (5 por minuto) por chave; a cota de cada
+        # chave é controlada pelo pool, então o intervalo global cai com N chaves
+        self.request_delay = 12 / len(self.pool_chaves)
+        self.limitador = LimitadorTaxa(self.request_delay)
+        self.politica_retry = PoliticaRetry(max_tentativas=3, base=2.0, teto=60.0)
     
     def _criar_estrutura(self):
         """Cria estrutura de pastas"""
@@ -115,12 +130,78 @@ class ETLFinanceiroReal:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{timestamp}] {process_type} - {symbol or 'GERAL'}: {status} - {message}")
     
-    def extrair_cotacao_atual(self, symbol: str) -> Dict:
+    def _requisitar_api(self, params: Dict,
+                        orcamento: Optional[OrcamentoExecucao] = None) -> Dict:
+        """
+        Requisição à Alpha Vantage com rate limiting e retentativas
+        
+        - Cada tentativa usa uma chave do pool com cota disponível
+        - Espera apenas o que falta do intervalo mínimo desde a última chamada
+        - Retenta 429/5xx com backoff exponencial + jitter, respeitando Retry-After
+        - Limite de cota ("Note") suspende a chave e tenta outra imediatamente
+        - Nunca ultrapassa o orçamento: levanta OrcamentoEsgotado
+        """
+        orcamento = orcamento or OrcamentoExecucao()
+        retry_after = None
+        ultimo_erro = "sem resposta"
+        backoff = 0
+        
+        for tentativa in range(self.politica_retry.max_tentativas + len(self.pool_chaves) - 1):
+            if backoff >= self.politica_retry.max_tentativas:
+                break
+            if backoff > 0 and not self.politica_retry.aguardar(backoff - 1, orcamento,
+                                                                 retry_after):
+                raise OrcamentoEsgotado(f"Orçamento esgotado após: {ultimo_erro}")
+            
+            chave = self.pool_chaves.adquirir(orcamento)
+            if chave is None:
+                if orcamento.esgotado():
+                    raise OrcamentoEsgotado("Orçamento esgotado aguardando cota das chaves")
+                raise Exception("Cota diária esgotada em todas as chaves da Alpha Vantage")
+            if not self.limitador.aguardar(orcamento) or orcamento.esgotado():
+                raise OrcamentoEsgotado("Orçamento esgotado aguardando rate limit")
+            
+            backoff += 1
+            if tentativa > 0:
+                RETENTATIVAS.inc(provedor='alpha_vantage')
+            try:
+                with etapa('extract', 'alpha_vantage'):
+                    response = requests.get(self.base_url, params={**params, 'apikey': chave},
+                                            timeout=orcamento.timeout(30))
+            except requests.exceptions.RequestException as e:
+                ultimo_erro = str(e)
+                retry_after = None
+                continue
+            
+            retry_after = interpretar_retry_after(response.headers.get('Retry-After'))
+            if response.status_code == 429 or response.status_code >= 500:
+                if response.status_code == 429:
+                    RESPOSTAS_429.inc(provedor='alpha_vantage')
+                ultimo_erro = f"HTTP {response.status_code}"
+                continue
+            response.raise_for_status()
+            
+            with etapa('parse', 'alpha_vantage'):
+                data = response.json()
+            if 'Note' in data or 'Information' in data:
+                self.pool_chaves.marcar_esgotada(chave, data.get('Note') or data.get('Information'))
+                ultimo_erro = "Limite de requisições API atingido"
+                # Outra chave pode ter cota: troca sem backoff
+                if len(self.pool_chaves) > 1:
+                    backoff -= 1
+                continue
+            return data
+        
+        raise Exception(ultimo_erro)
+    
+    def extrair_cotacao_atual(self, symbol: str,
+                              orcamento: Optional[OrcamentoExecucao] = None) -> Dict:
         """
         Extrai cotação atual de uma ação usando Alpha Vantage API
         
         Args:
             symbol: Símbolo da ação (ex: 'AAPL', 'MSFT')
+            orcamento: Prazo total da execução (opcional)
             
         Returns:
             Dicionário com dados da cotação
@@ -129,20 +210,14 @@ class ETLFinanceiroReal:
             # Parâmetros da API
             params = {
                 'function': 'GLOBAL_QUOTE',
-                'symbol': symbol,
-                'apikey': self.api_key
+                'symbol': symbol
             }
             
             print(f"📡 Buscando cotação atual de {symbol}...")
-            response = requests.get(self.base_url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._requisitar_api(params, orcamento)
             
             # Verifica se há dados válidos
             if 'Global Quote' not in data:
-                if 'Note' in data:
-                    raise Exception("Limite de requisições API atingido")
                 raise Exception(f"Dados não encontrados para {symbol}")
             
             quote = data['Global Quote']
@@ -163,23 +238,25 @@ class ETLFinanceiroReal:
             self._log_processo("EXTRACT_QUOTE", symbol, "SUCCESS", 
                              f"Preço: ${cotacao['price']:.2f}")
             
-            # Rate limiting
-            time.sleep(self.request_delay)
-            
             return cotacao
             
+        except OrcamentoEsgotado as e:
+            self._log_processo("EXTRACT_QUOTE", symbol, "STALE", str(e))
+            return {}
         except Exception as e:
             error_msg = f"Erro ao extrair {symbol}: {str(e)}"
             self._log_processo("EXTRACT_QUOTE", symbol, "ERROR", error_msg)
             return {}
     
-    def extrair_dados_historicos(self, symbol: str, periodo: str = "compact") -> List[Dict]:
+    def extrair_dados_historicos(self, symbol: str, periodo: str = "compact",
+                                 orcamento: Optional[OrcamentoExecucao] = None) -> List[Dict]:
         """
         Extrai dados históricos diários
         
         Args:
             symbol: Símbolo da ação
             periodo: "compact" (100 dias) ou "full" (20 anos)
+            orcamento: Prazo total da execução (opcional)
             
         Returns:
             Lista com dados históricos
@@ -188,15 +265,11 @@ class ETLFinanceiroReal:
             params = {
                 'function': 'TIME_SERIES_DAILY',
                 'symbol': symbol,
-                'outputsize': periodo,
-                'apikey': self.api_key
+                'outputsize': periodo
             }
             
             print(f"📊 Buscando histórico de {symbol} ({periodo})...")
-            response = requests.get(self.base_url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._requisitar_api(params, orcamento)
             
             if 'Time Series (Daily)' not in data:
                 raise Exception("Dados históricos não encontrados")
@@ -218,14 +291,17 @@ class ETLFinanceiroReal:
             self._log_processo("EXTRACT_HISTORY", symbol, "SUCCESS", 
                              f"{len(historico)} registros históricos")
             
-            time.sleep(self.request_delay)
             return historico
             
+        except OrcamentoEsgotado as e:
+            self._log_processo("EXTRACT_HISTORY", symbol, "STALE", str(e))
+            return []
         except Exception as e:
             error_msg = f"Erro histórico {symbol}: {str(e)}"
             self._log_processo("EXTRACT_HISTORY", symbol, "ERROR", error_msg)
             return []
     
+    @etapa('load')
     def carregar_cotacao_db(self, cotacao: Dict):
         """Carrega cotação no banco SQLite"""
         if not cotacao:
@@ -256,6 +332,7 @@ class ETLFinanceiroReal:
         except Exception as e:
             self._log_processo("LOAD_QUOTE", cotacao.get('symbol'), "ERROR", str(e))
     
+    @etapa('load')
     def carregar_historico_db(self, historico: List[Dict]):
         """Carrega histórico no banco SQLite"""
         if not historico:
@@ -290,37 +367,89 @@ class ETLFinanceiroReal:
         except Exception as e:
             self._log_processo("LOAD_HISTORY", "ERROR", str(e))
     
-    def executar_etl_completo(self, symbols: List[str], incluir_historico: bool = True):
+    def planejar_refresh(self, symbols: List[str], incluir_historico: bool = True,
+                         planejador: Optional[PlanejadorRefresh] = None) -> Dict:
+        """
+        Agenda de atualização que cabe na cota diária restante das chaves,
+        priorizando os símbolos mais defasados na tabela de cotações
+        """
+        planejador = planejador or PlanejadorRefresh()
+        ultimas = carregar_ultimas_atualizacoes(self.db_name, 'cotacoes', 'symbol')
+        # Cotação + histórico consomem duas requisições por símbolo
+        plano = planejador.planejar(symbols, ultimas, cota=self.pool_chaves.cota_restante(),
+                                    custo_por_simbolo=2 if incluir_historico else 1)
+        print(f"🗓️  Refresh planejado: {len(plano['agenda'])} agora, "
+              f"{len(plano['adiados'])} adiados para o próximo ciclo")
+        return plano
+    
+    @perfilavel()
+    @execucao('etl_completo')
+    def executar_etl_completo(self, symbols: List[str], incluir_historico: bool = True,
+                              orcamento_segundos: Optional[float] = None,
+                              workers_extracao: int = 1, capacidade_fila: int = 8,
+                              planejador: Optional[PlanejadorRefresh] = None):
         """
         Executa pipeline ETL completo
         
+        Extração e carga rodam em estágios concorrentes com fila limitada:
+        enquanto um símbolo é gravado no SQLite, o próximo já está sendo buscado.
+        
         Args:
             symbols: Lista de símbolos para extrair
             incluir_historico: Se deve extrair dados históricos
+            orcamento_segundos: Prazo total da execução. Símbolos que não
+                couberem no prazo são registrados como STALE (mantêm o
+                último dado do banco) em vez de esperar.
+            workers_extracao: Threads de extração (compartilham o rate limit)
+            capacidade_fila: Capacidade da fila entre extração e carga
+            planejador: Se informado, processa só a agenda que cabe na cota
+                (ver planejar_refresh)
         """
+        if planejador is not None:
+            symbols = self.planejar_refresh(symbols, incluir_historico, planejador)['agenda']
+        
         print("🔄 Iniciando ETL completo...")
         start_time = datetime.now()
+        orcamento = OrcamentoExecucao(orcamento_segundos)
+        desatualizados = []
         
-        sucessos = 0
-        erros = 0
-        
-        for i, symbol in enumerate(symbols, 1):
-            print(f"\n[{i}/{len(symbols)}] Processando {symbol}...")
+        def extrair(symbol: str):
+            if orcamento.esgotado():
+                self._log_processo("EXTRACT_QUOTE", symbol, "STALE",
+                                   "Orçamento esgotado, mantendo último dado do banco")
+                desatualizados.append(symbol)
+                return None
+            
+            print(f"\nProcessando {symbol}...")
             
             # Extrair cotação atual
-            cotacao = self.extrair_cotacao_atual(symbol)
-            if cotacao:
-                self.carregar_cotacao_db(cotacao)
-                sucessos += 1
-            else:
-                erros += 1
-                continue
+            cotacao = self.extrair_cotacao_atual(symbol, orcamento)
+            if not cotacao:
+                if orcamento.esgotado():
+                    desatualizados.append(symbol)
+                return None
             
             # Extrair histórico se solicitado
+            historico = []
             if incluir_historico:
-                historico = self.extrair_dados_historicos(symbol, "compact")
-                if historico:
-                    self.carregar_historico_db(historico)
+                historico = self.extrair_dados_historicos(symbol, "compact", orcamento)
+            return cotacao, historico
+        
+        def carregar(extraido):
+            cotacao, historico = extraido
+            self.carregar_cotacao_db(cotacao)
+            if historico:
+                self.carregar_historico_db(historico)
+            return cotacao['symbol']
+        
+        pipeline = PipelineEstagios([
+            Estagio('extract', extrair, workers_extracao),
+            Estagio('load', carregar, 1),
+        ], capacidade_fila=capacidade_fila)
+        resultado = pipeline.executar(symbols)
+        
+        sucessos = len(resultado['resultados'])
+        erros = len(symbols) - sucessos - len(desatualizados)
         
         # Relatório final
         end_time = datetime.now()
@@ -330,10 +459,13 @@ class ETLFinanceiroReal:
         print(f"⏱️  Duração: {duracao}")
         print(f"✅ Sucessos: {sucessos}")
         print(f"❌ Erros: {erros}")
+        if desatualizados:
+            print(f"🕒 Desatualizados (orçamento esgotado): {len(desatualizados)}")
         
         self._log_processo("ETL_COMPLETE", None, "SUCCESS", 
                           f"Processados {len(symbols)} símbolos em {duracao}")
     
+    @etapa('report')
     def gerar_relatorio_portfolio(self) -> pd.DataFrame:
         """Gera relatório do portfolio usando dados do banco"""
         try:
@@ -0,0 +1,266 @@
+# var_montecarlo.py - VaR / CVaR por simulação de Monte Carlo (vetorizado, em blocos)
+import argparse
+import math
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from correlacoes import calcular_retornos, carregar_precos
+
+METODOS = ('historico', 'parametrico')
+CONFIANCAS_PADRAO = (0.95, 0.99)
+# Limite de floats por bloco (simulações x ativos) para a memória não crescer
+FLOATS_POR_BLOCO = 4_000_000
+
+# Modelo por processo do pool, preenchido pelo initializer
+_modelo_worker: Dict = {}
+
+
+def carregar_log_retornos(db_path: str, simbolos: List[str], dias: Optional[int] = None,
+                          ate: Optional[str] = None) -> np.ndarray:
+    """
+    Log-retornos diários alinhados (datas x ativos) de price_history
+
+    Só entram datas em que todos os ativos têm retorno, preservando a
+    correlação observada no mesmo dia.
+
+    Args:
+        dias: Usa só os últimos `dias` pregões completos (padrão: todo o histórico)
+        ate: Data final YYYY-MM-DD
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        precos = carregar_precos(conn, ate=ate, simbolos=simbolos)
+    finally:
+        conn.close()
+
+    faltando = [s for s in simbolos if precos.empty or s not in precos.columns]
+    if faltando:
+        raise ValueError(f"Sem histórico para: {faltando}")
+
+    retornos, _ = calcular_retornos(precos[simbolos].to_numpy(dtype=float))
+    retornos = retornos[~np.isnan(retornos).any(axis=1)]
+    if dias:
+        retornos = retornos[-dias:]
+    if len(retornos) < 2:
+        raise ValueError("Histórico insuficiente para simular (menos de 2 pregões completos)")
+    return np.log1p(retornos)
+
+
+def _fator_covariancia(covariancia: np.ndarray) -> np.ndarray:
+    """Cholesky; se a matriz não for positiva definida, usa a decomposição espectral"""
+    try:
+        return np.linalg.cholesky(covariancia)
+    except np.linalg.LinAlgError:
+        autovalores, autovetores = np.linalg.eigh(covariancia)
+        return autovetores * np.sqrt(np.clip(autovalores, 0.0, None))
+
+
+def preparar_modelo(log_retornos: np.ndarray, metodo: str) -> Dict:
+    """Parâmetros compartilhados por todos os blocos da simulação"""
+    if metodo == 'historico':
+        return {'metodo': metodo, 'log_retornos': log_retornos}
+    if metodo == 'parametrico':
+        return {
+            'metodo': metodo,
+            'media': log_retornos.mean(axis=0),
+            'fator': _fator_covariancia(np.atleast_2d(np.cov(log_retornos, rowvar=False))),
+        }
+    raise ValueError(f"Método desconhecido: {metodo} (use {', '.join(METODOS)})")
+
+
+def simular_bloco(modelo: Dict, posicoes: np.ndarray, horizonte: int, n: int,
+                  semente: np.random.SeedSequence, tamanho_cauda: int) -> Dict:
+    """
+    Simula `n` cenários e devolve só o necessário para agregar:
+    soma, soma dos quadrados e os `tamanho_cauda` piores P&Ls
+
+    - historico: bootstrap de dias inteiros (todos os ativos do mesmo dia
+      juntos), somando log-retornos ao longo do horizonte
+    - parametrico: normal multivariada dos log-retornos; a soma de
+      `horizonte` dias i.i.d. é N(h·μ, h·Σ), sorteada de uma vez
+    """
+    rng = np.random.default_rng(semente)
+
+    if modelo['metodo'] == 'historico':
+        historico = modelo['log_retornos']
+        acumulado = np.zeros((n, historico.shape[1]))
+        for _ in range(horizonte):  # memória: n x ativos, independente do horizonte
+            acumulado += historico[rng.integers(0, len(historico), size=n)]
+    else:
+        choques = rng.standard_normal((n, len(modelo['media'])))
+        acumulado = (horizonte * modelo['media']
+                     + math.sqrt(horizonte) * (choques @ modelo['fator'].T))
+
+    pnl = np.expm1(acumulado) @ posicoes
+    k = min(tamanho_cauda, n)
+    cauda = np.partition(pnl, k - 1)[:k] if k < n else pnl
+    return {'n': n, 'soma': float(pnl.sum()), 'soma_quad': float(pnl @ pnl), 'cauda': cauda}
+
+
+def _init_worker(modelo: Dict, posicoes: np.ndarray, horizonte: int, tamanho_cauda: int):
+    """Recebe o modelo uma vez por processo (não a cada bloco)"""
+    _modelo_worker.update({'modelo': modelo, 'posicoes': posicoes,
+                           'horizonte': horizonte, 'tamanho_cauda': tamanho_cauda})
+
+
+def _simular_bloco_worker(tarefa):
+    n, semente = tarefa
+    return simular_bloco(_modelo_worker['modelo'], _modelo_worker['posicoes'],
+                         _modelo_worker['horizonte'], n, semente,
+                         _modelo_worker['tamanho_cauda'])
+
+
+def calcular_var(log_retornos: np.ndarray, posicoes: Sequence[float],
+                 confiancas: Sequence[float] = CONFIANCAS_PADRAO, horizonte: int = 1,
+                 simulacoes: int = 100_000, metodo: str = 'historico',
+                 semente: Optional[int] = None, workers: int = 1,
+                 tamanho_bloco: Optional[int] = None) -> Dict:
+    """
+    VaR e CVaR (expected shortfall) do P&L da carteira no horizonte
+
+    As simulações rodam em blocos; cada bloco guarda só os piores cenários
+    necessários para a cauda, então a memória fica limitada mesmo com
+    milhões de caminhos. Cada bloco tem sua própria semente derivada de
+    `semente` (SeedSequence.spawn): o resultado é reprodutível e não
+    depende do número de workers.
+
+    Args:
+        log_retornos: Histórico alinhado (datas x ativos), ver carregar_log_retornos
+        posicoes: Valor financeiro em cada ativo
+        confiancas: Níveis de confiança (ex: 0.95, 0.99)
+        horizonte: Dias do horizonte
+        simulacoes: Número de cenários
+        metodo: 'historico' (bootstrap) ou 'parametrico' (normal multivariada)
+        semente: Semente para reprodutibilidade
+        workers: Processos do pool (1 = no processo atual)
+        tamanho_bloco: Cenários por bloco (padrão: limitado por FLOATS_POR_BLOCO)
+
+    Returns:
+        Dicionário com var/cvar por confiança (perdas como valores positivos),
+        média e desvio do P&L e metadados da simulação
+    """
+    inicio = time.perf_counter()
+    posicoes = np.asarray(posicoes, dtype=float)
+    if log_retornos.shape[1] != len(posicoes):
+        raise ValueError("Número de posições diferente do número de ativos")
+    if simulacoes < 1 or horizonte < 1:
+        raise ValueError("simulacoes e horizonte devem ser positivos")
+    if not all(0 < c < 1 for c in confiancas):
+        raise ValueError("Confianças devem estar entre 0 e 1")
+
+    modelo = preparar_modelo(log_retornos, metodo)
+    tamanho_bloco = tamanho_bloco or max(1_000, min(100_000, FLOATS_POR_BLOCO // len(posicoes)))
+    tamanhos = [tamanho_bloco] * (simulacoes // tamanho_bloco)
+    if simulacoes % tamanho_bloco:
+        tamanhos.append(simulacoes % tamanho_bloco)
+    tarefas = list(zip(tamanhos, np.random.SeedSequence(semente).spawn(len(tamanhos))))
+
+    # Cauda: piores ceil((1 - menor confiança) x N) cenários cobrem todos os níveis
+    tamanho_cauda = max(1, math.ceil((1 - min(confiancas)) * simulacoes))
+    cauda = np.empty(0)
+    n_total, soma, soma_quad = 0, 0.0, 0.0
+
+    def agregar(parcial: Dict):
+        nonlocal cauda, n_total, soma, soma_quad
+        n_total += parcial['n']
+        soma += parcial['soma']
+        soma_quad += parcial['soma_quad']
+        cauda = np.concatenate((cauda, parcial['cauda']))
+        if len(cauda) > tamanho_cauda:
+            cauda = np.partition(cauda, tamanho_cauda - 1)[:tamanho_cauda]
+
+    if workers > 1 and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(modelo, posicoes, horizonte, tamanho_cauda)) as pool:
+            for parcial in pool.map(_simular_bloco_worker, tarefas):
+                agregar(parcial)
+    else:
+        for n, semente_bloco in tarefas:
+            agregar(simular_bloco(modelo, posicoes, horizonte, n, semente_bloco, tamanho_cauda))
+
+    cauda.sort()
+    niveis = []
+    for confianca in sorted(confiancas):
+        k = max(1, math.ceil((1 - confianca) * n_total))
+        niveis.append({
+            'confianca': confianca,
+            'var': float(-cauda[k - 1]),
+            'cvar': float(-cauda[:k].mean()),
+        })
+
+    media = soma / n_total
+    return {
+        'metodo': metodo,
+        'simulacoes': n_total,
+        'horizonte_dias': horizonte,
+        'valor_carteira': float(posicoes.sum()),
+        'observacoes_historico': len(log_retornos),
+        'semente': semente,
+        'niveis': niveis,
+        'pnl_medio': media,
+        'pnl_desvio': math.sqrt(max(0.0, soma_quad / n_total - media * media)),
+        'duracao_segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def var_carteira(db_path: str, simbolos: List[str], pesos: Optional[List[float]] = None,
+                 valor: float = 100_000.0, dias_historico: Optional[int] = None,
+                 **parametros) -> Dict:
+    """
+    VaR de uma carteira a partir do histórico salvo
+
+    Args:
+        simbolos: Ativos da carteira
+        pesos: Peso de cada ativo (padrão: pesos iguais); normalizados para somar 1
+        valor: Valor financeiro total da carteira
+        dias_historico: Pregões usados na estimação (padrão: todos)
+        **parametros: Repassados para calcular_var
+    """
+    simbolos = [s.upper() for s in simbolos]
+    pesos = np.ones(len(simbolos)) if pesos is None else np.asarray(pesos, dtype=float)
+    if len(pesos) != len(simbolos) or pesos.sum() == 0:
+        raise ValueError("Pesos inválidos para os ativos informados")
+
+    log_retornos = carregar_log_retornos(db_path, simbolos, dias_historico)
+    resultado = calcular_var(log_retornos, valor * pesos / pesos.sum(), **parametros)
+    resultado['simbolos'] = simbolos
+    resultado['pesos'] = [float(p) for p in pesos / pesos.sum()]
+    return resultado
+
+
+def main():
+    """CLI: python var_montecarlo.py AAPL MSFT --simulacoes 1000000 --workers 4"""
+    parser = argparse.ArgumentParser(description="VaR / CVaR por Monte Carlo")
+    parser.add_argument('simbolos', nargs='+', help="Ativos da carteira")
+    parser.add_argument('--pesos', nargs='+', type=float, help="Pesos (padrão: iguais)")
+    parser.add_argument('--valor', type=float, default=100_000.0, help="Valor da carteira")
+    parser.add_argument('--metodo', choices=METODOS, default='historico')
+    parser.add_argument('--simulacoes', type=int, default=100_000)
+    parser.add_argument('--horizonte', type=int, default=1, help="Horizonte em dias")
+    parser.add_argument('--confianca', nargs='+', type=float, default=list(CONFIANCAS_PADRAO))
+    parser.add_argument('--semente', type=int, help="Semente para reprodutibilidade")
+    parser.add_argument('--workers', type=int, default=1, help="Processos do pool")
+    parser.add_argument('--dias-historico', type=int, help="Pregões usados na estimação")
+    parser.add_argument('--db', default="data/financial_data.db", help="Banco do ETL")
+    args = parser.parse_args()
+
+    resultado = var_carteira(args.db, args.simbolos, args.pesos, args.valor, args.dias_historico,
+                             confiancas=args.confianca, horizonte=args.horizonte,
+                             simulacoes=args.simulacoes, metodo=args.metodo,
+                             semente=args.semente, workers=args.workers)
+
+    print(f"🎲 Monte Carlo ({resultado['metodo']}): {resultado['simulacoes']:,} cenários, "
+          f"horizonte {resultado['horizonte_dias']}d, {resultado['duracao_segundos']:.2f}s")
+    print(f"💼 Carteira: {', '.join(resultado['simbolos'])} | "
+          f"Valor: {resultado['valor_carteira']:,.2f}")
+    for nivel in resultado['niveis']:
+        print(f"⚠️  VaR {nivel['confianca']:.1%}: {nivel['var']:,.2f} | "
+              f"CVaR: {nivel['cvar']:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# conftest.py - Os módulos do pipeline são scripts soltos em extractors/, sem pacote
+import os
+import sys
+
+EXTRACTORS = os.path.join(os.path.dirname(__file__), "..", "src", "financial-data-pipeline",
+                          "extractors")
+sys.path.insert(0, os.path.abspath(EXTRACTORS))
@@ -0,0 +1,31 @@
+# test_backtest.py - Sinais vetorizados do backtest contra a regra de calcular_tendencias
+import numpy as np
+import pandas as pd
+
+from backtest import AGUARDAR, COMPRA, VENDA, matriz_precos, sinais_medias
+from extractor_pandas import calcular_tendencias
+
+CODIGOS = {'COMPRA': COMPRA, 'VENDA': VENDA, 'AGUARDAR': AGUARDAR}
+
+
+def _historico(dias: int = 120) -> pd.DataFrame:
+    rng = np.random.default_rng(5)
+    datas = pd.bdate_range("2024-01-01", periods=dias).strftime("%Y-%m-%d")
+    linhas = []
+    for codigo in ("PETR4", "VALE3", "WEGE3"):
+        precos = 30 * np.exp(np.cumsum(rng.normal(0, 0.015, dias)))
+        linhas.append(pd.DataFrame({'codigo': codigo, 'data': datas, 'preco_fechamento': precos}))
+    return pd.concat(linhas, ignore_index=True)
+
+
+def test_sinais_medias_iguais_a_calcular_tendencias():
+    historico = _historico()
+    tendencias = calcular_tendencias(historico, janela_curta=7, janela_longa=21)
+    esperado = (tendencias.assign(codigo_sinal=tendencias['sinal'].map(CODIGOS))
+                .pivot(index='data', columns='codigo', values='codigo_sinal').sort_index())
+
+    precos, datas, simbolos = matriz_precos(historico, coluna_simbolo='codigo',
+                                            coluna_data='data', coluna_preco='preco_fechamento')
+    sinais = sinais_medias(precos, janela_curta=7, janela_longa=21)
+    np.testing.assert_array_equal(sinais, esperado.loc[datas, simbolos].to_numpy())
+    assert {COMPRA, VENDA} <= set(np.unique(sinais))
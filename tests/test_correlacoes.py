@@ -0,0 +1,84 @@
+# test_correlacoes.py - Motor incremental de correlação/covariância contra o pandas
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlacoes import MotorCorrelacao, invalidar_motores, obter_motor_correlacao
+
+SIMBOLOS = ["AAA", "BBB", "CCC", "DDD"]
+
+
+def _precos(dias: int, semente: int = 11) -> pd.DataFrame:
+    rng = np.random.default_rng(semente)
+    datas = pd.bdate_range("2024-01-01", periods=dias).strftime("%Y-%m-%d")
+    retornos = rng.normal(0, 0.02, (dias, len(SIMBOLOS)))
+    return pd.DataFrame(100 * np.exp(np.cumsum(retornos, axis=0)), index=datas, columns=SIMBOLOS)
+
+
+def _gravar(caminho: str, precos: pd.DataFrame):
+    conn = sqlite3.connect(caminho)
+    conn.execute("CREATE TABLE IF NOT EXISTS price_history (symbol TEXT, date DATE, "
+                 "close_price REAL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+                 "UNIQUE(symbol, date))")
+    linhas = [(s, d, float(precos.at[d, s])) for d in precos.index for s in precos.columns]
+    conn.executemany("INSERT OR REPLACE INTO price_history (symbol, date, close_price) "
+                     "VALUES (?, ?, ?)", linhas)
+    conn.commit()
+    conn.close()
+
+
+def _esperada(precos: pd.DataFrame, janela) -> np.ndarray:
+    retornos = precos.pct_change().iloc[1:]
+    if janela is not None:
+        retornos = retornos.iloc[-janela:]
+    return retornos.corr().to_numpy()
+
+
+@pytest.mark.parametrize("janela", [None, 20])
+def test_correlacao_igual_ao_pandas(tmp_path, janela):
+    precos = _precos(80)
+    caminho = str(tmp_path / "etl.db")
+    _gravar(caminho, precos)
+    motor = MotorCorrelacao(caminho)
+
+    # Pedido numa data anterior e depois na última: o segundo avança o estado
+    resultado = motor.matrizes(janela=janela, ate=precos.index[59])
+    np.testing.assert_allclose(resultado['correlacao'], _esperada(precos.iloc[:60], janela),
+                               atol=1e-10)
+    resultado = motor.matrizes(janela=janela)
+    assert resultado['simbolos'] == SIMBOLOS
+    np.testing.assert_allclose(resultado['correlacao'], _esperada(precos, janela), atol=1e-10)
+
+
+@pytest.mark.parametrize("janela", [None, 20])
+def test_revisao_do_ultimo_pregao_processado(tmp_path, janela):
+    precos = _precos(61)
+    caminho = str(tmp_path / "etl.db")
+    _gravar(caminho, precos.iloc[:60])
+    motor = MotorCorrelacao(caminho)
+    motor.matrizes(janela=janela)
+
+    # Candle do dia D revisado e D+1 chegando antes da próxima consulta
+    revisados = precos.copy()
+    revisados.iloc[59] *= [1.05, 0.97, 1.02, 0.9]
+    _gravar(caminho, revisados)
+    resultado = motor.matrizes(janela=janela)
+    np.testing.assert_allclose(resultado['correlacao'], _esperada(revisados, janela),
+                               atol=1e-10)
+
+
+def test_carga_do_historico_invalida_motor_compartilhado(tmp_path):
+    precos = _precos(60)
+    caminho = str(tmp_path / "etl.db")
+    _gravar(caminho, precos)
+    motor = obter_motor_correlacao(caminho)
+    motor.matrizes(janela=None)
+
+    regravados = precos.copy()
+    regravados.iloc[10] *= [0.8, 1.1, 1.0, 1.2]  # dia antigo: só a carga sabe que mudou
+    _gravar(caminho, regravados)
+    invalidar_motores(caminho)
+    np.testing.assert_allclose(motor.matrizes(janela=None)['correlacao'],
+                               _esperada(regravados, None), atol=1e-10)
@@ -0,0 +1,60 @@
+# test_diario_cotacoes.py - Diário NDJSON: índice, recuperação após queda e vários processos
+import json
+import multiprocessing as mp
+
+from diario_cotacoes import DiarioCotacoes
+
+
+def _cotacao(codigo: str, preco: float) -> dict:
+    return {'codigo': codigo, 'preco': preco}
+
+
+def test_ler_por_ativo_com_rotacao(tmp_path):
+    diario = DiarioCotacoes(str(tmp_path), tamanho_maximo=200)
+    for i in range(10):
+        diario.registrar([_cotacao('PETR4', i), _cotacao('VALE3', -i)])
+    assert len(diario.segmentos()) > 1
+    assert [r['preco'] for r in diario.ler('petr4')] == list(range(10))
+    assert diario.ultimo('VALE3')['preco'] == -9
+    assert diario.simbolos() == ['PETR4', 'VALE3']
+
+
+def test_registros_sem_indice_sao_reindexados(tmp_path):
+    diario = DiarioCotacoes(str(tmp_path))
+    diario.registrar([_cotacao('PETR4', 1.0)])
+    segmento = diario.segmentos()[-1]
+    # Queda entre os dados e o índice: registros completos + um pela metade
+    with open(segmento, "ab") as dados:
+        dados.write((json.dumps(_cotacao('PETR4', 2.0)) + "\n").encode())
+        dados.write((json.dumps(_cotacao('WEGE3', 3.0)) + "\n").encode())
+        dados.write(b'{"codigo": "PETR4", "pre')
+
+    leitor = DiarioCotacoes(str(tmp_path))
+    assert leitor.ultimo('PETR4')['preco'] == 2.0
+    assert leitor.simbolos() == ['PETR4', 'WEGE3']
+    assert leitor.reindexar(segmento) == 0
+
+    diario.registrar([_cotacao('PETR4', 4.0)])
+    assert [r['preco'] for r in diario.ler('PETR4')] == [1.0, 2.0, 4.0]
+    assert [r['preco'] for r in diario] == [1.0, 2.0, 3.0, 4.0]
+
+
+def _gravar(pasta: str, processo: int):
+    diario = DiarioCotacoes(pasta, tamanho_maximo=4096)
+    for i in range(50):
+        diario.registrar([_cotacao(f'P{processo}', i), _cotacao('COMUM', i)])
+
+
+def test_varios_processos_gravando(tmp_path):
+    processos = [mp.Process(target=_gravar, args=(str(tmp_path), n)) for n in range(4)]
+    for processo in processos:
+        processo.start()
+    for processo in processos:
+        processo.join(timeout=60)
+        assert processo.exitcode == 0
+
+    diario = DiarioCotacoes(str(tmp_path))
+    assert len(diario.ler('COMUM')) == 200
+    for n in range(4):
+        assert [r['preco'] for r in diario.ler(f'P{n}')] == list(range(50))
+    assert sum(1 for _ in diario) == 400
@@ -0,0 +1,56 @@
+# test_indicadores.py - Motor vetorizado de indicadores e gravação em lote
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from indicadores import INDICADORES, calcular_indicadores, recalcular_indicadores
+
+
+def _banco(caminho: str, dias: int = 120) -> str:
+    conn = sqlite3.connect(caminho)
+    conn.execute("CREATE TABLE price_history (symbol TEXT, date DATE, close_price REAL, "
+                 "UNIQUE(symbol, date))")
+    conn.execute(f"CREATE TABLE technical_indicators (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 f"symbol TEXT NOT NULL, date DATE NOT NULL, "
+                 f"{', '.join(f'{c} REAL' for c in INDICADORES)}, UNIQUE(symbol, date))")
+    rng = np.random.default_rng(7)
+    datas = pd.bdate_range("2024-01-01", periods=dias).strftime("%Y-%m-%d")
+    for simbolo in ("AAA", "BBB"):
+        precos = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, dias)))
+        conn.executemany("INSERT INTO price_history VALUES (?, ?, ?)",
+                         [(simbolo, data, float(p)) for data, p in zip(datas, precos)])
+    conn.commit()
+    conn.close()
+    return caminho
+
+
+def _nao_nulos(caminho: str) -> dict:
+    conn = sqlite3.connect(caminho)
+    try:
+        linha = conn.execute(f"SELECT {', '.join(f'COUNT({c})' for c in INDICADORES)} "
+                             f"FROM technical_indicators").fetchone()
+    finally:
+        conn.close()
+    return dict(zip(INDICADORES, linha))
+
+
+def test_rsi_em_serie_constante_de_alta_e_100():
+    painel = pd.DataFrame({'symbol': 'AAA', 'date': range(30),
+                           'close_price': np.arange(1.0, 31.0)})
+    resultado = calcular_indicadores(painel, ['rsi', 'sma_20'])
+    assert resultado['rsi'].iloc[-1] == 100
+    assert resultado['sma_20'].iloc[-1] == np.mean(np.arange(11.0, 31.0))
+
+
+def test_recalcular_subconjunto_preserva_demais_colunas(tmp_path):
+    caminho = _banco(str(tmp_path / "etl.db"))
+    recalcular_indicadores(caminho)
+    completo = _nao_nulos(caminho)
+    assert completo['sma_20'] > 0 and completo['rsi'] > 0
+
+    recalcular_indicadores(caminho, None, ['rsi'])
+    assert _nao_nulos(caminho) == completo
+
+    recalcular_indicadores(caminho, ['AAA'], ['sma_20'])
+    assert _nao_nulos(caminho) == completo
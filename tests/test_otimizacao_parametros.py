@@ -0,0 +1,42 @@
+# test_otimizacao_parametros.py - Varredura de parâmetros contra o backtest individual
+import numpy as np
+import pytest
+
+from backtest import executar_backtest
+from otimizacao_parametros import gerar_grade, varrer_parametros
+
+METRICAS = ('retorno_total', 'retorno_anual', 'volatilidade', 'sharpe', 'max_drawdown',
+            'taxa_acerto')
+
+
+def _precos(dias: int = 300, ativos: int = 12) -> np.ndarray:
+    rng = np.random.default_rng(9)
+    precos = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (dias, ativos)), axis=0))
+    precos[:40, 3] = np.nan  # ativo listado depois
+    return precos
+
+
+@pytest.mark.parametrize("estrategia, valores", [
+    ('medias', {'janela_curta': [5, 10], 'janela_longa': [21, 50]}),
+    ('rsi', {'sobrevendido': [25, 30], 'sobrecomprado': [70, 75]}),
+])
+def test_varredura_igual_ao_backtest_de_cada_combinacao(estrategia, valores):
+    precos = _precos()
+    simbolos = [f"A{i}" for i in range(precos.shape[1])]
+    grade = gerar_grade(estrategia, **valores)
+    resultados = varrer_parametros(precos, estrategia, grade, custo=0.001, bloco_ativos=5)
+
+    for parametros, resultado in zip(grade, resultados):
+        carteira = executar_backtest(precos, simbolos, estrategia, custo=0.001,
+                                     **parametros)['carteira']
+        for metrica in METRICAS:
+            assert resultado[metrica] == pytest.approx(carteira[metrica], rel=1e-9, nan_ok=True)
+
+
+def test_varredura_nao_depende_dos_workers():
+    precos = _precos()
+    grade = gerar_grade('medias', janela_curta=[5, 7, 10], janela_longa=[21, 30])
+    sequencial = varrer_parametros(precos, 'medias', grade, workers=1, bloco_ativos=4)
+    paralelo = varrer_parametros(precos, 'medias', grade, workers=2, bloco_ativos=4)
+    for a, b in zip(sequencial, paralelo):
+        assert a == pytest.approx(b, rel=1e-12, nan_ok=True)
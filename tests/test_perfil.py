@@ -0,0 +1,44 @@
+# test_perfil.py - cProfile sob demanda com os estágios do pipeline em threads
+import pstats
+import threading
+
+import perfil
+from pipeline_estagios import Estagio, PipelineEstagios
+
+
+def _dobro(valor: int) -> int:
+    return valor * 2
+
+
+def _mais_um(valor: int) -> int:
+    return valor + 1
+
+
+def test_perfilar_pipeline_com_estagios_em_threads(tmp_path):
+    pipeline = PipelineEstagios([Estagio('dobro', _dobro, workers=3),
+                                 Estagio('mais_um', _mais_um, workers=2)], capacidade_fila=2)
+    saida = {}
+
+    def rodar():
+        with perfil.perfilar('pipeline_teste', pasta=str(tmp_path), top=10) as arquivos:
+            saida['execucao'] = pipeline.executar(range(50))
+        saida['arquivos'] = arquivos
+
+    # Se um estágio morrer no bootstrap da thread o pipeline trava nas filas limitadas
+    thread = threading.Thread(target=rodar, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+
+    assert saida['execucao']['resultados'] == [2 * i + 1 for i in range(50)]
+    assert saida['execucao']['erros'] == []
+    funcoes = {funcao for (_, _, funcao) in pstats.Stats(saida['arquivos']['prof']).stats}
+    assert {'_dobro', '_mais_um'} <= funcoes
+
+
+def test_perfilar_aninhado_roda_sem_perfil(tmp_path):
+    with perfil.perfilar('externo', pasta=str(tmp_path)) as externo:
+        with perfil.perfilar('interno', pasta=str(tmp_path)) as interno:
+            _dobro(1)
+        assert interno == {}
+    assert externo['prof'].endswith('.prof')
@@ -0,0 +1,104 @@
+# test_resiliencia.py - Máquina de estados do circuit breaker e roteador de provedores
+from resiliencia import CircuitBreaker, PoliticaRetry, RoteadorProvedores
+
+
+class Relogio:
+    """Relógio manual para controlar o tempo de abertura e das sondas"""
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+def _breaker_meio_aberto(relogio: Relogio, **config) -> CircuitBreaker:
+    breaker = CircuitBreaker("av", limite_falhas=1, tempo_abertura=10, relogio=relogio, **config)
+    breaker.registrar_falha()
+    assert breaker.estado == CircuitBreaker.ABERTO
+    relogio.agora += 10
+    assert breaker.estado == CircuitBreaker.MEIO_ABERTO
+    return breaker
+
+
+def test_fechado_abre_apos_limite_de_falhas():
+    relogio = Relogio()
+    breaker = CircuitBreaker("av", limite_falhas=3, tempo_abertura=10, relogio=relogio)
+    for _ in range(2):
+        breaker.registrar_falha()
+        assert breaker.estado == CircuitBreaker.FECHADO
+    breaker.registrar_falha()
+    assert breaker.estado == CircuitBreaker.ABERTO
+    assert not breaker.permite_requisicao()
+
+
+def test_meio_aberto_sucesso_fecha_e_falha_reabre():
+    relogio = Relogio()
+    breaker = _breaker_meio_aberto(relogio)
+    assert breaker.permite_requisicao()
+    assert not breaker.permite_requisicao()  # uma sonda por vez
+    breaker.registrar_sucesso()
+    assert breaker.estado == CircuitBreaker.FECHADO
+
+    breaker.registrar_falha()
+    relogio.agora += 10
+    assert breaker.permite_requisicao()
+    breaker.registrar_falha()
+    assert breaker.estado == CircuitBreaker.ABERTO
+
+
+def test_liberar_devolve_vaga_sem_mudar_estado():
+    relogio = Relogio()
+    breaker = _breaker_meio_aberto(relogio)
+    assert breaker.permite_requisicao()
+    breaker.liberar()
+    assert breaker.estado == CircuitBreaker.MEIO_ABERTO
+    assert breaker.sondas_em_andamento == 0
+    assert breaker.permite_requisicao()
+
+
+def test_liberar_sem_sonda_reservada_nao_tem_efeito():
+    breaker = CircuitBreaker("av", relogio=Relogio())
+    breaker.liberar()
+    assert breaker.estado == CircuitBreaker.FECHADO
+    assert breaker.permite_requisicao()
+
+
+def test_sonda_sem_resultado_expira():
+    relogio = Relogio()
+    breaker = _breaker_meio_aberto(relogio, timeout_sonda=30)
+    assert breaker.permite_requisicao()  # chamador some sem registrar nada
+    relogio.agora += 29
+    assert not breaker.permite_requisicao()
+    relogio.agora += 1
+    assert breaker.estado == CircuitBreaker.MEIO_ABERTO
+    assert breaker.permite_requisicao()
+
+
+def test_roteador_volta_a_liberar_provedor_apos_sonda_abandonada():
+    relogio = Relogio()
+    roteador = RoteadorProvedores()
+    roteador.registrar("av", limite_falhas=1, tempo_abertura=10, timeout_sonda=30, relogio=relogio)
+    roteador.registrar_falha("av", 0.1)
+    assert roteador.ordenar(["av"]) == []
+
+    relogio.agora = 10
+    assert roteador.disponivel("av")
+    assert roteador.ordenar(["av"]) == ["av"]
+    assert not roteador.disponivel("av")
+
+    roteador.liberar("av")
+    assert roteador.disponivel("av")
+
+    relogio.agora = 1000  # vaga abandonada de novo: expira pelo timeout
+    assert roteador.disponivel("av")
+    roteador.registrar_sucesso("av", 0.1)
+    assert roteador.breaker("av").estado == CircuitBreaker.FECHADO
+
+
+def test_retry_after_respeita_o_teto():
+    politica = PoliticaRetry(teto=30.0, aleatorio=lambda a, b: b)
+    assert politica.atraso(0, retry_after=5) == 5
+    assert politica.atraso(0, retry_after=86400) == 30.0
+    assert politica.atraso(0, retry_after=-3) == 0.0
+    assert politica.atraso(10) == 30.0